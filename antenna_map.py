@@ -0,0 +1,276 @@
+
+"""
+	Antenna Map - the numbers behind the map; no plotting (and hence no matplotlib)
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	data = AntennaMap(bysatellite_flag)
+	data.add_packets(station_name, packets, max_days, since, until)
+	data.add_antenna(station_name, direction)
+	data.add_coverage(station_name, station, jobs, cache)
+	data.export(fd, 'json')
+"""
+
+import csv
+import json
+import time
+import datetime
+
+import numpy as np
+
+from packet_table import PacketTable
+from timeline import Timeline
+from satellite import Satellite
+from coverage import Coverage
+from profiler import Profile
+
+class AntennaMap:
+	""" AntennaMap - packets grouped by station (or satellite) and counted into az/el buckets """
+
+	theta_scale = 22.5			# Azimuth
+	radius_scale = 10.0			# Elevation
+
+	EXPORT_FORMATS = ('json', 'csv')
+
+	_CSV_COLUMNS = ('record', 'station', 'ident', 'time', 'satellite', 'norad', 'az', 'el', 'az_max', 'el_max', 'parsed', 'count', 'crc', 'expected_seconds')
+
+	def __init__(self, bysatellite_flag, theta_scale=None, radius_scale=None):
+		""" AntennaMap - theta_scale and radius_scale are the bucket sizes (in degrees) """
+
+		if theta_scale is None:
+			theta_scale = AntennaMap.theta_scale
+		if radius_scale is None:
+			radius_scale = AntennaMap.radius_scale
+		# the last bucket is smaller if the size doesn't divide evenly
+		self._theta_edges = np.append(np.arange(0.0, 360.0, theta_scale), 360.0)
+		self._radius_edges = np.append(np.arange(0.0, 90.0, radius_scale), 90.0)
+
+		self._stations = []
+		self._packets = {}
+		self._buckets = {}
+		self._antenna_direction = {}
+		self._coverage = {}			# station_name -> expected seconds above each bucket
+		self._bysatellite_flag = bysatellite_flag
+		self._max_days = None
+		self._since = None
+		self._until = None
+
+	def add_packets(self, station_name, packets=None, max_days=None, since=None, until=None):
+		""" add_packets - packets is a PacketTable; since and until are naive UTC datetimes; returns a list of the stations (or satellites) that gained packets """
+
+		if packets is None or len(packets) == 0:
+			return []
+
+		with Profile.stage('bucketing'):
+			return self._add_packets(station_name, packets, max_days, since, until)
+
+	def _add_packets(self, station_name, packets, max_days, since, until):
+		""" _add_packets """
+
+		if max_days:
+			self._max_days = max_days
+		if since:
+			self._since = since
+		if until:
+			self._until = until
+
+		# outside the window packets are dropped
+		since, until = self._window()
+		if since is not None or until is not None:
+			packets = packets.window(since, until)
+
+		# we index by station_name or norad/satellite depending on flags
+		if self._bysatellite_flag:
+			groups = []
+			keys = packets.satellite.astype(np.int64) << 32 | packets.norad.astype(np.int64)
+			uniq_keys, first = np.unique(keys, return_index=True)
+			for k, ii in sorted(zip(uniq_keys.tolist(), first.tolist()), key=lambda v: v[1]):
+				packet_index = "%s (%s)" % (packets.satellite_name(ii), packets.norad[ii])
+				groups.append((packet_index, packets.take(keys == k)))
+		else:
+			groups = [(station_name, packets)]
+
+		changed = []
+		for packet_index, table in groups:
+			if packet_index not in self._packets:
+				self._stations.append(packet_index)
+				self._packets[packet_index] = PacketTable()
+				self._buckets[packet_index] = np.zeros((len(self._theta_edges) - 1, len(self._radius_edges) - 1), dtype=np.int64)
+
+			# anything seen already is skipped
+			added = self._packets[packet_index].extend(table)
+			Profile.count('duplicates_dropped', len(table) - len(added))
+
+			# only add to bucket if it's a parsed packet
+			parsed = added.parsed
+			counts, _, _ = np.histogram2d(added.az[parsed], added.el[parsed], bins=(self._theta_edges, self._radius_edges))
+			self._buckets[packet_index] += counts.astype(np.int64)
+			if len(added) > 0:
+				changed.append(packet_index)
+		return changed
+
+	def clear_packets(self):
+		""" clear_packets - forget every packet (but not the window, antennas or coverage); so they can all be added again """
+
+		for packet_index in self._stations:
+			self._packets[packet_index] = PacketTable()
+			self._buckets[packet_index][:] = 0
+
+	def expire(self):
+		""" expire - drop packets that are now older than max_days (for a long running process); returns a list of what changed """
+
+		if not self._max_days or self._until:
+			# the window doesn't move
+			return []
+
+		oldest, _ = self._window()
+		changed = []
+		for packet_index in self._stations:
+			table = self._packets[packet_index]
+			dropped = table.window(None, oldest)
+			if len(dropped) == 0:
+				continue
+			parsed = dropped.parsed
+			counts, _, _ = np.histogram2d(dropped.az[parsed], dropped.el[parsed], bins=(self._theta_edges, self._radius_edges))
+			self._buckets[packet_index] -= counts.astype(np.int64)
+			self._packets[packet_index] = table.window(oldest, None)
+			changed.append(packet_index)
+		return changed
+
+	def _window(self):
+		""" _window - (since, until) as seconds since 1970 (either can be None); max_days counts back from until (or now) """
+
+		since = self._since
+		until = self._until
+		if self._max_days:
+			since = (until or datetime.datetime.utcnow()) - datetime.timedelta(days=self._max_days)
+		epoch = datetime.datetime(1970, 1, 1)
+		return (None if since is None else (since - epoch).total_seconds()), (None if until is None else (until - epoch).total_seconds())
+
+	def add_antenna(self, station_name, direction):
+		""" add_antenna """
+
+		self._antenna_direction[station_name] = float(direction)
+
+	def add_coverage(self, station_name, station, jobs=1, cache=None):
+		""" add_coverage - the time satellites were expected above each bucket (over the same window as the packets); station is a Station """
+
+		if self._bysatellite_flag or station_name not in self._packets:
+			return
+
+		since, until = self._window()
+		table = self._packets[station_name]
+		if since is None:
+			if len(table) == 0:
+				return
+			since = float(table.t.min())
+		if until is None:
+			until = time.time() if self._max_days else float(table.t.max())
+
+		with Profile.stage('coverage'):
+			coverage = Coverage(station.lnglat, station.elevation, self._theta_edges, self._radius_edges)
+			self._coverage[station_name] = coverage.expected(Satellite.supported_names(), since, until, jobs, cache)
+
+	def reception_ratio(self, packet_index):
+		""" reception_ratio - parsed packets per hour a satellite was above each bucket; nan where there was too little time to say """
+
+		seconds = self._coverage[packet_index]
+		with np.errstate(divide='ignore', invalid='ignore'):
+			return np.where(seconds >= Coverage.MIN_SECONDS, self._buckets[packet_index] / (seconds / 3600.0), np.nan)
+
+	def timeline(self, granularity='day', packet_indexes=None):
+		""" timeline - packet counts per hour, day or week; in packet_indexes order (default is sorted) """
+
+		if packet_indexes is None:
+			packet_indexes = sorted(self._stations)
+		return Timeline([self._packets[packet_index] for packet_index in packet_indexes], granularity)
+
+	def export(self, fd, file_format='json'):
+		""" export - bucket counts, per-day counts and per-packet az/el; fd is a text file """
+
+		with Profile.stage('export'):
+			if file_format == 'json':
+				self._export_json(fd)
+			elif file_format == 'csv':
+				self._export_csv(fd)
+			else:
+				raise ValueError('%s: unknown export format' % (file_format))
+
+	def _export_json(self, fd):
+		""" _export_json """
+
+		stations = {}
+		for packet_index, days in zip(sorted(self._stations), self._days()):
+			table = self._packets[packet_index]
+			stations[packet_index] = {
+				'antenna': self._antenna_direction.get(packet_index),
+				'total': len(table),
+				'buckets': self._buckets[packet_index].tolist(),
+				'expected_seconds': self._coverage[packet_index].tolist() if packet_index in self._coverage else None,
+				'days': [{'date': day.isoformat(), 'count': count, 'crc': crc} for day, count, crc in days],
+				'packets': [
+					{'ident': ident, 'time': self._isoformat(t), 'satellite': satellite, 'norad': norad, 'az': az, 'el': el, 'parsed': parsed}
+					for ident, t, satellite, norad, az, el, parsed in self._packet_rows(table)
+				],
+			}
+
+		j = {
+			'az_edges': self._theta_edges.tolist(),
+			'el_edges': self._radius_edges.tolist(),
+			'max_days': self._max_days,
+			'since': self._since.isoformat() if self._since else None,
+			'until': self._until.isoformat() if self._until else None,
+			'stations': stations,
+		}
+		json.dump(j, fd, separators=(',', ':'))
+		fd.write('\n')
+
+	def _export_csv(self, fd):
+		""" _export_csv - one file; the record column says what each row is (bucket, day or packet) """
+
+		writer = csv.writer(fd, lineterminator='\n')
+		writer.writerow(AntennaMap._CSV_COLUMNS)
+		for packet_index, days in zip(sorted(self._stations), self._days()):
+			table = self._packets[packet_index]
+
+			# with coverage; buckets with no packets (but where there could have been) matter too
+			if packet_index in self._coverage:
+				seconds = self._coverage[packet_index]
+				az_index, el_index = np.nonzero(self._buckets[packet_index] + seconds)
+				expected = seconds[az_index, el_index].tolist()
+			else:
+				az_index, el_index = np.nonzero(self._buckets[packet_index])
+				expected = [''] * len(az_index)
+			for ii, jj, v, e in zip(az_index.tolist(), el_index.tolist(), self._buckets[packet_index][az_index, el_index].tolist(), expected):
+				writer.writerow(('bucket', packet_index, '', '', '', '', self._theta_edges[ii], self._radius_edges[jj], self._theta_edges[ii+1], self._radius_edges[jj+1], '', v, '', e))
+
+			for day, count, crc in days:
+				writer.writerow(('day', packet_index, '', day.isoformat(), '', '', '', '', '', '', '', count, crc, ''))
+
+			for ident, t, satellite, norad, az, el, parsed in self._packet_rows(table):
+				writer.writerow(('packet', packet_index, ident, self._isoformat(t), satellite, norad, az, el, '', '', int(parsed), '', '', ''))
+
+	def _days(self):
+		""" _days - for each station (sorted) a list of (date, parsed, crc) for days with packets """
+
+		timeline = self.timeline('day')
+		days = [bin_start.date() for bin_start in timeline.bin_starts()]
+		results = []
+		for counts in timeline.counts:
+			results.append([(days[ii], int(counts[0][ii]), int(counts[1][ii])) for ii in np.flatnonzero(counts[0] + counts[1]).tolist()])
+		return results
+
+	@classmethod
+	def _packet_rows(cls, table):
+		""" _packet_rows - time ordered; plain python values """
+
+		order = np.argsort(table.t, kind='stable')
+		satellites = [table.satellites[v] for v in table.satellite[order].tolist()]
+		return zip(table.idents[order].tolist(), table.t[order].tolist(), satellites, table.norad[order].tolist(), table.az[order].tolist(), table.el[order].tolist(), table.parsed[order].tolist())
+
+	@classmethod
+	def _isoformat(cls, t):
+		""" _isoformat - UTC """
+
+		return (datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=t)).isoformat()
@@ -0,0 +1,848 @@
+#!/usr/bin/env python3
+"""
+	TinyGS Antenna Map Benchmark - time (and peak memory) for each stage of the pipeline on synthetic data
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	$ ./benchmark.py -n 1k,100k -o results.json
+	$ ./benchmark.py -n 1k,100k -c results.json		# compare against an earlier run (i.e. another commit)
+	$ ./benchmark.py -p					# the sgp4 propagator against ephem; accuracy and speed
+	$ ./benchmark.py -n 100k -a				# az/el a packet at a time against in batches
+	$ ./benchmark.py -m 500M				# memory to read one big packets file; json.load() against streamed
+	$ ./benchmark.py -n 1k -g				# time per PNG; headless against pyplot
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import glob
+import base64
+import random
+import getopt
+import warnings
+import platform
+import datetime
+import tracemalloc
+import subprocess
+
+import ephem
+
+BENCHMARK_VERSION = 1
+GENERATOR_VERSION = 2
+
+# TLE's from around the time the generated packets were "received"
+TLES = (
+	('Norbi', '1 46494U 20068J   21171.56680050  .00001399  00000-0  10640-3 0  9991', '2 46494  97.6936 109.0948 0019440  70.2955 290.0369 15.03626854 39805'),
+	('FEES', '1 48082U 21022AL  21171.58982329  .00001838  00000-0  12797-3 0  9996', '2 48082  97.5572  73.8040 0014403 294.8526 111.5169 15.06628133 12056'),
+	('SDSat', '1 47721U 21015W   21171.44232657 -.00000070  00000-0  00000-0 0  9993', '2 47721  97.4612 245.7217 0009950 249.9352 110.0983 15.20920648 17037'),
+)
+NEWEST = datetime.datetime(2021, 6, 20)
+DAYS = 30
+PACKETS_PER_FILE = 5000
+OVERLAP = 0.2				# each download repeats some of the previous one (as the TinyGS API does)
+OTHER_STATIONS = 2000			# stations.json is for the whole network
+USER_ID = 1
+
+# differences smaller than this are noise - not regressions
+MIN_SECONDS = 0.05
+MIN_MB = 2.0
+
+# the propagation check - every TLE from each of these (lng, lat, elevation) for DAYS either side of its epoch
+OBSERVERS = ((-122.0, 37.4, 30.0), (151.2, -33.9, 50.0), (0.0, 51.5, 100.0), (25.7, 78.2, 500.0), (-70.7, -33.4, 2500.0))
+PROPAGATION_STEP = 60			# seconds
+PROPAGATION_TOLERANCE = 0.05		# degrees - a small fraction of the smallest bucket
+
+# the memory check - one station with one big packets file
+MEMORY_STATION = 'BENCH_MEMORY'
+MEMORY_BATCH = 10000			# packets generated at a time (then repeated with new ids)
+
+STAGES = ('stations', 'process_packets_cold', 'process_packets_warm', 'read_packets', 'add_packets', 'process', 'output')
+
+def parse_size(s):
+	""" parse_size - 1k, 100k, 1M etc """
+
+	multiplier = {'k': 1000, 'K': 1000, 'm': 1000000, 'M': 1000000}
+	if s and s[-1] in multiplier:
+		return int(float(s[:-1]) * multiplier[s[-1]])
+	return int(s)
+
+def generate(root, n_packets, n_stations, seed=1):
+	""" generate - a data directory as the TinyGS API would have filled it; reused if already there """
+
+	marker = root + '/generated.json'
+	params = {'version': GENERATOR_VERSION, 'packets': n_packets, 'stations': n_stations, 'seed': seed}
+	try:
+		with open(marker, 'r', encoding='utf8') as fd:
+			if json.load(fd) == params:
+				return
+	except (IOError, ValueError):
+		pass
+
+	rng = random.Random(seed)
+	data = root + '/data'
+	os.makedirs(data, exist_ok=True)
+
+	with open(data + '/tinygs_supported.txt', 'w', encoding='utf8') as fd:
+		for tle in TLES:
+			fd.write('\n'.join(tle) + '\n')
+
+	stations = []
+	for ii in range(n_stations):
+		stations.append(_station_json('BENCH_%02d' % (ii), USER_ID, rng.uniform(-60.0, 60.0), rng.uniform(-180.0, 180.0), rng))
+	for ii in range(OTHER_STATIONS):
+		stations.append(_station_json('OTHER_%05d' % (ii), 1000 + ii // 2, rng.uniform(-60.0, 60.0), rng.uniform(-180.0, 180.0), rng))
+	with open(data + '/stations.json', 'w', encoding='utf8') as fd:
+		json.dump(stations, fd)
+
+	per_station = n_packets // n_stations
+	for s in stations[:n_stations]:
+		directory = data + '/' + s['name']
+		os.makedirs(directory, exist_ok=True)
+		for filename in os.listdir(directory):
+			os.unlink(directory + '/' + filename)
+		packets = _station_packets(s, per_station, rng)
+		_write_packets_files(directory, packets)
+
+	with open(marker, 'w', encoding='utf8') as fd:
+		json.dump(params, fd)
+
+def _station_json(name, user_id, lat, lng, rng):
+	""" _station_json - the fields TinyGS has (most are not used by us) """
+
+	return {
+		'name': name,
+		'userId': user_id,
+		'location': [round(lat, 4), round(lng, 4)],
+		'elevation': rng.randint(0, 500),
+		'status': 1,
+		'version': 2108021,
+		'confirmed': True,
+		'lastPacketTime': 1624147200000,
+		'autoTune': True,
+		'satellite': 'Norbi',
+		'board': rng.randint(0, 9),
+		'modem_conf': {'mode': 'LoRa', 'freq': 436.703, 'bw': 250, 'sf': 10, 'cr': 5, 'sw': 18, 'pwr': 5, 'cl': 120, 'pl': 8, 'gain': 0, 'crc': True, 'fldro': 1, 'sat': 'Norbi', 'NORAD': 46494},
+		'description': 'generated by benchmark.py',
+	}
+
+def _passes(s):
+	""" _passes - (rise, set) times (as seconds since 1970) of every satellite over the station """
+
+	observer = ephem.Observer()
+	observer.lat = str(s['location'][0])
+	observer.lon = str(s['location'][1])
+	observer.elevation = s['elevation']
+	start = NEWEST - datetime.timedelta(days=DAYS)
+	epoch = datetime.datetime(1970, 1, 1)
+
+	passes = []
+	for name, line1, line2 in TLES:
+		body = ephem.readtle(name, line1, line2)
+		observer.date = start
+		while True:
+			try:
+				rise_time, _, _, _, set_time, _ = observer.next_pass(body)
+			except (ValueError, TypeError):
+				break
+			if rise_time is None or set_time is None:
+				break
+			if set_time.datetime() > NEWEST:
+				break
+			if set_time > rise_time:
+				passes.append((name, (rise_time.datetime() - epoch).total_seconds(), (set_time.datetime() - epoch).total_seconds()))
+			observer.date = set_time + ephem.minute
+	return passes
+
+def _station_packets(s, n_packets, rng):
+	""" _station_packets - received during passes; time ordered """
+
+	passes = _passes(s)
+	norads = {name: int(line1[2:7]) for name, line1, _ in TLES}
+	packets = []
+	for ii in range(n_packets):
+		name, rise_time, set_time = passes[rng.randrange(len(passes))]
+		t = rng.uniform(rise_time, set_time)
+		p = {
+			'id': '%s-%08d' % (s['name'], ii),
+			'serverTime': int(t * 1000),
+			'norad': 0 if rng.random() < 0.05 else norads[name],		# some packets don't have a norad
+			'satellite': name,
+			'mode': 'LoRa',
+			'frequency': 436.703,
+			'sf': 10,
+			'cr': 5,
+			'bw': 250,
+			'rssi': round(rng.uniform(-130.0, -90.0), 1),
+			'snr': round(rng.uniform(-15.0, 10.0), 2),
+			'frequencyError': round(rng.uniform(-2000.0, 2000.0), 1),
+			'satPos': {'lng': round(rng.uniform(-180.0, 180.0), 3), 'lat': round(rng.uniform(-90.0, 90.0), 3), 'alt': round(rng.uniform(480.0, 560.0), 1)},
+			'raw': base64.b64encode(rng.getrandbits(384).to_bytes(48, 'little')).decode('ascii'),
+		}
+		if rng.random() < 0.8:
+			# anything not parsed is a CRC error
+			p['parsed'] = {'payload': {'batteryVoltage': round(rng.uniform(3.5, 4.2), 2), 'temperature': rng.randint(-20, 40), 'resets': rng.randint(0, 100)}}
+		packets.append(p)
+	packets.sort(key=lambda p: p['serverTime'])
+	return packets
+
+def _write_packets_files(directory, packets):
+	""" _write_packets_files - one file per download; each a window of the newest packets at that time """
+
+	step = max(1, int(PACKETS_PER_FILE * (1.0 - OVERLAP)))
+	start = 0
+	while True:
+		window = packets[max(0, start - (PACKETS_PER_FILE - step)):start + step]
+		if len(window) == 0:
+			break
+		newest = datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=window[-1]['serverTime'] / 1000.0)
+		filename = directory + '/' + newest.strftime('%Y-%m-%dT%H-%M-%S') + '.packets.json'
+		with open(filename, 'w', encoding='utf8') as fd:
+			# newest first - as the API returns them
+			json.dump({'packets': window[::-1]}, fd)
+		start += step
+		if start >= len(packets):
+			break
+
+def generate_big(root, n_bytes, seed=1):
+	""" generate_big - one station with one packets file of about n_bytes (and the stations and TLE files; so it can be processed); reused if already there """
+
+	marker = root + '/generated.json'
+	params = {'version': GENERATOR_VERSION, 'bytes': n_bytes, 'seed': seed}
+	directory = root + '/data/' + MEMORY_STATION
+	filename = directory + '/' + NEWEST.strftime('%Y-%m-%dT%H-%M-%S') + '.packets.json'
+	try:
+		with open(marker, 'r', encoding='utf8') as fd:
+			if json.load(fd) == params:
+				return filename
+	except (IOError, ValueError):
+		pass
+
+	rng = random.Random(seed)
+	os.makedirs(directory, exist_ok=True)
+	for f in glob.glob(directory + '/*.packets.json'):
+		os.unlink(f)
+	with open(root + '/data/tinygs_supported.txt', 'w', encoding='utf8') as fd:
+		for tle in TLES:
+			fd.write('\n'.join(tle) + '\n')
+	station = _station_json(MEMORY_STATION, USER_ID, rng.uniform(-60.0, 60.0), rng.uniform(-180.0, 180.0), rng)
+	with open(root + '/data/stations.json', 'w', encoding='utf8') as fd:
+		json.dump([station], fd)
+	packets = _station_packets(station, MEMORY_BATCH, rng)
+
+	# written as it's generated - so this process never holds the whole file
+	n = 0
+	with open(filename, 'w', encoding='utf8') as fd:
+		fd.write('{"packets":[')
+		while fd.tell() < n_bytes:
+			for p in packets:
+				p['id'] = '%s-%09d' % (MEMORY_STATION, n)
+				if n > 0:
+					fd.write(',')
+				fd.write(json.dumps(p))
+				n += 1
+		fd.write(']}\n')
+
+	with open(marker, 'w', encoding='utf8') as fd:
+		json.dump(params, fd)
+	return filename
+
+def freshen(root):
+	""" freshen - everything looks just downloaded; so nothing is fetched from TinyGS """
+
+	for directory, _, filenames in os.walk(root + '/data'):
+		for filename in filenames:
+			os.utime(directory + '/' + filename)
+
+def clean(root):
+	""" clean - remove everything the program saves between runs; so the next run starts cold """
+
+	for filename in glob.glob(root + '/data/*/archive/*'):
+		os.unlink(filename)
+	for directory, _, filenames in os.walk(root + '/data'):
+		for filename in filenames:
+			if filename in ('stations.catalog', 'tinygs_supported_history.txt') or filename.endswith('.tmp'):
+				os.unlink(directory + '/' + filename)
+
+class Meter:
+	""" Meter - wall time and peak memory for one stage """
+
+	def __init__(self):
+		""" Meter - peak RSS (resettable on Linux) or else peak traced (python and numpy) memory """
+
+		try:
+			self._reset_peak_rss()
+			self.method = 'rss'
+		except OSError:
+			self.method = 'traced'
+		self.results = {}
+
+	def __call__(self, stage):
+		return _Stage(self, stage)
+
+	@classmethod
+	def _reset_peak_rss(cls):
+		""" _reset_peak_rss """
+
+		with open('/proc/self/clear_refs', 'w') as fd:
+			fd.write('5')
+
+	@classmethod
+	def _peak_rss(cls):
+		""" _peak_rss - bytes """
+
+		with open('/proc/self/status', 'r') as fd:
+			for line in fd:
+				if line.startswith('VmHWM:'):
+					return int(line.split()[1]) * 1024
+		return 0
+
+	def start(self):
+		""" start """
+
+		if self.method == 'rss':
+			self._reset_peak_rss()
+		else:
+			tracemalloc.start()
+		return time.perf_counter()
+
+	def stop(self, stage, started, count=None):
+		""" stop """
+
+		seconds = time.perf_counter() - started
+		if self.method == 'rss':
+			peak = self._peak_rss()
+		else:
+			_, peak = tracemalloc.get_traced_memory()
+			tracemalloc.stop()
+		self.results[stage] = {'seconds': round(seconds, 4), 'peak_mb': round(peak / (1024*1024), 1)}
+		if count is not None:
+			self.results[stage]['count'] = count
+
+class _Stage:
+	""" _Stage - with Meter(stage): ... """
+
+	def __init__(self, meter, stage):
+		self._meter = meter
+		self._stage = stage
+		self._started = None
+		self.count = None
+
+	def __enter__(self):
+		self._started = self._meter.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if exc_type is None:
+			self._meter.stop(self._stage, self._started, self.count)
+		return False
+
+def run(root):
+	""" run - each stage in turn; all from cold """
+
+	# these use relative paths (i.e. data/...)
+	os.chdir(root)
+	clean(root)
+	freshen(root)
+
+	# import here so the timing includes nothing left from an earlier size
+	from packets import PacketFileProcessing
+	from satellite import Satellite
+	from polar_map import PolarAntennaMap
+
+	meter = Meter()
+
+	with meter('stations') as stage:
+		pfp = PacketFileProcessing()
+		pfp.add_userid(USER_ID)
+		pfp.add_all_stations()
+		station_names = pfp.list_stations()
+		stage.count = len(station_names)
+
+	with meter('process_packets_cold') as stage:
+		pfp.process_all_packets(station_names)
+		stage.count = sum(len(pfp.get_packets(station_name)) for station_name in station_names)
+
+	with meter('process_packets_warm') as stage:
+		pfp = PacketFileProcessing()
+		pfp.add_userid(USER_ID)
+		pfp.add_all_stations()
+		pfp.process_all_packets(station_names)
+		stage.count = sum(len(pfp.get_packets(station_name)) for station_name in station_names)
+
+	# the az/el computation for every packet (as when the archive is first built)
+	times = {station_name: _packet_times(station_name) for station_name in station_names}
+	with meter('read_packets') as stage:
+		stage.count = 0
+		for station_name in station_names:
+			station = pfp.get_station(station_name)
+			sat = Satellite()
+			sat.set_observer(station.lnglat, station.elevation)
+			for satellite_name, t in times[station_name].items():
+				_, _, _, _, el = sat.get_where_batch(satellite_name, t)
+				stage.count += int((el > 0).sum())
+	del times
+
+	with meter('add_packets') as stage:
+		plot = PolarAntennaMap(True, False)
+		for station_name in station_names:
+			plot.add_packets(station_name, pfp.get_packets(station_name))
+			plot.add_antenna(station_name, 45.0)
+		stage.count = len(station_names)
+
+	with meter('process'):
+		plot._process(headless=True)
+		plot._processed = True
+
+	with meter('output') as stage:
+		fd = io.BytesIO()
+		plot.output(fd, 'png')
+		stage.count = len(fd.getvalue())
+
+	return meter
+
+def _packet_times(station_name):
+	""" _packet_times - every packet in a station's files (duplicates and all); a dict of satellite name -> numpy datetime64 array """
+
+	import numpy as np
+	from packets import PacketFileProcessing
+	from packet_reader import PacketReader
+
+	times = {}
+	for filename in sorted(glob.glob(PacketFileProcessing.DATA_DIRECTORY + '/' + station_name + '/*.packets.json')):
+		with open(filename, 'rb') as fd:
+			for p in PacketReader(fd):
+				times.setdefault(p['satellite'], []).append(p['serverTime'])
+	return {satellite_name: np.array(t, dtype='datetime64[ms]').astype('datetime64[us]') for satellite_name, t in times.items()}
+
+def run_azel(root, repeat):
+	""" run_azel - the az/el of every packet; a packet at a time (with ephem, as it once was) against a batch per satellite with each propagator """
+
+	os.chdir(root)
+	clean(root)
+	freshen(root)
+
+	import numpy as np
+	from packets import PacketFileProcessing
+	from satellite import Satellite
+	from propagator import Propagator
+
+	pfp = PacketFileProcessing()
+	pfp.add_userid(USER_ID)
+	pfp.add_all_stations()
+	station_names = pfp.list_stations()
+	times = {station_name: _packet_times(station_name) for station_name in station_names}
+	count = sum(len(t) for by_satellite in times.values() for t in by_satellite.values())
+
+	def per_packet():
+		el = []
+		for station_name in station_names:
+			station = pfp.get_station(station_name)
+			sat = Satellite()
+			sat.set_observer(station.lnglat, station.elevation)
+			for satellite_name, t in times[station_name].items():
+				for dt in t.astype(datetime.datetime).tolist():
+					sat.set_satellite(satellite_name, dt)
+					sat.set_when(dt)
+					_, _, azel = sat.get_where()
+					el.append(azel.el)
+		return np.array(el)
+
+	def batch():
+		el = []
+		for station_name in station_names:
+			station = pfp.get_station(station_name)
+			sat = Satellite()
+			sat.set_observer(station.lnglat, station.elevation)
+			for satellite_name, t in times[station_name].items():
+				_, _, _, _, e = sat.get_where_batch(satellite_name, t)
+				el.append(e)
+		return np.concatenate(el)
+
+	results = {'count': count, 'paths': {}}
+	reference = None
+	for path, propagator, f in [('per_packet', 'ephem', per_packet)] + [('batch_' + name, name, batch) for name in Propagator.names()]:
+		Satellite.set_propagator(propagator)
+		best = None
+		for ii in range(repeat):
+			started = time.perf_counter()
+			el = f()
+			seconds = time.perf_counter() - started
+			best = seconds if best is None else min(best, seconds)
+		if reference is None:
+			reference = el
+		results['paths'][path] = {'seconds': round(best, 4), 'per_second': int(count / best), 'el': round(float(np.nanmax(np.abs(el - reference))), 5)}
+	return results
+
+def run_memory(filename, how):
+	""" run_memory - peak memory for one big packets file; all of it with json.load() or streamed into the archive (read, de-duplicated, az/el computed and appended; as the program does) """
+
+	root = os.path.dirname(os.path.dirname(os.path.dirname(filename)))
+	os.chdir(root)
+	clean(root)
+	freshen(root)
+
+	from packets import PacketFileProcessing
+
+	pfp = PacketFileProcessing()
+	pfp.add_userid(USER_ID)
+	pfp.add_all_stations()
+
+	meter = Meter()
+	with meter(how) as stage:
+		if how == 'json':
+			with open(filename, 'rb') as fd:
+				stage.count = len(json.load(fd)['packets'])
+		else:
+			pfp.process_packets(MEMORY_STATION)
+			stage.count = len(pfp.get_packets(MEMORY_STATION))
+	r = meter.results[how]
+	r['bytes'] = os.stat(filename).st_size
+	return r
+
+def run_png(root, repeat, how):
+	""" run_png - seconds to draw (and encode) one PNG of every station; headless (as -o does) or with pyplot (as it once was) """
+
+	os.chdir(root)
+	freshen(root)
+
+	import matplotlib
+	if how == 'pyplot':
+		# no GUI; but otherwise pyplot's layout and drawing
+		matplotlib.use('Agg')
+	from packets import PacketFileProcessing
+	from polar_map import PolarAntennaMap
+
+	pfp = PacketFileProcessing()
+	pfp.add_userid(USER_ID)
+	pfp.add_all_stations()
+	station_names = pfp.list_stations()
+	pfp.process_all_packets(station_names)
+
+	best = None
+	for ii in range(repeat):
+		plot = PolarAntennaMap(True, False)
+		for station_name in station_names:
+			plot.add_packets(station_name, pfp.get_packets(station_name))
+			plot.add_antenna(station_name, 45.0)
+		fd = io.BytesIO()
+		started = time.perf_counter()
+		if how == 'pyplot':
+			import matplotlib.pyplot as plt
+			with warnings.catch_warnings():
+				# show() does nothing with Agg - and says so
+				warnings.simplefilter('ignore', UserWarning)
+				plot.display()
+			plt.savefig(fd, dpi=PolarAntennaMap.dpi, transparent=False, format='png')
+			plt.close('all')
+		else:
+			plot.output(fd, 'png')
+		seconds = time.perf_counter() - started
+		best = seconds if best is None else min(best, seconds)
+	return {'seconds': round(best, 4), 'stations': len(station_names), 'bytes': len(fd.getvalue())}
+
+def _child(args, label):
+	""" _child - run this file again (with args) in its own process; so nothing is warmed up (or left in memory) by anything before; returns its results """
+
+	cmd = [sys.executable, os.path.abspath(__file__)] + args
+	try:
+		# the results are the last line (just in case anything else printed)
+		return json.loads(subprocess.check_output(cmd).decode('utf8').strip().split('\n')[-1])
+	except (OSError, ValueError, IndexError, subprocess.CalledProcessError) as e:
+		print('%s: %s - CONTINUE ANYWAY' % (label, e), file=sys.stderr)
+		return None
+
+def _save(output_filename, results):
+	""" _save """
+
+	if output_filename:
+		with open(output_filename, 'w', encoding='utf8') as fd:
+			json.dump(results, fd, indent=1)
+			fd.write('\n')
+
+def propagation(repeat):
+	""" propagation - how far (in degrees) the sgp4 propagator is from ephem, and how many propagations a second each does """
+
+	sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+	import numpy as np
+	from structures import LongLat, TLE
+	from propagator import Propagator
+
+	sgp4 = Propagator.get('sgp4')
+	reference = Propagator.get('ephem')
+
+	results = {'tolerance': PROPAGATION_TOLERANCE, 'accuracy': {}, 'speed': {}}
+	for name, line1, line2 in TLES:
+		tle = TLE(line1[2:7], name, line1, line2)
+		epoch = np.datetime64(datetime.datetime(2000 + int(line1[18:20]), 1, 1)) + np.timedelta64(int(round((float(line1[20:32]) - 1.0) * 86400e6)), 'us')
+		times = epoch + np.arange(-DAYS * 86400, DAYS * 86400, PROPAGATION_STEP) * np.timedelta64(1, 's')
+		el_error = 0.0
+		separation = 0.0
+		for lng, lat, elevation in OBSERVERS:
+			lnglat = LongLat(lng, lat)
+			_, _, _, az0, el0 = reference.where(tle, lnglat, elevation, times)
+			_, _, _, az1, el1 = sgp4.where(tle, lnglat, elevation, times)
+			el_error = max(el_error, float(np.max(np.abs(el1 - el0))))
+			# az on its own means little near the zenith - so the angle between the two directions; only when it's above the horizon
+			above = el0 > 0
+			if above.any():
+				a0, e0, a1, e1 = [np.radians(v[above]) for v in (az0, el0, az1, el1)]
+				cos_separation = np.sin(e0) * np.sin(e1) + np.cos(e0) * np.cos(e1) * np.cos(a1 - a0)
+				separation = max(separation, float(np.degrees(np.max(np.arccos(np.clip(cos_separation, -1.0, 1.0))))))
+		results['accuracy'][name] = {'el': round(el_error, 5), 'separation': round(separation, 5), 'count': len(times) * len(OBSERVERS)}
+
+	for propagator in (sgp4, reference):
+		lnglat = LongLat(OBSERVERS[0][0], OBSERVERS[0][1])
+		best = None
+		for ii in range(repeat):
+			started = time.perf_counter()
+			count = 0
+			for name, line1, line2 in TLES:
+				tle = TLE(line1[2:7], name, line1, line2)
+				propagator.where(tle, lnglat, OBSERVERS[0][2], times)
+				count += len(times)
+			seconds = time.perf_counter() - started
+			best = seconds if best is None else min(best, seconds)
+		results['speed'][propagator.name] = {'seconds': round(best, 4), 'count': count, 'per_second': int(count / best)}
+
+	return results
+
+def compare(results, baseline, threshold):
+	""" compare - returns a list of stages that are slower (or bigger) than the baseline by more than threshold """
+
+	regressions = []
+	for size, stages in results['results'].items():
+		if size not in baseline.get('results', {}):
+			continue
+		for stage, r in stages.items():
+			b = baseline['results'][size].get(stage)
+			if not b:
+				continue
+			for k, noise in (('seconds', MIN_SECONDS), ('peak_mb', MIN_MB)):
+				if r[k] - b[k] > noise and r[k] > b[k] * (1.0 + threshold):
+					regressions.append('%s %s %s: %s -> %s (+%.0f%%)' % (size, stage, k, b[k], r[k], 100.0 * (r[k] / b[k] - 1.0)))
+	return regressions
+
+def git_commit():
+	""" git_commit - so results can be matched to the code """
+
+	try:
+		return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode('utf8').strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def benchmark(args):
+	""" benchmark provides all the command line processing """
+
+	sizes = '1k,100k'
+	directory = None
+	n_stations = 4
+	output_filename = None
+	compare_filename = None
+	threshold = 20
+	repeat = 3
+	propagation_flag = False
+	azel_flag = False
+	memory_size = None
+	png_flag = False
+
+	usage = ('usage: benchmark '
+			+ '[-h|--help] '
+			+ '[[-n|--packets] N[,N...]] '
+			+ '[[-s|--stations] N] '
+			+ '[[-d|--directory] directory] '
+			+ '[[-o|--output] filename] '
+			+ '[[-c|--compare] filename] '
+			+ '[[-t|--threshold] percent] '
+			+ '[[-r|--repeat] N] '
+			+ '[-p|--propagation] '
+			+ '[-a|--azel] '
+			+ '[[-m|--memory] size] '
+			+ '[-g|--png]'
+			)
+
+	try:
+		opts, args = getopt.getopt(args, 'hn:s:d:o:c:t:r:pam:g', ['help', 'packets=', 'stations=', 'directory=', 'output=', 'compare=', 'threshold=', 'repeat=', 'propagation', 'azel', 'memory=', 'png'])
+	except getopt.GetoptError:
+		sys.exit(usage)
+
+	for opt, arg in opts:
+		if opt in ('-h', '--help'):
+			sys.exit(usage)
+		elif opt in ('-n', '--packets'):
+			sizes = arg
+		elif opt in ('-s', '--stations'):
+			n_stations = arg
+		elif opt in ('-d', '--directory'):
+			directory = arg
+		elif opt in ('-o', '--output'):
+			output_filename = arg
+		elif opt in ('-c', '--compare'):
+			compare_filename = arg
+		elif opt in ('-t', '--threshold'):
+			threshold = arg
+		elif opt in ('-r', '--repeat'):
+			repeat = arg
+		elif opt in ('-p', '--propagation'):
+			propagation_flag = True
+		elif opt in ('-a', '--azel'):
+			azel_flag = True
+		elif opt in ('-m', '--memory'):
+			memory_size = arg
+		elif opt in ('-g', '--png'):
+			png_flag = True
+		else:
+			sys.exit(usage)
+
+	if len(args) != 0:
+		sys.exit(usage)
+
+	try:
+		sizes = [(size, parse_size(size)) for size in sizes.split(',')]
+		n_stations = int(n_stations)
+		threshold = float(threshold) / 100.0
+		repeat = int(repeat)
+		if memory_size is not None:
+			memory_size = (memory_size, parse_size(memory_size))
+	except ValueError:
+		sys.exit('%s: packets, stations, threshold, repeat and memory size must be numeric' % ('benchmark'))
+	if repeat <= 0:
+		sys.exit('%s: repeat provided is invalid number' % ('benchmark'))
+	if n_stations <= 0 or any(n < n_stations for _, n in sizes):
+		sys.exit('%s: stations provided is invalid number' % ('benchmark'))
+
+	if propagation_flag:
+		results = propagation(repeat)
+		for name, v in results['accuracy'].items():
+			print('%-10s el %8.5f direction %8.5f degrees (%d times)' % (name, v['el'], v['separation'], v['count']))
+		for name, v in results['speed'].items():
+			print('%-10s %9.3fs %10d per second' % (name, v['seconds'], v['per_second']))
+		_save(output_filename, results)
+		if any(v['el'] > PROPAGATION_TOLERANCE or v['separation'] > PROPAGATION_TOLERANCE for v in results['accuracy'].values()):
+			print('INACCURATE: sgp4 is more than %s degrees from ephem' % (PROPAGATION_TOLERANCE))
+			sys.exit(1)
+		sys.exit(0)
+
+	if directory is None:
+		directory = os.path.join(os.environ.get('TMPDIR', '/tmp'), 'tinygs-benchmark')
+	directory = os.path.abspath(directory)
+
+	# the program's modules are next to this file
+	sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+	if memory_size is not None:
+		size, n_bytes = memory_size
+		root = directory + '/memory-' + size
+		print('%s: generating a %d byte packets file' % (size, n_bytes), file=sys.stderr)
+		filename = generate_big(root, n_bytes)
+		results = {}
+		for how in ('json', 'stream'):
+			print('%s: reading with %s' % (size, how), file=sys.stderr)
+			# the archive is removed first - so the file is always read in full
+			r = _child(['--run-memory', how, filename], size)
+			if r is None:
+				continue
+			results[how] = r
+			print('%6s %-8s %9.3fs %8.1fMB %d packets' % (size, how, r['seconds'], r['peak_mb'], r['count']))
+		_save(output_filename, results)
+		sys.exit(0)
+
+	if azel_flag or png_flag:
+		size, n_packets = sizes[0]
+		root = directory + '/' + size
+		print('%s: generating %d packets' % (size, n_packets), file=sys.stderr)
+		generate(root, n_packets, n_stations)
+		results = {}
+		if azel_flag:
+			r = _child(['--run-azel', root, str(repeat)], size)
+			if r is not None:
+				results['azel'] = r
+				for path, v in r['paths'].items():
+					print('%6s %-14s %9.3fs %10d per second el %8.5f' % (size, path, v['seconds'], v['per_second'], v['el']))
+		if png_flag:
+			results['png'] = {}
+			for how in ('headless', 'pyplot'):
+				r = _child(['--run-png', how, root, str(repeat)], size)
+				if r is None:
+					continue
+				results['png'][how] = r
+				print('%6s %-8s %9.3fs per PNG (%d stations) %d bytes' % (size, how, r['seconds'], r['stations'], r['bytes']))
+		_save(output_filename, results)
+		sys.exit(0)
+
+	results = {
+		'version': BENCHMARK_VERSION,
+		'commit': git_commit(),
+		'date': datetime.datetime.utcnow().replace(microsecond=0).isoformat(),
+		'host': platform.node(),
+		'python': platform.python_version(),
+		'stations': n_stations,
+		'results': {},
+	}
+
+	for size, n_packets in sizes:
+		root = directory + '/' + size
+		print('%s: generating %d packets' % (size, n_packets), file=sys.stderr)
+		generate(root, n_packets, n_stations)
+		stages = {}
+		for ii in range(repeat):
+			print('%s: running (%d of %d)' % (size, ii + 1, repeat), file=sys.stderr)
+			# each run is a separate process; so nothing is warmed up by an earlier run
+			r = _child(['--run', root], size)
+			if r is None:
+				continue
+			results['memory'] = r['memory']
+			# the best of the runs - the least affected by whatever else the machine was doing
+			for stage, v in r['stages'].items():
+				if stage not in stages:
+					stages[stage] = v
+				else:
+					stages[stage]['seconds'] = min(stages[stage]['seconds'], v['seconds'])
+					stages[stage]['peak_mb'] = min(stages[stage]['peak_mb'], v['peak_mb'])
+		if len(stages) == 0:
+			continue
+		results['results'][size] = stages
+		for stage in STAGES:
+			if stage in stages:
+				v = stages[stage]
+				print('%6s %-22s %9.3fs %8.1fMB %s' % (size, stage, v['seconds'], v['peak_mb'], v.get('count', '')))
+
+	_save(output_filename, results)
+
+	if compare_filename:
+		try:
+			with open(compare_filename, 'r', encoding='utf8') as fd:
+				baseline = json.load(fd)
+		except (IOError, ValueError) as e:
+			sys.exit('%s: %s' % ('benchmark', e))
+		if baseline.get('memory') != results.get('memory'):
+			print('%s: memory was measured differently - CONTINUE ANYWAY' % (compare_filename), file=sys.stderr)
+		regressions = compare(results, baseline, threshold)
+		for regression in regressions:
+			print('REGRESSION: %s' % (regression))
+		if regressions:
+			sys.exit(1)
+	sys.exit(0)
+
+def main(args=None):
+	""" main """
+	if args is None:
+		args = sys.argv[1:]
+	if len(args) >= 2 and args[0] in ('--run', '--run-azel', '--run-memory', '--run-png'):
+		# the child process - just one size (or mode)
+		sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+		if args[0] == '--run':
+			meter = run(os.path.abspath(args[1]))
+			print(json.dumps({'memory': meter.method, 'stages': meter.results}))
+		elif args[0] == '--run-azel':
+			print(json.dumps(run_azel(os.path.abspath(args[1]), int(args[2]))))
+		elif args[0] == '--run-memory':
+			print(json.dumps(run_memory(os.path.abspath(args[2]), args[1])))
+		else:
+			print(json.dumps(run_png(os.path.abspath(args[2]), int(args[3]), args[1])))
+		sys.exit(0)
+	benchmark(args)
+
+if __name__ == '__main__':
+	main()
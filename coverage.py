@@ -0,0 +1,168 @@
+"""
+	Coverage - how long satellites are expected to be above each az/el bucket; so packet counts can be compared to what was possible
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	coverage = Coverage(lnglat, elevation, theta_edges, radius_edges)
+	seconds = coverage.expected(Satellite.supported_names(), since, until, jobs=4, cache=RenderCache(directory))
+"""
+
+import io
+import sys
+import math
+import concurrent.futures
+
+import numpy as np
+
+from satellite import Satellite
+from render_cache import RenderCache
+from profiler import Profile
+
+class Coverage:
+	""" Coverage - each satellite is sampled every step seconds; each sample above the horizon adds step seconds to its bucket """
+
+	VERSION = 1
+	STEP = 60.0			# a pass is ~10 minutes - so that's plenty of samples per pass
+	CHUNK = 24*3600			# computed (and cached) a UTC day at a time; so a moving window reuses all but the ends
+	MIN_SECONDS = 10*60		# less time than this above a bucket and there's nothing to say about it
+
+	def __init__(self, lnglat, elevation, theta_edges, radius_edges, step=STEP):
+		""" Coverage - for one station; theta_edges and radius_edges are the AntennaMap bucket edges """
+
+		self._lnglat = lnglat
+		self._elevation = elevation
+		self._theta_edges = theta_edges
+		self._radius_edges = radius_edges
+		self._step = float(step)
+		self._propagator = Satellite.get_propagator()
+
+	def expected(self, satellite_names, since, until, jobs=1, cache=None):
+		""" expected - seconds above each bucket (all the satellites added up); since and until are seconds since 1970 (UTC) """
+
+		seconds = np.zeros((len(self._theta_edges) - 1, len(self._radius_edges) - 1))
+		chunks = self._chunks(since, until)
+
+		# the key has the TLE's used - so a new TLE only recomputes the days it's used for
+		keys = [self._key(start, end, satellite_names) for start, end in chunks]
+		missing = []
+		for chunk, key in zip(chunks, keys):
+			grid = self._cache_get(cache, key)
+			if grid is None:
+				Profile.count('coverage_cache_misses')
+				missing.append((chunk, key))
+			else:
+				Profile.count('coverage_cache_hits')
+				seconds += grid
+
+		if len(missing) == 0:
+			return seconds
+
+		grids, complete = self._compute(satellite_names, [chunk for chunk, _ in missing], jobs)
+		for (_, key), grid in zip(missing, grids):
+			seconds += grid
+			if complete:
+				# a satellite that couldn't be computed must not be remembered as never overhead
+				self._cache_put(cache, key, grid)
+		return seconds
+
+	def _compute(self, satellite_names, chunks, jobs):
+		""" _compute - one grid per chunk (and True if every satellite was computed); with jobs > 1 the satellites are split across processes """
+
+		Profile.count('coverage_samples', len(satellite_names) * sum(len(self._samples(start, end)) for start, end in chunks))
+		if jobs <= 1 or len(satellite_names) <= 1:
+			results = [self._satellite(satellite_name, chunks) for satellite_name in satellite_names]
+		else:
+			with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+				results = list(executor.map(self._satellite, satellite_names, [chunks] * len(satellite_names)))
+
+		grids = [np.zeros((len(self._theta_edges) - 1, len(self._radius_edges) - 1)) for _ in chunks]
+		complete = True
+		for result in results:
+			if result is None:
+				complete = False
+				continue
+			for grid, counts in zip(grids, result):
+				grid += counts
+		return grids, complete
+
+	def _satellite(self, satellite_name, chunks):
+		""" _satellite - every chunk in one batch; returns a grid per chunk (or None if the satellite has no TLE); a time too far from any TLE is simply never overhead """
+
+		samples = [self._samples(start, end) for start, end in chunks]
+		t = np.concatenate(samples)
+		Satellite.set_propagator(self._propagator)
+		sat = Satellite()
+		sat.set_observer(self._lnglat, self._elevation)
+		try:
+			_, _, _, az, el = sat.get_where_batch(satellite_name, np.round(t * 1e6).astype(np.int64).astype('datetime64[us]'))
+		except KeyError:
+			# we don't know where the satellite is
+			print("%s: %s no TLE - CONTINUE ANYWAY" % ('coverage', satellite_name), file=sys.stderr)
+			return None
+
+		grids = []
+		stop = 0
+		for s in samples:
+			start, stop = stop, stop + len(s)
+			above = el[start:stop] > 0
+			counts, _, _ = np.histogram2d(az[start:stop][above], el[start:stop][above], bins=(self._theta_edges, self._radius_edges))
+			grids.append(counts * self._step)
+		return grids
+
+	def _chunks(self, since, until):
+		""" _chunks - (start, end) pairs; split on UTC day boundaries """
+
+		# floats throughout - as they are part of the cache key
+		chunks = []
+		start = float(since)
+		until = float(until)
+		while start < until:
+			end = min(float((math.floor(start / Coverage.CHUNK) + 1) * Coverage.CHUNK), until)
+			chunks.append((start, end))
+			start = end
+		return chunks
+
+	def _samples(self, start, end):
+		""" _samples - on a fixed grid (not from start); so chunks never overlap or leave gaps """
+
+		return np.arange(math.ceil(start / self._step) * self._step, end, self._step)
+
+	def _key(self, start, end, satellite_names):
+		""" _key - everything that changes a chunk's grid """
+
+		parts = ['coverage', Coverage.VERSION, self._lnglat.lng, self._lnglat.lat, self._elevation, self._step, self._propagator, start, end, self._theta_edges, self._radius_edges]
+		sat = Satellite()
+		start_dt = np.datetime64(int(round(start * 1e6)), 'us')
+		end_dt = np.datetime64(int(round(end * 1e6)), 'us')
+		for satellite_name in satellite_names:
+			try:
+				parts += [satellite_name, sat.get_tle_epochs_between(satellite_name, start_dt, end_dt)]
+			except KeyError:
+				parts += [satellite_name, None]
+		return RenderCache.key(*parts)
+
+	@classmethod
+	def _cache_get(cls, cache, key):
+		""" _cache_get - None if not cached """
+
+		if cache is None:
+			return None
+		data = cache.get(key, 'npy')
+		if data is None:
+			return None
+		try:
+			return np.load(io.BytesIO(data), allow_pickle=False)
+		except (ValueError, OSError, EOFError) as e:
+			print("%s: %s - CONTINUE ANYWAY" % (key, e), file=sys.stderr)
+			return None
+
+	@classmethod
+	def _cache_put(cls, cache, key, grid):
+		""" _cache_put """
+
+		if cache is None:
+			return
+		buf = io.BytesIO()
+		np.save(buf, grid, allow_pickle=False)
+		cache.put(key, 'npy', buf.getvalue())
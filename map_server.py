@@ -0,0 +1,247 @@
+"""
+	Map Server - serve the maps over HTTP from the packets already in memory
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	server = MapServer(pfp, station_names)
+	server.serve_forever('127.0.0.1', 8080)
+
+	GET /station/<name>.png?days=N&style=BDATC&antenna=degrees
+"""
+
+import io
+import sys
+import math
+import time
+import threading
+import collections
+import concurrent.futures
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from polar_map import PolarAntennaMap
+from profiler import Profile
+
+class MapServer:
+	""" MapServer - rendered images are kept in memory (least recently used are dropped); the same image asked for at the same time is only drawn once """
+
+	CACHE_ENTRIES = 128
+	MAX_AGE = 3600			# even with no new packets, -d days moves on; so images don't live forever
+	STYLES = 'BDATC'
+
+	# between refreshes (even if a station is overdue - i.e. its download failed)
+	REFRESH_MIN_SLEEP = 5*60
+
+	def __init__(self, pfp, station_names, timebar_flag=False, timebin='day', theta_scale=None, radius_scale=None, render_cache=None, coverage_cache=None, verbose=False):
+		""" MapServer - pfp is a PacketFileProcessing that has processed all the station_names; with a coverage_cache the maps are packets per hour overhead """
+
+		self._pfp = pfp
+		self._station_names = station_names
+		self._timebar_flag = timebar_flag
+		self._timebin = timebin
+		self._theta_scale = theta_scale
+		self._radius_scale = radius_scale
+		self._render_cache = render_cache
+		self._coverage_cache = coverage_cache
+		self._verbose = verbose
+		self._days = None
+		self._style = None
+		self._antennas = {}
+		self._since = None
+		self._until = None
+
+		self._cache = collections.OrderedDict()		# key -> (time, data)
+		self._pending = {}				# key -> Future; images being drawn right now
+		self._cache_lock = threading.Lock()
+		# matplotlib's style is global - so one image is drawn at a time
+		self._render_lock = threading.Lock()
+		# packets are refreshed in another thread
+		self._data_lock = threading.Lock()
+
+	@property
+	def station_names(self):
+		""" station_names - those served """
+
+		return self._station_names
+
+	@property
+	def verbose(self):
+		""" verbose """
+
+		return self._verbose
+
+	def set_defaults(self, days=None, style=None, antennas=None, since=None, until=None):
+		""" set_defaults - for anything not in the request; antennas is a dict of station_name (or None for all) -> direction """
+
+		self._days = days
+		self._style = style.upper() if style else None
+		self._antennas = antennas or {}
+		self._since = since
+		self._until = until
+
+	def serve_forever(self, address, port):
+		""" serve_forever - until interrupted """
+
+		refresher = threading.Thread(target=self._refresh_packets, daemon=True)
+		refresher.start()
+
+		httpd = ThreadingHTTPServer((address, port), _MapRequestHandler)
+		httpd.daemon_threads = True
+		httpd.map_server = self
+		if self._verbose:
+			print('%s: serving on http://%s:%d/' % ('tinygs_antenna_map', address, port), file=sys.stderr)
+		try:
+			httpd.serve_forever()
+		finally:
+			httpd.server_close()
+
+	def image(self, station_name, days=None, style=None, antenna=None):
+		""" image - PNG bytes """
+
+		if days is None:
+			days = self._days
+		if style is None:
+			style = self._style
+		if antenna is None:
+			antenna = self._antennas.get(station_name, self._antennas.get(None))
+
+		with self._data_lock:
+			# new (or recomputed) packets make a new key - so a refresh never serves an old image
+			generation = self._pfp.generation(station_name)
+		key = (station_name, days, style, antenna, generation)
+
+		with self._cache_lock:
+			entry = self._cache.get(key)
+			if entry is not None and time.time() - entry[0] < MapServer.MAX_AGE:
+				self._cache.move_to_end(key)
+				Profile.count('serve_cache_hits')
+				return entry[1]
+			future = self._pending.get(key)
+			owner = future is None
+			if owner:
+				future = concurrent.futures.Future()
+				self._pending[key] = future
+
+		if not owner:
+			# someone else is drawing this one - so wait for theirs
+			Profile.count('serve_coalesced')
+			return future.result()
+
+		try:
+			data = self._render(station_name, days, style, antenna)
+		except Exception as e:
+			with self._cache_lock:
+				del self._pending[key]
+			future.set_exception(e)
+			raise
+
+		with self._cache_lock:
+			del self._pending[key]
+			self._cache[key] = (time.time(), data)
+			self._cache.move_to_end(key)
+			while len(self._cache) > MapServer.CACHE_ENTRIES:
+				self._cache.popitem(last=False)
+		future.set_result(data)
+		return data
+
+	def _render(self, station_name, days, style, antenna):
+		""" _render """
+
+		Profile.count('serve_renders')
+		with self._render_lock:
+			plot = PolarAntennaMap(self._timebar_flag, False, style_flag=style, theta_scale=self._theta_scale, radius_scale=self._radius_scale, render_cache=self._render_cache, timebin=self._timebin)
+			with self._data_lock:
+				# the plot keeps its own copy
+				plot.add_packets(station_name, self._pfp.get_packets(station_name), days, self._since, self._until)
+				if self._coverage_cache is not None:
+					plot.add_coverage(station_name, self._pfp.get_station(station_name), 1, self._coverage_cache)
+			if antenna is not None:
+				plot.add_antenna(station_name, antenna)
+			buf = io.BytesIO()
+			plot.output(buf, 'png')
+		return buf.getvalue()
+
+	def _refresh_packets(self):
+		""" _refresh_packets - runs in its own thread; the same refresh times as always """
+
+		while True:
+			wait = max(self._pfp.next_refresh(self._station_names) - time.time(), MapServer.REFRESH_MIN_SLEEP)
+			time.sleep(wait)
+			try:
+				with self._data_lock:
+					self._pfp.refresh_packets(self._station_names)
+			except Exception as e:
+				print("%s: %s - CONTINUE ANYWAY" % ('refresh', e), file=sys.stderr)
+
+class _MapRequestHandler(BaseHTTPRequestHandler):
+	""" _MapRequestHandler - GET /station/<name>.png only """
+
+	def do_GET(self):
+		""" do_GET """
+
+		url = urllib.parse.urlsplit(self.path)
+		path = urllib.parse.unquote(url.path)
+		if not path.startswith('/station/') or not path.endswith('.png'):
+			self.send_error(404)
+			return
+		station_name = path[len('/station/'):-len('.png')]
+
+		server = self.server.map_server
+		if station_name not in server.station_names:
+			self.send_error(404, 'Station not found')
+			return
+
+		try:
+			days, style, antenna = self._parse_query(url.query)
+		except ValueError as e:
+			self.send_error(400, str(e))
+			return
+
+		try:
+			data = server.image(station_name, days, style, antenna)
+		except Exception as e:
+			print("%s: %s - CONTINUE ANYWAY" % (station_name, e), file=sys.stderr)
+			self.send_error(500)
+			return
+
+		self.send_response(200)
+		self.send_header('Content-Type', 'image/png')
+		self.send_header('Content-Length', str(len(data)))
+		self.send_header('Cache-Control', 'max-age=%d' % (MapServer.REFRESH_MIN_SLEEP))
+		self.end_headers()
+		self.wfile.write(data)
+
+	@classmethod
+	def _parse_query(cls, query):
+		""" _parse_query - returns (days, style, antenna); normalized so the same image always has the same key """
+
+		q = urllib.parse.parse_qs(query)
+		days = style = antenna = None
+		if 'days' in q:
+			try:
+				days = int(q['days'][-1])
+			except ValueError:
+				raise ValueError('days provided is non numeric') from None
+			if days <= 0:
+				raise ValueError('days provided is invalid number')
+		if 'style' in q:
+			style = q['style'][-1].upper()
+			if style == '' or any(c not in MapServer.STYLES for c in style):
+				raise ValueError('style must be made up of %s' % (MapServer.STYLES))
+			style = ''.join(c for c in MapServer.STYLES if c in style)
+		if 'antenna' in q:
+			try:
+				antenna = float(q['antenna'][-1])
+			except ValueError:
+				raise ValueError('antenna direction provided is non numeric') from None
+			if not math.isfinite(antenna):
+				raise ValueError('antenna direction provided is invalid number')
+			antenna %= 360.0
+		return days, style, antenna
+
+	def log_message(self, format, *args):
+		""" log_message - only with -v """
+
+		if self.server.map_server.verbose:
+			super().log_message(format, *args)
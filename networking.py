@@ -6,10 +6,19 @@
 	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
 """
 
+import os
 import sys
+import time
+import json
+import tempfile
 import random
+import threading
+import concurrent.futures
 
 import requests
+import requests.adapters
+
+from profiler import Profile
 
 class Networking:
 	""" Networking - grab files/content from TinyGS API """
@@ -36,14 +45,30 @@ class Networking:
 		'Referer': 'https://tinygs.com/',
 		'User-Agent': random.choice(_USER_AGENTS),
 		'Accept': 'application/json, text/plain, */*',
-		'Accept-Language': 'en-us'
+		'Accept-Language': 'en-us',
+		'Accept-Encoding': 'gzip, deflate',
 	}
 
-	def __init__(self, verbose=False):
+	MAX_CONNECTIONS = 4			# concurrent downloads (and pooled connections)
+	TIMEOUT = (10.0, 60.0)			# connect and read timeouts (seconds)
+	RETRIES = 4				# after the first try
+	BACKOFF = 1.0				# seconds - doubled on each retry (with jitter)
+	BACKOFF_MAX = 30.0
+	CHUNK_SIZE = 64*1024
+
+	# ETag/Last-Modified are saved in a file next to the downloaded file
+	VALIDATORS_SUFFIX = '.validators'
+
+	# retry on these - anything else (i.e 404) is a failure now
+	_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+	def __init__(self, verbose=False, max_connections=MAX_CONNECTIONS):
 		""" Networking """
 
 		self._session = None
+		self._session_lock = threading.Lock()
 		self._verbose = verbose
+		self._max_connections = max_connections
 
 	def __del__(self):
 		""" __del__ """
@@ -57,8 +82,9 @@ class Networking:
 
 		# the stations file (i.e. we don't know the staion)
 		url = Networking._URL_API_STATIONS
-		headers = headers=Networking._HTTP_HEADERS
-		return self._api_call(url, headers, filename)
+		headers = Networking._HTTP_HEADERS
+		with Profile.stage('download'):
+			return self._api_call(url, headers, filename, conditional=True)
 
 	def packets(self, filename, station):
 		""" packets """
@@ -67,7 +93,20 @@ class Networking:
 		url = Networking._URL_API_PACKETS + '?station=' + station.name + '@' + str(station.user_id)
 		headers = Networking._HTTP_HEADERS.copy()
 		headers['Referer'] = 'https://tinygs.com/station/' + station.name + '@' + str(station.user_id)
-		return self._api_call(url, headers, filename)
+		with Profile.stage('download'):
+			return self._api_call(url, headers, filename)
+
+	def packets_many(self, jobs):
+		""" packets_many - jobs is a list of (filename, station); downloaded concurrently; returns a list of results """
+
+		calls = []
+		for filename, station in jobs:
+			url = Networking._URL_API_PACKETS + '?station=' + station.name + '@' + str(station.user_id)
+			headers = Networking._HTTP_HEADERS.copy()
+			headers['Referer'] = 'https://tinygs.com/station/' + station.name + '@' + str(station.user_id)
+			calls.append((url, headers, filename))
+		with Profile.stage('download'):
+			return self._api_calls(calls)
 
 	def tle(self, filename):
 		""" tle """
@@ -75,30 +114,134 @@ class Networking:
 		# the tle file
 		url = Networking._URL_API_TLE
 		headers = Networking._HTTP_HEADERS
-		return self._api_call(url, headers, filename)
+		with Profile.stage('download'):
+			return self._api_call(url, headers, filename, conditional=True)
+
+	def _api_calls(self, calls):
+		""" _api_calls - many calls at once; bounded by max_connections """
+
+		if len(calls) <= 1 or self._max_connections <= 1:
+			return [self._api_call(url, headers, filename) for url, headers, filename in calls]
 
-	def _api_call(self, url, headers, filename):
-		""" _api_call """
+		with concurrent.futures.ThreadPoolExecutor(max_workers=self._max_connections) as executor:
+			futures = [executor.submit(self._api_call, url, headers, filename) for url, headers, filename in calls]
+			return [future.result() for future in futures]
+
+	def _api_call(self, url, headers, filename, conditional=False):
+		""" _api_call - conditional calls only download if the file has changed on the server """
 
 		if self._verbose:
 			print("%s: downloading from %s" % (filename, url), file=sys.stderr)
 
-		if not self._session:
-			self._session = requests.Session()
+		validators = {}
+		if conditional:
+			validators = self._read_validators(filename)
+			headers = headers.copy()
+			if 'ETag' in validators:
+				headers['If-None-Match'] = validators['ETag']
+			if 'Last-Modified' in validators:
+				headers['If-Modified-Since'] = validators['Last-Modified']
 
 		try:
-			r = self._session.get(url, headers=headers, allow_redirects=True)
-			r.raise_for_status()
-			try:
-				# save away data - this is byte for byte from the web - no encoding needed
-				with open(filename, 'wb') as fd:
-					fd.write(r.content)
-			except IOError as e:
-				print("%s: %s - CONTINUE ANYWAY" % (filename, e), file=sys.stderr)
-				return False
+			with self._get(url, headers) as r:
+				if r.status_code == 304:
+					# Not Modified - so what we have is still good; mark it as fresh
+					Profile.count('http_not_modified')
+					if self._verbose:
+						print("%s: not modified" % (filename), file=sys.stderr)
+					os.utime(filename)
+					return True
+				try:
+					self._write_atomic(filename, r)
+				except IOError as e:
+					print("%s: %s - CONTINUE ANYWAY" % (filename, e), file=sys.stderr)
+					return False
+				if conditional:
+					self._write_validators(filename, r)
 		except Exception as e:
 			print("%s: %s - CONTINUE ANYWAY" % (url, e), file=sys.stderr)
 			return False
 
 		return True
 
+	@classmethod
+	def _write_atomic(cls, filename, r):
+		""" _write_atomic - streamed to a temp file then renamed; so a failure never leaves a truncated file """
+
+		# save away data - this is byte for byte from the web (after any gzip is undone) - no encoding needed
+		fd, tmp_filename = tempfile.mkstemp(prefix='.' + os.path.basename(filename) + '.', suffix='.tmp', dir=os.path.dirname(filename) or '.')
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				for chunk in r.iter_content(chunk_size=Networking.CHUNK_SIZE):
+					f.write(chunk)
+					Profile.count('http_bytes', len(chunk))
+			os.replace(tmp_filename, filename)
+		except BaseException:
+			os.unlink(tmp_filename)
+			raise
+
+	@classmethod
+	def _read_validators(cls, filename):
+		""" _read_validators - only used if the file itself is still there """
+
+		try:
+			if os.stat(filename).st_size == 0:
+				return {}
+			with open(filename + Networking.VALIDATORS_SUFFIX, 'r', encoding='utf8') as fd:
+				return json.load(fd)
+		except (IOError, ValueError):
+			return {}
+
+	@classmethod
+	def _write_validators(cls, filename, r):
+		""" _write_validators """
+
+		validators = {}
+		for k in ('ETag', 'Last-Modified'):
+			if k in r.headers:
+				validators[k] = r.headers[k]
+		try:
+			with open(filename + Networking.VALIDATORS_SUFFIX, 'w', encoding='utf8') as fd:
+				json.dump(validators, fd)
+		except IOError as e:
+			print("%s: %s - CONTINUE ANYWAY" % (filename + Networking.VALIDATORS_SUFFIX, e), file=sys.stderr)
+
+	def _get(self, url, headers):
+		""" _get - with timeouts and retries (exponential backoff with jitter) """
+
+		session = self._get_session()
+		attempt = 0
+		while True:
+			Profile.count('http_requests')
+			try:
+				r = session.get(url, headers=headers, allow_redirects=True, timeout=self.TIMEOUT, stream=True)
+				if r.status_code not in Networking._RETRY_STATUS_CODES or attempt >= self.RETRIES:
+					if r.status_code >= 400:
+						r.close()
+					r.raise_for_status()
+					return r
+				r.close()
+				e = requests.HTTPError('%d %s' % (r.status_code, r.reason), response=r)
+			except (requests.ConnectionError, requests.Timeout) as ee:
+				if attempt >= self.RETRIES:
+					raise
+				e = ee
+
+			# full jitter - so many stations don't all retry together
+			delay = random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF * (2 ** attempt)))
+			if self._verbose:
+				print("%s: %s - retry in %.1f seconds" % (url, e, delay), file=sys.stderr)
+			time.sleep(delay)
+			attempt += 1
+			Profile.count('http_retries')
+
+	def _get_session(self):
+		""" _get_session - one session (and hence connection pool) shared by all threads """
+
+		with self._session_lock:
+			if not self._session:
+				self._session = requests.Session()
+				adapter = requests.adapters.HTTPAdapter(pool_connections=self._max_connections, pool_maxsize=self._max_connections)
+				self._session.mount('https://', adapter)
+				self._session.mount('http://', adapter)
+			return self._session
@@ -0,0 +1,415 @@
+"""
+	Packet Archive - a station's packets (with their Az/El) as fixed width binary columns; append only and memory mapped
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	archive = PacketArchive(directory)
+	start = len(archive)
+	for filename in archive.changed_files():
+		for p in archive.read_file(filename):	# one packet at a time
+			...
+		archive.append(table, below)		# a batch at a time
+	archive.append(PacketTable(), None, pending_packets)
+	archive.save()
+	table = archive.table()
+	added = archive.table(start)
+	archive.rewrite(table, below)		# every row; i.e. after the az/el are computed again
+"""
+
+import os
+import sys
+import json
+import hashlib
+
+import numpy as np
+
+from packet_reader import PacketReader
+from packet_table import PacketTable
+from profiler import Profile
+
+class PacketArchive:
+	""" PacketArchive - one file per column, plus a small header; only the header says how many rows are valid """
+
+	VERSION = 2
+	DIRECTORY = 'archive'
+	HEADER_FILENAME = 'archive.json'
+	CHUNK_SIZE = 64*1024
+
+	# little endian - so the files can be copied between machines
+	_COLUMNS = (
+		('t', '<f8'),			# serverTime; seconds since 1970 (UTC)
+		('az', '<f4'),
+		('el', '<f4'),
+		('norad', '<i4'),
+		('flags', 'u1'),		# PacketTable.PARSED (otherwise a CRC ERROR)
+		('satellite', '<u2'),		# index into the header's satellites
+		('lng', '<f4'),			# sub-satellite point
+		('lat', '<f4'),
+		('alt', '<f4'),
+		('tle_epoch', '<f8'),		# the TLE the az/el came from; seconds since 1970 (UTC)
+		('ident_offsets', '<i8'),	# where each ident starts in the idents file
+	)
+
+	# each set of rows has its own files; the name is the prefix
+	ROWS = ''			# above the horizon - what table() returns
+	BELOW = 'below_'		# below the horizon - kept (not just their idents) so they can be computed again with a newer TLE
+	_STORES = (ROWS, BELOW)
+
+	def __init__(self, directory):
+		""" PacketArchive - directory is the station's directory """
+
+		self._directory = directory + '/' + PacketArchive.DIRECTORY
+		self._filename = self._directory + '/' + PacketArchive.HEADER_FILENAME
+		self._counts = {store: 0 for store in PacketArchive._STORES}
+		self._ident_bytes = {store: 0 for store in PacketArchive._STORES}
+		self._generation = 0		# rewrite() uses new files; so a table() already handed out is never changed
+		self._azel = {}			# what the az/el were computed with (the propagator and TLE's)
+		self._satellites = []
+		self._time_sorted = True	# every row is appended in time order (usual, as each download is newer than the last)
+		self._files = {}		# filename -> [size, mtime, sha1]
+		self._stats = {}		# filename -> os.stat() for this run
+		self._pending = {}		# ident -> packet; its az/el couldn't be computed (i.e. no TLE yet) - so it's tried again every run
+		self._seen = None		# every ident in the archive (below the horizon or pending); only built if new files are read
+		self._dirty = False
+		self._load()
+
+	def __len__(self):
+		return self._counts[PacketArchive.ROWS]
+
+	def table(self, start=0, store=ROWS):
+		""" table - a PacketTable from the start'th row onwards; the columns are read only views of the (memory mapped) files """
+
+		table = PacketTable()
+		count = self._counts[store]
+		if count <= start:
+			return table
+
+		columns = {name: self._memmap(store + name, dtype, count)[start:] for name, dtype in PacketArchive._COLUMNS}
+		# the idents are newline terminated - so they can be split in one go
+		idents = self._memmap(store + 'idents', 'u1', self._ident_bytes[store])[int(columns['ident_offsets'][0]):].tobytes().decode('utf8').split('\n')[:-1]
+		if len(idents) != count - start:
+			print("%s: idents do not match the columns - CONTINUE ANYWAY" % (self._filename), file=sys.stderr)
+			return table
+
+		del columns['ident_offsets']
+		return PacketTable.from_archive(idents, self._satellites, columns, self._time_sorted and store == PacketArchive.ROWS)
+
+	def below(self):
+		""" below - a PacketTable of the packets below the horizon """
+
+		return self.table(0, PacketArchive.BELOW)
+
+	def changed_files(self):
+		""" changed_files - files that are new, or have a different size/mtime, since they were last read """
+
+		self._stats = {}
+		changed = []
+		try:
+			with os.scandir(os.path.dirname(self._directory)) as it:
+				for entry in it:
+					if not entry.is_file() or entry.name[-5:] != '.json':
+						continue
+					s = entry.stat()
+					self._stats[entry.name] = s
+					if entry.name in self._files:
+						size, mtime, _ = self._files[entry.name]
+						if size == s.st_size and mtime == s.st_mtime:
+							continue
+					changed.append(entry.name)
+		except FileNotFoundError:
+			pass
+		return sorted(changed)
+
+	def most_recent_mtime(self):
+		""" most_recent_mtime - of the files seen by changed_files() """
+
+		most_recent_mtime = 0
+		for s in self._stats.values():
+			if s.st_mtime > most_recent_mtime:
+				most_recent_mtime = s.st_mtime
+		return most_recent_mtime
+
+	def read_file(self, filename):
+		""" read_file - a generator of the packets not already in the archive (or earlier in the file); the file is skipped if its contents have not changed; only once it's all read is it marked as read """
+
+		packets_filename = os.path.dirname(self._directory) + '/' + filename
+		with open(packets_filename, 'rb') as fd:
+			sha1 = self._sha1(fd)
+			s = os.fstat(fd.fileno())
+
+			if filename in self._files and self._files[filename][2] == sha1:
+				# touched; but the same contents
+				Profile.count('files_unchanged')
+			else:
+				# streamed - so only one packet is in memory at a time
+				fd.seek(0)
+				yield from self._new_packets(PacketReader(fd, PacketArchive.CHUNK_SIZE))
+				Profile.count('files_read')
+				Profile.count('bytes_decoded', s.st_size)
+
+		self._files[filename] = [s.st_size, s.st_mtime, sha1]
+		self._dirty = True
+
+	def replace_files(self, filenames, filename):
+		""" replace_files - filenames (all already read) have been merged into filename; so it's not read again """
+
+		for f in filenames:
+			self._files.pop(f, None)
+		with open(os.path.dirname(self._directory) + '/' + filename, 'rb') as fd:
+			sha1 = self._sha1(fd)
+			s = os.fstat(fd.fileno())
+		self._files[filename] = [s.st_size, s.st_mtime, sha1]
+		self._dirty = True
+
+	def pending(self):
+		""" pending - the packets whose az/el couldn't be computed last time """
+
+		return list(self._pending.values())
+
+	def azel(self):
+		""" azel - what the az/el were computed with; as given to set_azel() """
+
+		return dict(self._azel)
+
+	def set_azel(self, azel):
+		""" set_azel - a dict (of strings) """
+
+		if azel != self._azel:
+			self._azel = dict(azel)
+			self._dirty = True
+
+	def append(self, table, below=None, pending_packets=None):
+		""" append - the rows of a PacketTable (above the horizon) and below (a PacketTable of those below it); pending_packets (if given) replace the pending packets; can be called many times before save() """
+
+		if self._seen is None:
+			self._seen = self._all_idents()
+		os.makedirs(self._directory, exist_ok=True)
+
+		self._append(PacketArchive.ROWS, table)
+		if below is not None:
+			self._append(PacketArchive.BELOW, below)
+
+		if pending_packets is not None:
+			if self._pending or pending_packets:
+				self._pending = {str(p['id']): p for p in pending_packets}
+				self._seen.update(self._pending.keys())
+				self._dirty = True
+
+	def rewrite(self, table, below):
+		""" rewrite - every row is replaced; the new rows go in new files, which are only used once saved """
+
+		old_generation = self._generation
+		self._generation += 1
+		self._counts = {store: 0 for store in PacketArchive._STORES}
+		self._ident_bytes = {store: 0 for store in PacketArchive._STORES}
+		self._time_sorted = True
+		self._seen = set(self._pending.keys())
+		os.makedirs(self._directory, exist_ok=True)
+
+		self._append(PacketArchive.ROWS, table)
+		self._append(PacketArchive.BELOW, below)
+		self._dirty = True
+		self.save()
+		if self._dirty:
+			# not saved - so the old files are still the archive
+			return
+
+		for store in PacketArchive._STORES:
+			for name in [name for name, _ in PacketArchive._COLUMNS] + ['idents']:
+				try:
+					os.unlink(self._path(store + name, old_generation))
+				except OSError:
+					# i.e. still mapped on Windows - it's never used again anyway
+					pass
+
+	def _append(self, store, table):
+		""" _append - to one set of rows """
+
+		if len(table) == 0:
+			return
+
+		count = self._counts[store]
+		# each batch is in time order; which (most of the time) keeps the whole archive in time order
+		table = table.take(np.argsort(table.t, kind='stable'))
+		if store == PacketArchive.ROWS and count > 0 and table.t[0] < self._memmap('t', PacketArchive._COLUMNS[0][1], count)[-1]:
+			self._time_sorted = False
+
+		# satellite names are interned per table - so map the table's onto ours
+		codes = {name: ii for ii, name in enumerate(self._satellites)}
+		for name in table.satellites:
+			if name not in codes:
+				codes[name] = len(self._satellites)
+				self._satellites.append(name)
+		satellite_map = np.array([codes[name] for name in table.satellites], dtype=np.uint16)
+
+		idents = [ident.replace('\n', ' ') for ident in table.idents.tolist()]
+		encoded = [(ident + '\n').encode('utf8') for ident in idents]
+		lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+		offsets = self._ident_bytes[store] + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+		for name, dtype in PacketArchive._COLUMNS:
+			if name == 'satellite':
+				values = satellite_map[table.satellite]
+			elif name == 'ident_offsets':
+				values = offsets
+			else:
+				values = getattr(table, name)
+			self._write(store + name, count * np.dtype(dtype).itemsize, np.asarray(values, dtype=dtype).tobytes())
+		self._write(store + 'idents', self._ident_bytes[store], b''.join(encoded))
+
+		self._counts[store] += len(table)
+		self._ident_bytes[store] += int(lengths.sum())
+		self._seen.update(idents)
+		self._dirty = True
+
+	def save(self):
+		""" save - the header; only now are the appended rows part of the archive """
+
+		if not self._dirty:
+			return
+		tmp_filename = self._filename + '.tmp'
+		try:
+			os.makedirs(self._directory, exist_ok=True)
+			with Profile.stage('store_save'), open(tmp_filename, 'w', encoding='utf8') as fd:
+				json.dump({
+					'version': PacketArchive.VERSION,
+					'counts': self._counts,
+					'ident_bytes': self._ident_bytes,
+					'generation': self._generation,
+					'azel': self._azel,
+					'satellites': self._satellites,
+					'time_sorted': self._time_sorted,
+					'files': self._files,
+					'pending': list(self._pending.values()),
+				}, fd, separators=(',', ':'))
+			os.replace(tmp_filename, self._filename)
+			self._dirty = False
+		except IOError as e:
+			print("%s: %s - CONTINUE ANYWAY" % (self._filename, e), file=sys.stderr)
+
+	def _new_packets(self, packets):
+		""" _new_packets - a generator; de-duplicated against the archive and each other (the first one seen wins); only the idents are kept """
+
+		if self._seen is None:
+			self._seen = self._all_idents()
+		n_seen = 0
+		n_new = 0
+		for p in packets:
+			n_seen += 1
+			ident = str(p['id'])
+			if ident in self._seen:
+				continue
+			self._seen.add(ident)
+			n_new += 1
+			yield self._slim(p)
+		Profile.count('packets_seen', n_seen)
+		Profile.count('duplicates_dropped', n_seen - n_new)
+
+	@classmethod
+	def _sha1(cls, fd):
+		""" _sha1 - of the whole file """
+
+		sha1 = hashlib.sha1()
+		while True:
+			data = fd.read(PacketArchive.CHUNK_SIZE)
+			if not data:
+				break
+			sha1.update(data)
+		return sha1.hexdigest()
+
+	@classmethod
+	def _slim(cls, p):
+		""" _slim - only keep what's used; the parsed payload is replaced by a flag """
+
+		slim = {
+			'id': p['id'],
+			'serverTime': p['serverTime'],
+			'norad': p['norad'],
+			'satellite': p['satellite'],
+		}
+		try:
+			slim['satPos'] = {'lng': p['satPos']['lng'], 'lat': p['satPos']['lat'], 'alt': p['satPos']['alt']}
+		except (KeyError, TypeError):
+			pass
+		if p.get('parsed'):
+			# fully parsed packet (otherwise a CRC ERROR)
+			slim['parsed'] = True
+		return slim
+
+	def _all_idents(self):
+		""" _all_idents - a set of the idents in the archive (above or below the horizon) and those pending """
+
+		seen = set(self._pending.keys())
+		for store in PacketArchive._STORES:
+			if self._ident_bytes[store] > 0:
+				seen.update(self._memmap(store + 'idents', 'u1', self._ident_bytes[store]).tobytes().decode('utf8').split('\n')[:-1])
+		return seen
+
+	def _path(self, name, generation=None):
+		""" _path - of a column's file; generation 0 has no suffix """
+
+		if generation is None:
+			generation = self._generation
+		if generation == 0:
+			return self._directory + '/' + name
+		return self._directory + '/' + name + '.' + str(generation)
+
+	def _memmap(self, name, dtype, count):
+		""" _memmap - read only; only the first count items (anything after that was never saved) """
+
+		return np.memmap(self._path(name), dtype=dtype, mode='r', shape=(count,))
+
+	def _write(self, name, offset, data):
+		""" _write - at offset; which drops anything written (but never saved) by an earlier failed run """
+
+		filename = self._path(name)
+		with open(filename, 'ab') as fd:
+			fd.truncate(offset)
+			fd.write(data)
+
+	def _short_files(self, counts, ident_bytes):
+		""" _short_files - the files without as many rows as counts says (a failed run only ever leaves them longer) """
+
+		short = []
+		for store in PacketArchive._STORES:
+			sizes = [(store + name, counts[store] * np.dtype(dtype).itemsize) for name, dtype in PacketArchive._COLUMNS] + [(store + 'idents', ident_bytes[store])]
+			for name, size in sizes:
+				if size == 0:
+					continue
+				try:
+					if os.stat(self._path(name)).st_size >= size:
+						continue
+				except OSError:
+					pass
+				short.append(name)
+		return short
+
+	def _load(self):
+		""" _load - just the header; the columns are only mapped when needed """
+
+		try:
+			with Profile.stage('store_load'), open(self._filename, 'r', encoding='utf8') as fd:
+				j = json.load(fd)
+		except FileNotFoundError:
+			return
+		except (IOError, ValueError) as e:
+			print("%s: %s - CONTINUE ANYWAY" % (self._filename, e), file=sys.stderr)
+			return
+
+		if not isinstance(j, dict) or j.get('version') != PacketArchive.VERSION:
+			# old or unknown format - start again (all the files will be read)
+			return
+		self._generation = j['generation']
+		short = self._short_files(j['counts'], j['ident_bytes'])
+		if len(short) > 0:
+			# i.e. a partial copy or restore - start again (all the files will be read; and the columns written over)
+			print("%s: %s shorter than the header says - CONTINUE ANYWAY" % (self._filename, ', '.join(short)), file=sys.stderr)
+			return
+		self._counts = j['counts']
+		self._ident_bytes = j['ident_bytes']
+		self._azel = j['azel']
+		self._satellites = j['satellites']
+		self._time_sorted = j.get('time_sorted', False)
+		self._files = j['files']
+		self._pending = {str(p['id']): p for p in j.get('pending', [])}
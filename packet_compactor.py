@@ -0,0 +1,153 @@
+"""
+	Packet Compactor - merge a station's (mostly overlapping) downloaded packets files into one file; de-duplicated by packet id
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	compactor = PacketCompactor(directory)
+	filenames = compactor.compact(keep=False)
+	print(len(filenames), compactor.bytes_before, compactor.bytes_after, compactor.packets)
+"""
+
+import os
+import sys
+import json
+import time
+import tarfile
+import datetime
+import tempfile
+
+from packet_reader import PacketReader
+
+class PacketCompactor:
+	""" PacketCompactor - the merged file is checked before any file is removed """
+
+	COMPACTED_FILENAME = 'compacted.packets.json'
+
+	def __init__(self, directory):
+		""" PacketCompactor - directory is the station's directory """
+
+		self._directory = directory
+		self.filenames = []
+		self.bytes_before = 0
+		self.bytes_after = 0
+		self.packets_seen = 0
+		self.packets = 0
+		self.raw_filename = None
+
+	def compact(self, keep=False):
+		""" compact - returns a list of the files merged (and then removed); keep puts the raw files into a .tar.xz file first """
+
+		try:
+			filenames = sorted(filename for filename in os.listdir(self._directory) if filename.endswith('.packets.json'))
+		except FileNotFoundError:
+			return []
+		if len(filenames) < 2:
+			# nothing to merge
+			return []
+
+		fd, tmp_filename = tempfile.mkstemp(prefix='.' + PacketCompactor.COMPACTED_FILENAME + '.', suffix='.tmp', dir=self._directory)
+		try:
+			merged, seen, mtime = self._merge(filenames, fd)
+			if len(merged) < 2:
+				os.unlink(tmp_filename)
+				return []
+			self._verify(tmp_filename, seen)
+
+			raw_filenames = [filename for filename in merged if filename != PacketCompactor.COMPACTED_FILENAME]
+			if keep and len(raw_filenames) > 0:
+				self.raw_filename = self._tar(raw_filenames)
+
+			compacted_filename = self._directory + '/' + PacketCompactor.COMPACTED_FILENAME
+			os.replace(tmp_filename, compacted_filename)
+		except BaseException:
+			if os.path.exists(tmp_filename):
+				os.unlink(tmp_filename)
+			raise
+
+		# the newest file's time is what says when the station is next refreshed - so that's kept
+		os.utime(compacted_filename, (mtime, mtime))
+		self.bytes_after = os.stat(compacted_filename).st_size
+		for filename in raw_filenames:
+			os.unlink(self._directory + '/' + filename)
+		self.filenames = merged
+		return merged
+
+	def _merge(self, filenames, fd):
+		""" _merge - newest file first; so it's the newest copy of each packet that's kept """
+
+		merged = []
+		seen = set()
+		mtime = 0
+		with os.fdopen(fd, 'w', encoding='utf8') as out:
+			out.write('{"packets":[')
+			for filename in self._newest_first(filenames):
+				packets_filename = self._directory + '/' + filename
+				try:
+					with open(packets_filename, 'rb') as f:
+						s = os.fstat(f.fileno())
+						# a whole file at a time - so a bad file adds nothing (and is left alone)
+						packets = list(PacketReader(f))
+				except (IOError, ValueError) as e:
+					print("%s: %s - CONTINUE ANYWAY" % (packets_filename, e), file=sys.stderr)
+					continue
+
+				for p in packets:
+					ident = str(p['id'])
+					if ident in seen:
+						continue
+					if len(seen) > 0:
+						out.write(',')
+					out.write(json.dumps(p, separators=(',', ':'), ensure_ascii=False))
+					seen.add(ident)
+				merged.append(filename)
+				self.packets_seen += len(packets)
+				self.bytes_before += s.st_size
+				mtime = max(mtime, s.st_mtime)
+			out.write(']}\n')
+		self.packets = len(seen)
+		return merged, seen, mtime
+
+	def _newest_first(self, filenames):
+		""" _newest_first - by download date (in the filename, else its modification time); an earlier compacted file always comes last, as it only has older copies """
+
+		def download_time(filename):
+			try:
+				return datetime.datetime.strptime(filename[:-len('.packets.json')], '%Y-%m-%dT%H-%M-%S').replace(tzinfo=datetime.timezone.utc).timestamp()
+			except ValueError:
+				pass
+			try:
+				return os.stat(self._directory + '/' + filename).st_mtime
+			except OSError:
+				return 0
+
+		return sorted(filenames, key=lambda filename: (filename != PacketCompactor.COMPACTED_FILENAME, download_time(filename)), reverse=True)
+
+	@classmethod
+	def _verify(cls, filename, seen):
+		""" _verify - every packet is in the merged file, once """
+
+		idents = set()
+		n = 0
+		with open(filename, 'rb') as fd:
+			for p in PacketReader(fd):
+				idents.add(str(p['id']))
+				n += 1
+		if n != len(seen) or idents != seen:
+			raise ValueError('%s: merged file does not match (%d packets, %d expected) - nothing removed' % (filename, n, len(seen)))
+
+	def _tar(self, filenames):
+		""" _tar - the raw files in one compressed file (the files overlap so much this is small) """
+
+		raw_filename = self._directory + '/' + 'raw-' + time.strftime('%Y-%m-%dT%H-%M-%S', time.gmtime()) + '.tar.xz'
+		tmp_filename = raw_filename + '.tmp'
+		try:
+			with tarfile.open(tmp_filename, 'w:xz') as tar:
+				for filename in filenames:
+					tar.add(self._directory + '/' + filename, arcname=filename)
+			os.replace(tmp_filename, raw_filename)
+		except BaseException:
+			if os.path.exists(tmp_filename):
+				os.unlink(tmp_filename)
+			raise
+		return raw_filename
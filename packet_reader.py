@@ -0,0 +1,131 @@
+"""
+	Packet Reader - stream packets out of a downloaded packets file one at a time
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	with open(filename, 'rb') as fd:
+		reader = PacketReader(fd)
+		for p in reader:
+			...
+"""
+
+import json
+import codecs
+
+class PacketReader:
+	""" PacketReader - an incremental decode of {"packets": [...]} so only one packet is in memory at a time """
+
+	CHUNK_SIZE = 64*1024
+
+	_WHITESPACE = ' \t\n\r'
+	_NUMBER = '0123456789.eE+-'
+
+	def __init__(self, fd, chunk_size=CHUNK_SIZE):
+		""" PacketReader """
+
+		self._fd = fd
+		self._chunk_size = chunk_size
+		self._decoder = json.JSONDecoder()
+		self._utf8 = codecs.getincrementaldecoder('utf8')()
+		self._buf = ''
+		self._pos = 0
+		self._eof = False
+
+	def __iter__(self):
+		""" __iter__ - yields each packet in the "packets" list (other top level keys are ignored) """
+
+		self._expect('{')
+		if self._peek() == '}':
+			return
+		while True:
+			key = self._value()
+			self._expect(':')
+			if key == 'packets':
+				yield from self._array()
+			else:
+				_ = self._value()
+			if self._next() == '}':
+				break
+			self._back(',')
+
+	def _array(self):
+		""" _array """
+
+		self._expect('[')
+		if self._peek() == ']':
+			self._pos += 1
+			return
+		while True:
+			yield self._value()
+			if self._next() == ']':
+				break
+			self._back(',')
+
+	def _value(self):
+		""" _value - decode one complete JSON value, reading more of the file as needed """
+
+		self._skip()
+		while True:
+			try:
+				v, end = self._decoder.raw_decode(self._buf, self._pos)
+				# a number at the very end of the buffer may be incomplete
+				if self._eof or (end < len(self._buf) and self._buf[end] not in PacketReader._NUMBER):
+					self._pos = end
+					return v
+			except json.JSONDecodeError:
+				if self._eof:
+					raise
+			self._read()
+
+	def _next(self):
+		""" _next - the next non whitespace character """
+
+		self._skip()
+		if self._pos >= len(self._buf):
+			raise json.JSONDecodeError('Unexpected end of file', self._buf, self._pos)
+		c = self._buf[self._pos]
+		self._pos += 1
+		return c
+
+	def _peek(self):
+		""" _peek """
+
+		c = self._next()
+		self._pos -= 1
+		return c
+
+	def _back(self, c):
+		""" _back - confirm the previous character (a separator) """
+
+		if self._buf[self._pos - 1] != c:
+			raise json.JSONDecodeError('Expecting \'%s\'' % (c), self._buf, self._pos - 1)
+
+	def _expect(self, c):
+		""" _expect """
+
+		if self._next() != c:
+			raise json.JSONDecodeError('Expecting \'%s\'' % (c), self._buf, self._pos - 1)
+
+	def _skip(self):
+		""" _skip - whitespace """
+
+		while True:
+			while self._pos < len(self._buf) and self._buf[self._pos] in PacketReader._WHITESPACE:
+				self._pos += 1
+			if self._pos < len(self._buf) or not self._read():
+				return
+
+	def _read(self):
+		""" _read - more of the file into the buffer (dropping what has been used); False at end of file """
+
+		if self._eof:
+			return False
+		data = self._fd.read(self._chunk_size)
+		if not data:
+			self._eof = True
+			self._buf = self._buf[self._pos:] + self._utf8.decode(b'', final=True)
+		else:
+			self._buf = self._buf[self._pos:] + self._utf8.decode(data)
+		self._pos = 0
+		return True
@@ -0,0 +1,226 @@
+"""
+	Packet Table - packets stored as columns (numpy arrays) rather than one object per packet
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	table = PacketTable.from_columns(idents, times, norads, satellite_names, lngs, lats, alts, azs, els, parsed)
+	added = table.extend(other_table)
+	subset = table.take(mask)
+	last_week = table.window(since, until)
+	for packet in table:
+		...
+"""
+
+import datetime
+
+import numpy as np
+
+from structures import AzEl, LongLat, Packet
+
+class PacketTable:
+	""" PacketTable - time, az, el, norad, flags and interned satellite names; de-duplicated by packet ident """
+
+	PARSED = 0x01
+
+	_COLUMNS = (
+		('t', np.float64),		# seconds since 1970 (UTC)
+		('az', np.float64),
+		('el', np.float64),
+		('norad', np.int32),
+		('flags', np.uint8),
+		('satellite', np.uint16),	# index into satellites
+		('lng', np.float64),		# sub-satellite point
+		('lat', np.float64),
+		('alt', np.float64),
+		('tle_epoch', np.float64),	# the TLE the az/el came from; seconds since 1970 (UTC)
+	)
+
+	def __init__(self):
+		""" PacketTable """
+
+		self.idents = np.empty(0, dtype=object)
+		self.satellites = []
+		self._index = None		# ident -> row; built when first needed
+		self._sorted_t = None		# t in time order; built when first needed
+		self._order = None		# rows in time order; None if they already are
+		self._satellite_codes = {}
+		for name, dtype in PacketTable._COLUMNS:
+			setattr(self, name, np.empty(0, dtype=dtype))
+
+	def __len__(self):
+		return len(self.idents)
+
+	def __contains__(self, ident):
+		return ident in self._ident_index()
+
+	def __iter__(self):
+		for ii in range(len(self.idents)):
+			yield self.packet(ii)
+
+	@classmethod
+	def from_columns(cls, idents, t, norad, satellite_names, lng, lat, alt, az, el, parsed, tle_epoch=None):
+		""" from_columns - idents are expected to be unique """
+
+		table = cls()
+		table.idents = np.empty(len(idents), dtype=object)
+		table.idents[:] = idents
+		table._index = None
+		table.t = np.asarray(t, dtype=np.float64)
+		table.az = np.asarray(az, dtype=np.float64)
+		table.el = np.asarray(el, dtype=np.float64)
+		table.norad = np.asarray(norad, dtype=np.int32)
+		table.flags = np.where(np.asarray(parsed, dtype=bool), PacketTable.PARSED, 0).astype(np.uint8)
+		table.satellite = np.array([table._intern(name) for name in satellite_names], dtype=np.uint16)
+		table.lng = np.asarray(lng, dtype=np.float64)
+		table.lat = np.asarray(lat, dtype=np.float64)
+		table.alt = np.asarray(alt, dtype=np.float64)
+		table.tle_epoch = np.full(len(idents), np.nan) if tle_epoch is None else np.asarray(tle_epoch, dtype=np.float64)
+		return table
+
+	@classmethod
+	def from_archive(cls, idents, satellites, columns, time_sorted=False):
+		""" from_archive - columns is a dict of name -> array (i.e. numpy.memmap); used as is, so no copy is made """
+
+		table = cls()
+		table.idents = np.empty(len(idents), dtype=object)
+		table.idents[:] = idents
+		table._index = None
+		table.satellites = list(satellites)
+		table._satellite_codes = {name: ii for ii, name in enumerate(table.satellites)}
+		for name, _ in PacketTable._COLUMNS:
+			setattr(table, name, columns[name])
+		if time_sorted:
+			# no need to check
+			table._sorted_t = table.t
+		return table
+
+	@property
+	def parsed(self):
+		""" parsed - boolean array; False means a CRC ERROR """
+
+		return (self.flags & PacketTable.PARSED) != 0
+
+	def satellite_name(self, ii):
+		""" satellite_name """
+
+		return self.satellites[self.satellite[ii]]
+
+	def datetime(self, ii):
+		""" datetime - naive UTC (as the rest of the code uses) """
+
+		return datetime.datetime.utcfromtimestamp(self.t[ii])
+
+	def packet(self, ii):
+		""" packet - one row as a Packet object """
+
+		return Packet(self.idents[ii], self.datetime(ii), self.norad[ii], self.satellite_name(ii), LongLat(self.lng[ii], self.lat[ii]), self.alt[ii], AzEl(self.az[ii], self.el[ii]), True if self.flags[ii] & PacketTable.PARSED else None)
+
+	def take(self, rows):
+		""" take - a new table from a boolean mask or array of row numbers """
+
+		rows = np.asarray(rows)
+		if rows.dtype == bool:
+			rows = np.flatnonzero(rows)
+		table = PacketTable()
+		table.idents = self.idents[rows]
+		table._index = None
+		table.satellites = list(self.satellites)
+		table._satellite_codes = dict(self._satellite_codes)
+		for name, _ in PacketTable._COLUMNS:
+			setattr(table, name, getattr(self, name)[rows])
+		return table
+
+	def window(self, since=None, until=None):
+		""" window - the packets with since <= t < until (seconds since 1970; either can be None); found by binary search, in the original order """
+
+		sorted_t, order = self._time_index()
+		lo = 0 if since is None else int(np.searchsorted(sorted_t, since, side='left'))
+		hi = len(sorted_t) if until is None else int(np.searchsorted(sorted_t, until, side='left'))
+		if lo == 0 and hi == len(sorted_t):
+			return self
+		if order is None:
+			# already in time order - so the window is simply a slice (no copy)
+			table = self._slice(lo, hi)
+			table._sorted_t = table.t
+			return table
+		return self.take(np.sort(order[lo:hi]))
+
+	def extend(self, other):
+		""" extend - add the rows from other that are not already present; returns a table of the rows added """
+
+		if len(self.idents) == 0:
+			# nothing to de-duplicate against (or add to) - so share other's columns; no table is ever changed in place
+			self.idents = other.idents
+			self._index = None
+			self.satellites = list(other.satellites)
+			self._satellite_codes = dict(other._satellite_codes)
+			for name, _ in PacketTable._COLUMNS:
+				setattr(self, name, getattr(other, name))
+			self._sorted_t = other._sorted_t
+			self._order = other._order
+			return other
+
+		index = self._ident_index()
+		rows = [ii for ii, ident in enumerate(other.idents.tolist()) if ident not in index]
+		if len(rows) != len(other):
+			other = other.take(np.array(rows, dtype=np.intp))
+		if len(other) == 0:
+			return other
+
+		# satellite names are interned per table - so map other's onto ours
+		codes = np.array([self._intern(name) for name in other.satellites], dtype=np.uint16)
+
+		if self._index is not None:
+			n = len(self.idents)
+			for ii, ident in enumerate(other.idents.tolist()):
+				self._index[ident] = n + ii
+		self.idents = np.concatenate((self.idents, other.idents))
+		self._sorted_t = None
+		self._order = None
+		for name, _ in PacketTable._COLUMNS:
+			if name == 'satellite':
+				setattr(self, name, np.concatenate((self.satellite, codes[other.satellite])))
+			else:
+				setattr(self, name, np.concatenate((getattr(self, name), getattr(other, name))))
+		return other
+
+	def _slice(self, lo, hi):
+		""" _slice - rows lo to hi; the columns are views """
+
+		table = PacketTable()
+		table.idents = self.idents[lo:hi]
+		table.satellites = list(self.satellites)
+		table._satellite_codes = dict(self._satellite_codes)
+		for name, _ in PacketTable._COLUMNS:
+			setattr(table, name, getattr(self, name)[lo:hi])
+		return table
+
+	def _time_index(self):
+		""" _time_index - (t in time order, the rows in that order or None if they already are); built once per table """
+
+		if self._sorted_t is None:
+			if np.all(self.t[1:] >= self.t[:-1]):
+				self._order = None
+				self._sorted_t = self.t
+			else:
+				self._order = np.argsort(self.t, kind='stable')
+				self._sorted_t = self.t[self._order]
+		return self._sorted_t, self._order
+
+	def _ident_index(self):
+		""" _ident_index - built on first use; most tables are never searched """
+
+		if self._index is None:
+			self._index = {ident: ii for ii, ident in enumerate(self.idents.tolist())}
+		return self._index
+
+	def _intern(self, satellite_name):
+		""" _intern """
+
+		try:
+			return self._satellite_codes[satellite_name]
+		except KeyError:
+			self._satellite_codes[satellite_name] = len(self.satellites)
+			self.satellites.append(satellite_name)
+			return self._satellite_codes[satellite_name]
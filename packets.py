@@ -9,12 +9,19 @@
 import os
 import sys
 import time
-import json
 import datetime
+import itertools
+import concurrent.futures
 
-from structures import AzEl, LongLat, Station, Packet
+import numpy as np
+
+from packet_table import PacketTable
 from satellite import Satellite
 from networking import Networking
+from packet_archive import PacketArchive
+from packet_compactor import PacketCompactor
+from station_catalog import StationCatalog
+from profiler import Profile
 
 class PacketFileProcessing:
 	""" PacketFileProcessing - read files and generate data """
@@ -25,7 +32,10 @@ class PacketFileProcessing:
 	REFRESH_TIME_STATIONS = 5*24*3600		# Every five days for stations
 	REFRESH_TIME_TLE = 2*24*3600			# Every two days for TLE data
 
+	BATCH_SIZE = 10000				# packets decoded, computed and appended at a time; so memory doesn't grow with the files
+
 	_tle_checked = False
+	_worker = None
 
 	def __init__(self, verbose=False):
 		""" PacketFileProcessing """
@@ -35,14 +45,24 @@ class PacketFileProcessing:
 		self._my_stations = {}
 		self._sat = {}
 		self._packets = {}
-		self._networking = Networking()
+		self._archives = {}
+		self._generations = {}		# station_name -> bumped whenever its packets change (after the first time)
+		self._networking = Networking(verbose)
+		self._refreshed = set()
 		self._refresh = False
+		self._watch = False
 		self._verbose = verbose
 
 	def set_refresh(self, refresh=True):
 		""" set_refresh """
 
 		self._refresh = refresh
+
+	def set_watch(self, watch=True):
+		""" set_watch - keep each station's packets in memory so refresh_packets() only reads what's new """
+
+		self._watch = watch
+
 	def add_userid(self, user_id=None):
 		""" add_userid """
 
@@ -68,15 +88,19 @@ class PacketFileProcessing:
 			self._fetch_tle()
 			PacketFileProcessing._tle_checked = True
 
+		# straight to the stations wanted - no need to look at every station in the network
+		if match:
+			station_names = [match] if match in self._stations else []
+		elif self._user_id:
+			station_names = self._stations.by_user(self._user_id)
+		else:
+			station_names = list(self._stations)
+
 		found = False
-		ranking = 0
-		for station_name in self._stations:
-			ranking += 1
+		for station_name in station_names:
 			station = self._stations[station_name]
 			if self._user_id and self._user_id != station.user_id:
 				continue
-			if match and station_name != match:
-				continue
 
 			# does data for the station exist
 			if not os.path.isdir(PacketFileProcessing.DATA_DIRECTORY + '/' + station_name):
@@ -88,12 +112,10 @@ class PacketFileProcessing:
 				_ = self._fetch_packets_from_tinygs(station)
 
 			self._my_stations[station.name] = station
-			self._sat[station.name] = Satellite()
-			self._sat[station.name].set_observer(station.lnglat, station.elevation)
 			found = True
 
 			if self._verbose:
-				print('%s: Station processed! (#%d out of %d)' % (station.name, ranking, len(self._stations)), file=sys.stderr)
+				print('%s: Station processed! (#%d out of %d)' % (station.name, self._stations.ranking(station_name), len(self._stations)), file=sys.stderr)
 		if not found:
 			return False
 		return True
@@ -103,59 +125,257 @@ class PacketFileProcessing:
 
 		return sorted(self._my_stations.keys())
 
-	def process_packets(self, station_name):
-		""" process_packets """
+	def process_all_packets(self, station_names, jobs=1):
+		""" process_all_packets - with jobs > 1 each station is processed in a separate process """
 
-		uniq_packets = {}
+		# the downloads are the slow part - so refresh all the stations that need it at once
+		stations = [self._stations[station_name] for station_name in station_names if self._refresh or self._is_packets_old(station_name)]
+		if len(stations) > 1:
+			self._fetch_many_packets_from_tinygs(stations)
 
-		# process existing files - as a side effect, find the newest file
-		most_recent_mtime = 0
-		for _, _, files in os.walk(PacketFileProcessing.DATA_DIRECTORY + '/' + station_name):
-			for filename in files:
-				if filename[-5:] != '.json' :
-					continue
-				packets_filename = PacketFileProcessing.DATA_DIRECTORY + '/' + station_name + '/' + filename
+		if jobs <= 1 or len(station_names) <= 1:
+			for station_name in station_names:
+				self.process_packets(station_name)
+			return
+
+		stations = [self._stations[station_name] for station_name in station_names]
+		with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+			futures = [executor.submit(PacketFileProcessing._process_packets_worker, station, self._refresh, station.name in self._refreshed, self._verbose, Satellite.get_propagator(), Profile.enabled()) for station in stations]
+			for station, future in zip(stations, futures):
 				try:
-					with open(packets_filename, 'r', encoding='utf8') as fd:
-						j = json.load(fd)
-						if 'packets' not in j:
-							continue
-						p = self._read_packets(station_name, j['packets'])
-						# the uniquiness comes from using ident at the index; hence removing data with the same ident and hence date/time stamp
-						uniq_packets.update(p)
-
-						s = os.fstat(fd.fileno())
-						if s.st_mtime > most_recent_mtime:
-							most_recent_mtime = s.st_mtime
-				except IOError as e:
-					print("%s: %s - CONTINUE ANYWAY" % (packets_filename, e), file=sys.stderr)
+					self._packets[station.name], profile = future.result()
+					Profile.merge(profile)
+				except Exception as e:
+					print("%s: %s - CONTINUE ANYWAY" % (station.name, e), file=sys.stderr)
+					self._packets[station.name] = PacketTable()
+
+	@classmethod
+	def _process_packets_worker(cls, station, refresh, refreshed, verbose, propagator, profile=False):
+		""" _process_packets_worker - runs in a worker process; which keeps one PacketFileProcessing (and TLE's) for all its stations """
+
+		# a spawned worker doesn't inherit the parent's choice
+		Satellite.set_propagator(propagator)
+
+		if profile:
+			# the parent adds these into its own profile
+			Profile.enable()
+			Profile.reset()
+
+		if cls._worker is None:
+			cls._worker = PacketFileProcessing(verbose)
+		pfp = cls._worker
+		pfp.set_refresh(refresh)
+		if refreshed:
+			pfp._refreshed.add(station.name)
+		if pfp._stations is None:
+			pfp._stations = {}
+		pfp._stations[station.name] = station
+		pfp._my_stations[station.name] = station
+
+		pfp.process_packets(station.name)
+
+		# the results go back to the parent - nothing is kept here
+		pfp._sat.pop(station.name, None)
+		return pfp._packets.pop(station.name), (Profile.snapshot() if profile else None)
+
+	def process_packets(self, station_name):
+		""" process_packets """
+
+		# only new (or changed) files are read - everything else is already in the archive
+		archive = PacketArchive(PacketFileProcessing.DATA_DIRECTORY + '/' + station_name)
+		self._recompute_archive(station_name, archive)
+		self._update_archive(station_name, archive)
 
 		# check to see if we need to refresh the data files
-		if self._refresh or int(time.time() - most_recent_mtime) > PacketFileProcessing.REFRESH_TIME_PACKETS:
-			old_len = len(uniq_packets)
+		if station_name in self._refreshed:
+			# already done by process_all_packets()
+			pass
+		elif self._refresh or int(time.time() - archive.most_recent_mtime()) > PacketFileProcessing.REFRESH_TIME_PACKETS:
 			# We need fresh data!
 			station = self._stations[station_name]
-			filenames = self._fetch_packets_from_tinygs(station)
-
-			for filename in filenames:
-				if filename[-5:] != '.json' :
-					continue
-				packets_filename = PacketFileProcessing.DATA_DIRECTORY + '/' + station_name + '/' + filename
-				try:
-					with open(packets_filename, 'r', encoding='utf8') as fd:
-						j = json.load(fd)
-						if 'packets' not in j:
-							continue
-						p = self._read_packets(station_name, j['packets'])
-						# the uniquiness comes from using ident at the index; hence removing data with the same ident and hence date/time stamp
-						uniq_packets.update(p)
-				except IOError as e:
-					print("%s: %s - CONTINUE ANYWAY" % (packets_filename, e), file=sys.stderr)
+			_ = self._fetch_packets_from_tinygs(station)
+			added = self._update_archive(station_name, archive)
+			if self._verbose:
+				if len(added) > 0:
+					print('%s: Station refresh added %d packets' % (station.name, len(added)), file=sys.stderr)
+
+		archive.save()
+		self._packets[station_name] = archive.table()
+		if self._watch:
+			self._archives[station_name] = archive
+
+	def refresh_packets(self, station_names):
+		""" refresh_packets - fetch the stations that are due; returns a dict of station_name -> PacketTable of only the new packets (or None if all its packets changed; so start again with get_packets()) """
+
+		results = {}
+
+		# set_refresh() only applies to the first time around - from now on it's the usual refresh times
+		if self._is_file_old(PacketFileProcessing.DATA_DIRECTORY + '/' + 'tinygs_supported.txt', PacketFileProcessing.REFRESH_TIME_TLE):
+			self._networking.tle(PacketFileProcessing.DATA_DIRECTORY + '/' + 'tinygs_supported.txt')
+			Satellite.reload_tle()
+			# a new TLE can move packets already in any station's archive - not just those due a refresh
+			for station_name in station_names:
+				archive = self._archive(station_name)
+				if self._recompute_archive(station_name, archive):
+					self._set_packets(station_name, archive.table())
+					results[station_name] = None
+
+		stations = [self._stations[station_name] for station_name in station_names if self._is_packets_old(station_name)]
+		if len(stations) == 0:
+			return results
+		self._fetch_many_packets_from_tinygs(stations)
+
+		for station in stations:
+			archive = self._archive(station.name)
+			added = self._update_archive(station.name, archive)
+			archive.save()
+			if len(added) > 0:
+				self._set_packets(station.name, archive.table())
+			if station.name not in results:
+				results[station.name] = added
 			if self._verbose:
-				if len(uniq_packets) - old_len > 0:
-					print('%s: Station refresh added %d packets' % (station.name, len(uniq_packets) - old_len), file=sys.stderr)
+				print('%s: Station refresh added %d packets' % (station.name, len(added)), file=sys.stderr)
+		return results
+
+	def generation(self, station_name):
+		""" generation - changes whenever refresh_packets() changes the station's packets """
+
+		return self._generations.get(station_name, 0)
+
+	def _set_packets(self, station_name, table):
+		""" _set_packets """
+
+		self._packets[station_name] = table
+		self._generations[station_name] = self._generations.get(station_name, 0) + 1
+
+	def _archive(self, station_name):
+		""" _archive - kept (for watch) or read from disk (i.e. processed by a -j worker process) """
+
+		if station_name not in self._archives:
+			self._archives[station_name] = PacketArchive(PacketFileProcessing.DATA_DIRECTORY + '/' + station_name)
+		return self._archives[station_name]
+
+	def compact_packets(self, station_name, keep=False):
+		""" compact_packets - merge the station's packets files into one; returns the PacketCompactor (for its numbers) """
+
+		directory = PacketFileProcessing.DATA_DIRECTORY + '/' + station_name
+		# anything not already in the archive goes in first - so the merged file never needs reading
+		archive = PacketArchive(directory)
+		self._recompute_archive(station_name, archive)
+		self._update_archive(station_name, archive)
+
+		compactor = PacketCompactor(directory)
+		with Profile.stage('compact'):
+			filenames = compactor.compact(keep)
+		if len(filenames) > 0:
+			archive.replace_files(filenames, PacketCompactor.COMPACTED_FILENAME)
+		archive.save()
+		return compactor
+
+	def next_refresh(self, station_names):
+		""" next_refresh - when (as time.time()) the next station is due a refresh """
+
+		return min(self._packets_mtime(station_name) for station_name in station_names) + PacketFileProcessing.REFRESH_TIME_PACKETS
+
+	def _setup_station(self, station_name):
+		""" _setup_station - the observer is kept for the whole run """
+
+		if station_name in self._sat:
+			return
+		station = self._my_stations[station_name]
+		self._sat[station_name] = Satellite()
+		self._sat[station_name].set_observer(station.lnglat, station.elevation)
+
+	def _update_archive(self, station_name, archive):
+		""" _update_archive - read the new (or changed) files; a batch at a time, so memory doesn't grow with the files; returns a PacketTable of the packets added (those above the horizon) """
+
+		packets = self._new_packets(station_name, archive)
+		start = len(archive)
+		pending_packets = None
+		while True:
+			with Profile.stage('decode'):
+				batch = list(itertools.islice(packets, PacketFileProcessing.BATCH_SIZE))
+			if len(batch) == 0:
+				break
+			if pending_packets is None:
+				self._setup_station(station_name)
+				pending_packets = []
+			# the Az/El is computed here - and again only if a closer TLE turns up (see _recompute_archive())
+			table, below, failed = self._read_packets(station_name, batch)
+			archive.append(table, below)
+			pending_packets += failed
+
+		if pending_packets is not None:
+			archive.append(PacketTable(), None, pending_packets)
+		# as stored - so exactly the same as next time it's read
+		return archive.table(start)
+
+	def _new_packets(self, station_name, archive):
+		""" _new_packets - a generator; those that couldn't be computed last time (so they are tried again), then those in the new (or changed) files """
+
+		yield from archive.pending()
+		for filename in archive.changed_files():
+			packets_filename = PacketFileProcessing.DATA_DIRECTORY + '/' + station_name + '/' + filename
+			n = 0
+			try:
+				for p in archive.read_file(filename):
+					n += 1
+					yield p
+			except (IOError, ValueError) as e:
+				# what was read before the error is kept; the file isn't marked as read, so it's read again next time
+				print("%s: %s - CONTINUE ANYWAY" % (packets_filename, e), file=sys.stderr)
+				continue
+			if self._verbose:
+				print('%s: %d new packets' % (packets_filename, n), file=sys.stderr)
+
+	def _recompute_archive(self, station_name, archive):
+		""" _recompute_archive - packets whose Az/El came from a TLE (or propagator) that's no longer the one chosen are computed again; returns True if any were """
+
+		azel = {'propagator': Satellite.get_propagator(), 'tles': Satellite.get_tle_fingerprint()}
+		previous = archive.azel()
+		if previous == azel:
+			# nothing has changed since last time - the usual case
+			return False
+
+		# above and below the horizon - either can move to the other
+		tables = [archive.table(), archive.below()]
+		if sum(len(table) for table in tables) == 0:
+			archive.set_azel(azel)
+			return False
+
+		self._setup_station(station_name)
+		stale = [self._stale_rows(station_name, table, previous.get('propagator') != azel['propagator']) for table in tables]
+		if not any(rows.any() for rows in stale):
+			archive.set_azel(azel)
+			return False
 
-		self._packets[station_name] = uniq_packets
+		# a copy - as the archive's columns are read only
+		table = PacketTable()
+		for rows in tables:
+			table.extend(rows)
+		table = table.take(np.arange(len(table)))
+		stale = np.concatenate(stale)
+		dts = np.round(table.t * 1e6).astype(np.int64).astype('datetime64[us]')
+		by_satellite = {}
+		for code in np.unique(table.satellite[stale]).tolist():
+			by_satellite[table.satellites[code]] = np.flatnonzero(stale & (table.satellite == code))
+		azs, els, tle_epochs = self._compute_azel(station_name, by_satellite, dts)
+		table.az[stale] = azs[stale]
+		table.el[stale] = els[stale]
+		table.tle_epoch[stale] = tle_epochs[stale]
+		Profile.count('azel_recomputed', int(np.count_nonzero(stale)))
+
+		known = np.isfinite(table.el)
+		above = known & (table.el > 0)
+		archive.append(PacketTable(), None, archive.pending() + self._packets_from_table(table.take(~known)))
+		archive.set_azel(azel)
+		archive.rewrite(table.take(above), table.take(known & ~above))
+		return True
+
+	def get_station(self, station_name):
+		""" get_station """
+
+		return self._my_stations[station_name]
 
 	def get_packets(self, station_name):
 		""" get_packets """
@@ -165,9 +385,9 @@ class PacketFileProcessing:
 	def print_packets(self, station_name):
 		""" print_packets """
 
-		uniq_packets = self._packets[station_name]
-		for ident in sorted(uniq_packets, key=lambda v: (uniq_packets[v].dt)):
-			packet = uniq_packets[ident]
+		table = self._packets[station_name]
+		for ii in np.argsort(table.t, kind='stable').tolist():
+			packet = table.packet(ii)
 			if self._verbose:
 				if packet.parsed:
 					print('%s\t%s\t%s\t%5d:%s\t%16s %5.1f ; %16s' % (station_name, packet.ident, packet.dt.replace(microsecond=0).isoformat(), packet.norad, packet.satellite, packet.lnglat, packet.elevation, packet.azel), file=sys.stderr)
@@ -180,15 +400,32 @@ class PacketFileProcessing:
 					print('%s: %s @ %s CRC-ERROR' % (station_name, packet.satellite, packet.azel))
 
 	def _read_packets(self, station_name, packets):
-		""" _read_packets """
-
-		uniq_packets = {}
+		""" _read_packets - returns a PacketTable of the packets above the horizon, a PacketTable of those below it and a list of the packets that couldn't be computed """
+
+		with Profile.stage('read_packets'):
+			return self._read_packets_table(station_name, packets)
+
+	def _read_packets_table(self, station_name, packets):
+		""" _read_packets_table """
+
+		# first pass - decode the packets (into columns) and group them by satellite
+		idents = []
+		times = []
+		norads = []
+		satellite_names = []
+		lngs = []
+		lats = []
+		alts = []
+		parsed = []
+		by_satellite = {}
+		sources = []
+		seen = set()
 		for p in packets:
 			ident = str(p['id'])
-			if ident in uniq_packets:
+			if ident in seen:
 				continue
+			seen.add(ident)
 			jt = float(p['serverTime'])
-			dt = datetime.datetime.utcfromtimestamp(jt/1000.0)
 			norad = int(p['norad'])
 			satellite_name = str(p['satellite'])
 
@@ -196,32 +433,95 @@ class PacketFileProcessing:
 				norad = self._update_norad(satellite_name)
 
 			try:
-				lnglat = LongLat(float(p['satPos']['lng']), float(p['satPos']['lat']))
+				lng, lat = float(p['satPos']['lng']), float(p['satPos']['lat'])
 				elevation = float(p['satPos']['alt'])
-			except:
-				lnglat = LongLat(0.0, 0.0)
+			except (KeyError, TypeError, ValueError):
+				lng, lat = 0.0, 0.0
 				elevation = 0.0
 
+			if satellite_name not in by_satellite:
+				by_satellite[satellite_name] = []
+			by_satellite[satellite_name].append(len(idents))
+
+			sources.append(p)
+			idents.append(ident)
+			times.append(jt/1000.0)
+			norads.append(norad)
+			satellite_names.append(satellite_name)
+			lngs.append(lng)
+			lats.append(lat)
+			alts.append(elevation)
+			# 'parsed' is only present for fully parsed packets - otherwise it's a CRC ERROR
+			parsed.append(bool(p.get('parsed')))
+
+		times = np.array(times, dtype=np.float64)
+		dts = np.round(times * 1e6).astype(np.int64).astype('datetime64[us]')
+
+		# second pass - one batch Az/El computation per satellite
+		azs, els, tle_epochs = self._compute_azel(station_name, by_satellite, dts)
+
+		# below the horizon are kept aside (they're not drawn); unknown (nan) are to be tried again
+		table = PacketTable.from_columns(idents, times, norads, satellite_names, lngs, lats, alts, azs, els, parsed, tle_epochs)
+		known = np.isfinite(els)
+		above = known & (els > 0)
+		below = known & ~above
+		Profile.count('below_horizon', int(np.count_nonzero(below)))
+		Profile.count('propagation_failed', int(np.count_nonzero(~known)))
+		return table.take(above), table.take(below), [sources[ii] for ii in np.flatnonzero(~known).tolist()]
+
+	def _stale_rows(self, station_name, table, everything=False):
+		""" _stale_rows - a boolean array; the rows whose TLE is not the one that would be chosen now - no need to compute anything to find out """
+
+		if everything:
+			return np.ones(len(table), dtype=bool)
+		dts = np.round(table.t * 1e6).astype(np.int64).astype('datetime64[us]')
+		tle_epochs = np.full(len(table), np.nan)
+		for code in np.unique(table.satellite).tolist():
+			rows = np.flatnonzero(table.satellite == code)
 			try:
-				self._sat[station_name].set_satellite(satellite_name)
-				self._sat[station_name].set_when(dt)
-				_, _, azel = self._sat[station_name].get_where()
-			except:
+				tle_epochs[rows] = self._sat[station_name].get_tle_epochs(table.satellites[code], dts[rows])
+			except KeyError:
+				pass
+		return tle_epochs != table.tle_epoch
+
+	def _compute_azel(self, station_name, by_satellite, dts):
+		""" _compute_azel - by_satellite is satellite_name -> rows; returns az, el and the epoch of the TLE used (nan where it's not known) """
+
+		azs = np.full(len(dts), np.nan)
+		els = np.full(len(dts), np.nan)
+		tle_epochs = np.full(len(dts), np.nan)
+		for satellite_name, indexes in by_satellite.items():
+			try:
+				with Profile.stage('propagate'):
+					_, _, _, az, el = self._sat[station_name].get_where_batch(satellite_name, dts[indexes])
+					tle_epoch = self._sat[station_name].get_tle_epochs(satellite_name, dts[indexes])
+				Profile.count('ephem_computations', len(indexes))
+			except KeyError:
 				# we don't know where the satellite is
-				azel = AzEl(0,0)
-
-			if azel.el <= 0:
-				# below the horizon
+				print("%s: %s no TLE - CONTINUE ANYWAY" % (station_name, satellite_name), file=sys.stderr)
 				continue
+			azs[indexes] = az
+			els[indexes] = el
+			tle_epochs[indexes] = tle_epoch
+		return azs, els, tle_epochs
 
-			# the uniquiness comes from using ident at the index; hence removing data with the same ident and hence date/time stamp
-			if 'parsed' in p:
-				# fully parsed packet
-				uniq_packets[ident] = Packet(ident, dt, norad, satellite_name, lnglat, elevation, azel, p['parsed'])
-			else:
-				# CRC ERROR
-				uniq_packets[ident] = Packet(ident, dt, norad, satellite_name, lnglat, elevation, azel)
-		return uniq_packets
+	@classmethod
+	def _packets_from_table(cls, table):
+		""" _packets_from_table - back to (slimmed) packets; as read from a packets file """
+
+		packets = []
+		for ii in range(len(table)):
+			p = {
+				'id': table.idents[ii],
+				'serverTime': int(round(table.t[ii] * 1000.0)),
+				'norad': int(table.norad[ii]),
+				'satellite': table.satellite_name(ii),
+				'satPos': {'lng': float(table.lng[ii]), 'lat': float(table.lat[ii]), 'alt': float(table.alt[ii])},
+			}
+			if table.flags[ii] & PacketTable.PARSED:
+				p['parsed'] = True
+			packets.append(p)
+		return packets
 
 	def _fetch_stations_from_tinygs(self):
 		""" fetch_stations_from_tinygs """
@@ -238,22 +538,11 @@ class PacketFileProcessing:
 			# Grab a fresh copy from the web (yes - I said "the web")
 			self._networking.stations(stations_filename)
 
-		stations = {}
-		try:
-			with open(stations_filename, 'r', encoding='utf8') as fd:
-				j = json.load(fd)
-				for s in j:
-					# we don't use all the data from the json file
-					# we sanatize this data also - just in case (Oh, yes. Little Bobby Tables, we call him)
-					station_name = str(s['name']).replace('/','_').replace('.','_').replace(':','_')
-					user_id = int(s['userId'])
-					lnglat = LongLat(float(s['location'][1]), float(s['location'][0]))
-					stations[station_name] = Station(station_name, user_id, lnglat)
+		# only parsed if it's changed since last time; otherwise the pre-parsed catalog is used
+		catalog = StationCatalog(stations_filename)
+		if catalog.load():
 			# Success!
-			self._stations = stations
-
-		except IOError as e:
-			print("%s: %s - CONTINUE ANYWAY" % (stations_filename, e), file=sys.stderr)
+			self._stations = catalog
 
 	def _fetch_packets_from_tinygs(self, station):
 		""" fetch_packets_from_tinygs """
@@ -267,6 +556,38 @@ class PacketFileProcessing:
 		# we return a list just in case one day we fetch many files
 		return [filename]
 
+	def _fetch_many_packets_from_tinygs(self, stations):
+		""" fetch_many_packets_from_tinygs - concurrently """
+
+		now = datetime.datetime.utcnow()
+		# Filenames on Windows can't have :'s (colons) so keep this simple!
+		filename = now.strftime('%Y-%m-%dT%H-%M-00') + '.packets.json'
+		jobs = [(PacketFileProcessing.DATA_DIRECTORY + '/' + station.name + '/' + filename, station) for station in stations]
+		self._networking.packets_many(jobs)
+		for station in stations:
+			# even if it failed - no need to try again this run
+			self._refreshed.add(station.name)
+
+		return [filename]
+
+	def _is_packets_old(self, station_name):
+		""" _is_packets_old - based on the newest packets file """
+
+		return int(time.time() - self._packets_mtime(station_name)) > PacketFileProcessing.REFRESH_TIME_PACKETS
+
+	def _packets_mtime(self, station_name):
+		""" _packets_mtime - of the newest packets file; 0 if there are none """
+
+		most_recent_mtime = 0
+		try:
+			with os.scandir(PacketFileProcessing.DATA_DIRECTORY + '/' + station_name) as it:
+				for entry in it:
+					if entry.name[-5:] == '.json' and entry.stat().st_mtime > most_recent_mtime:
+						most_recent_mtime = entry.stat().st_mtime
+		except FileNotFoundError:
+			pass
+		return most_recent_mtime
+
 	def _fetch_tle(self):
 		""" fetch_tle """
 
@@ -6,144 +6,197 @@
 	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
 """
 
+import io
+import os
 import sys
 import math
-import datetime
 
+import numpy as np
 import matplotlib
-import matplotlib.pyplot as plt
+import matplotlib.style
 import matplotlib.cm as cm
 import matplotlib.colors as colors
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
-class PolarAntennaMap:
-	""" PolarAntennaMap """
+from antenna_map import AntennaMap
+from render_cache import RenderCache
+from profiler import Profile
+
+# an alpha per dot needs matplotlib 3.4 or later; compared as numbers (as '3.11' < '3.4')
+_ALPHA_PER_DOT = tuple(int(v) for v in matplotlib.__version__.split('.')[:2]) >= (3, 4)
 
-	theta_scale = 22.5			# Azimuth
-	radius_scale = 10.0			# Elevation
+class PolarAntennaMap(AntennaMap):
+	""" PolarAntennaMap """
 
 	dot_size = 1.0
+	dpi = 150
+	MAX_THETA_GRIDS = 16
+	MAX_RADIUS_GRIDS = 10
+
+	_COMPASS = {0.0: 'N', 45.0: 'NE', 90.0: 'E', 135.0: 'SE', 180.0: 'S', 225.0: 'SW', 270.0: 'W', 315.0: 'NW'}
+	DRAWING_VERSION = 3			# part of each cached image's key; so a change to how things are drawn isn't hidden by the cache
 
-	def __init__(self, timebar_flag, bysatellite_flag, style_flag=None):
-		""" PolarAntennaMap """
+	def __init__(self, timebar_flag, bysatellite_flag, style_flag=None, theta_scale=None, radius_scale=None, render_cache=None, timebin='day'):
+		""" PolarAntennaMap - theta_scale and radius_scale are the bucket sizes (in degrees); render_cache is a RenderCache (or None); timebin is hour, day or week """
 
-		self._stations = []
-		self._packets = {}
-		self._buckets = {}
-		self._antenna_direction = {}
+		super().__init__(bysatellite_flag, theta_scale=theta_scale, radius_scale=radius_scale)
 		self._processed = False
 		self._fig = None
 		self._axs = None
+		self._caxs = None
+		self._timebar_ax = None
+		self._template = None
 		self._cmap = None
 		self._timebar_flag = timebar_flag
-		self._bysatellite_flag = bysatellite_flag
+		self._timebin = timebin
 		self._style_flag = style_flag
-
-	def add_packets(self, station_name, packets=None, max_days=None):
-		""" add_packets """
-
-		if packets is None or len(packets) == 0:
-			return
-
-		now = datetime.datetime.utcnow()
-
-		for p in packets:
-			packet = packets[p]
-
-			# we index by station_name or norad/satellite depending on flags
-			if self._bysatellite_flag:
-				packet_index = "%s (%s)" % (packet.satellite, packet.norad)
-			else:
-				packet_index = station_name
-
-			if packet_index not in self._packets:
-				self._stations.append(packet_index)
-				self._packets[packet_index] = {}
-				self._buckets[packet_index] = {}
-
-
-			if packet.ident in self._packets[packet_index]:
-				# seen already
-				continue
-			if max_days and (now - packet.dt) > datetime.timedelta(days=max_days):
-				# too old
-				continue
-			self._packets[packet_index][packet.ident] = packet
-
-			az_bucket = math.floor(packet.azel.az/PolarAntennaMap.theta_scale) * PolarAntennaMap.theta_scale
-			el_bucket = math.floor(packet.azel.el/PolarAntennaMap.radius_scale) * PolarAntennaMap.radius_scale
-			k = (az_bucket, el_bucket)
-
-			if packet.parsed:
-				# only add to bucket if it's a parsed packet
-				try:
-					self._buckets[packet_index][k] += 1
-				except KeyError:
-					self._buckets[packet_index][k] = 1
-
-	def add_antenna(self, station_name, direction):
-		""" add_antenna """
-
-		self._antenna_direction[station_name] = float(direction)
+		self._render_cache = render_cache
 
 	def display(self):
 		""" display """
 
+		# only the desktop display needs pyplot (and hence a GUI backend)
+		import matplotlib.pyplot as plt
+
 		if not self._processed:
-			self._process()
+			with Profile.stage('layout'):
+				self._process()
 			self._processed = True
 		plt.show()
 
 	def output(self, fd, file_format='png'):
-		""" output """
+		""" output - headless; no pyplot, no GUI backend and a fixed layout """
+
+		if self._render_cache is None:
+			self._render(fd, file_format)
+			return
+
+		# nothing changed since last time - then there's no need to draw anything
+		key = self._render_key(sorted(self._stations), self._timebar_flag, file_format)
+		data = self._render_cache.get(key, file_format)
+		if data is None:
+			Profile.count('render_cache_misses')
+			buf = io.BytesIO()
+			self._render(buf, file_format)
+			data = buf.getvalue()
+			self._render_cache.put(key, file_format, data)
+		else:
+			Profile.count('render_cache_hits')
+		fd.write(data)
+
+	def _render(self, fd, file_format):
+		""" _render """
 
 		if not self._processed:
-			self._process()
+			with Profile.stage('layout'):
+				self._process(headless=True)
 			self._processed = True
-		plt.tight_layout()
-		plt.savefig(fd, dpi=150, transparent=False, format=file_format)
+		with Profile.stage('encode'):
+			self._fig.savefig(fd, dpi=PolarAntennaMap.dpi, transparent=False, format=file_format)
+
+	def output_all(self, directory, file_format='png', packet_indexes=None):
+		""" output_all - one file per station (or satellite); the figure is built once and only the data is swapped """
+
+		if packet_indexes is None:
+			packet_indexes = sorted(self._stations)
+		filenames = []
+		for packet_index in packet_indexes:
+			# we sanitize this - as satellite names are not always filename friendly
+			filename = directory + '/' + str(packet_index).replace('/','_').replace(':','_') + '.' + file_format
+			filenames.append(filename)
+
+			# each image is the same as output() for this station alone (without the timebar) - so they share a key
+			data = None
+			if self._render_cache is not None:
+				key = self._render_key([packet_index], False, file_format)
+				data = self._render_cache.get(key, file_format)
+
+			if data is None:
+				with Profile.stage('layout'):
+					if self._template is None:
+						# only built if something needs drawing
+						self._build_template()
+					self._fill_template(packet_index)
+				buf = io.BytesIO()
+				with Profile.stage('encode'):
+					self._fig.savefig(buf, dpi=PolarAntennaMap.dpi, transparent=False, format=file_format)
+				data = buf.getvalue()
+				if self._render_cache is not None:
+					Profile.count('render_cache_misses')
+					self._render_cache.put(key, file_format, data)
+			else:
+				Profile.count('render_cache_hits')
 
-	def _process(self):
+			# written to a temp file first - so anything watching the directory never sees a half written image
+			tmp_filename = filename + '.tmp'
+			try:
+				with open(tmp_filename, 'wb') as fd:
+					fd.write(data)
+				os.replace(tmp_filename, filename)
+			except IOError as e:
+				print("%s: %s - CONTINUE ANYWAY" % (filename, e), file=sys.stderr)
+		return filenames
+
+	def _render_key(self, packet_indexes, timebar_flag, file_format):
+		""" _render_key - a hash of everything that changes the image """
+
+		parts = [PolarAntennaMap.DRAWING_VERSION, matplotlib.__version__, file_format, PolarAntennaMap.dpi, self._style_flag, timebar_flag, self._bysatellite_flag, self._max_days, self._since, self._until, self._theta_edges, self._radius_edges]
+		for packet_index in packet_indexes:
+			table = self._packets[packet_index]
+			parts += [packet_index, self._antenna_direction.get(packet_index), self._buckets[packet_index], self._coverage.get(packet_index), table.az, table.el, table.parsed]
+			if timebar_flag:
+				parts += [self._timebin, table.t]
+		return RenderCache.key(*parts)
+
+	def _process(self, headless=False):
 		""" _process """
 
 		# https://matplotlib.org/stable/gallery/style_sheets/style_sheets_reference.html
-		plt.style.use('classic')
+		matplotlib.style.use('classic')
 
 		# https://matplotlib.org/stable/gallery/color/colormap_reference.html
-		self._cmap = plt.cm.OrRd
+		self._cmap = cm.OrRd
 
-		# N plots needed
+		# This seems wrong - but I'm sticking with it for now
 		if self._timebar_flag:
-			self._fig, self._axs = plt.subplots(1+1, len(self._stations), sharex=False, sharey=False, subplot_kw=dict(projection='polar'))
-			# needed for 1+1
-			self._axs = self._axs[0]
+			width_inches = 3
+			height_inches = 8
 		else:
-			self._fig, self._axs = plt.subplots(1, len(self._stations), sharex=False, sharey=False, subplot_kw=dict(projection='polar'))
+			width_inches = 3
+			height_inches = 5
+
+		# N plots needed
+		if headless:
+			self._fig = Figure(figsize=(width_inches * len(self._stations), height_inches))
+			FigureCanvasAgg(self._fig)
+			self._fixed_layout(width_inches, height_inches)
+		else:
+			import matplotlib.pyplot as plt
+			if self._timebar_flag:
+				self._fig, self._axs = plt.subplots(1+1, len(self._stations), sharex=False, sharey=False, subplot_kw=dict(projection='polar'))
+				# needed for 1+1
+				self._axs = self._axs[0]
+			else:
+				self._fig, self._axs = plt.subplots(1, len(self._stations), sharex=False, sharey=False, subplot_kw=dict(projection='polar'))
 
-		if len(self._stations) == 1:
-			# Somewhere in the docs it says use squeeze - but that didn't work
-			self._axs = [self._axs]
+			if len(self._stations) == 1:
+				# Somewhere in the docs it says use squeeze - but that didn't work
+				self._axs = [self._axs]
+			self._caxs = [None] * len(self._stations)
 
 		n = 0
 		for packet_index in sorted(self._stations):
 			n_packets = len(self._packets[packet_index])
-			v_max = 0
-			for k in self._buckets[packet_index]:
-				if self._buckets[packet_index][k] > v_max:
-					v_max = self._buckets[packet_index][k]
 
-			self._per_station_polar_plot(n, packet_index, n_packets, v_max)
+			self._per_station_polar_plot(n, packet_index, n_packets)
 			n += 1
 
 		if self._timebar_flag:
 			self._per_day_bar_plot()
 
-		# This seems wrong - but I'm sticking with it for now
-		if self._timebar_flag:
-			width_inches = 3
-			height_inches = 8
-		else:
-			width_inches = 3
-			height_inches = 5
+		if headless:
+			return
 
 		self._fig.set_size_inches(width_inches * len(self._stations), height_inches)
 
@@ -151,38 +204,163 @@ class PolarAntennaMap:
 		# https://github.com/matplotlib/matplotlib/issues/16550
 		# https://matplotlib.org/stable/tutorials/intermediate/tight_layout_guide.html
 		# using constrained_layout=True on subplots() above is even worse!
+		# (the headless output() path uses _fixed_layout() instead)
 		self._fig.tight_layout()
 
 		title = ' '.join(sorted(self._stations))
 		# self._fig.canvas.set_window_title(title)
 		plt.get_current_fig_manager().set_window_title(title)
 
-	def _per_station_polar_plot(self, n, packet_index, n_packets, v_max):
-		""" _per_station_polar_plot """
+	def _fixed_layout(self, width_inches, height_inches, n_columns=None):
+		""" _fixed_layout - precomputed positions (in inches) for each axes; replaces tight_layout() """
+
+		if n_columns is None:
+			n_columns = len(self._stations)
+
+		polar_size = 2.2			# diameter
+		polar_top = 1.05			# room for the title and N label
+		colorbar_gap = 0.6			# room for the S label
+		colorbar_height = 0.15
+
+		total_width = width_inches * n_columns
+
+		def rect(left, bottom, width, height):
+			return [left/total_width, bottom/height_inches, width/total_width, height/height_inches]
+
+		self._axs = []
+		self._caxs = []
+		polar_bottom = height_inches - polar_top - polar_size
+		for n in range(n_columns):
+			left = n * width_inches + (width_inches - polar_size)/2.0
+			self._axs.append(self._fig.add_axes(rect(left, polar_bottom, polar_size, polar_size), projection='polar'))
+			if not self._style_flag or 'C' in self._style_flag:
+				self._caxs.append(self._fig.add_axes(rect(left, polar_bottom - colorbar_gap - colorbar_height, polar_size, colorbar_height)))
+			else:
+				self._caxs.append(None)
+
+		if self._timebar_flag:
+			# room for the rotated dates and labels below; and the title above
+			self._timebar_ax = self._fig.add_axes(rect(0.75, 1.0, total_width - 1.0, polar_bottom - colorbar_gap - colorbar_height - 1.0 - 1.2), label='packets per day')
+
+	def _build_template(self):
+		""" _build_template - a single station figure with every bucket, an empty scatter and a colorbar; ready to be filled """
+
+		# https://matplotlib.org/stable/gallery/style_sheets/style_sheets_reference.html
+		matplotlib.style.use('classic')
+
+		# https://matplotlib.org/stable/gallery/color/colormap_reference.html
+		self._cmap = cm.OrRd
+
+		self._fig = Figure(figsize=(3, 5))
+		FigureCanvasAgg(self._fig)
+		self._fixed_layout(3, 5, n_columns=1)
+		ax = self._axs[0]
+		self._template = {}
 
 		if not self._style_flag or 'B' in self._style_flag:
-			# build the actual plot - background color shading
-			theta = []
-			bottom = []
-			radii = []
-			width = []
-			shades = []
+			# one bar per bucket (in the same order as the buckets array); hidden until it has a count
+			az_index, el_index = np.meshgrid(np.arange(len(self._theta_edges) - 1), np.arange(len(self._radius_edges) - 1), indexing='ij')
+			az_index = az_index.ravel()
+			el_index = el_index.ravel()
+			width = np.diff(self._theta_edges)[az_index]
+			theta = self._degrees_to_radians(self._theta_edges[az_index] + width/2.0)
+			bottom = self._map_el(self._radius_edges[el_index])
+			radii = -np.diff(self._radius_edges)[el_index]
+			bars = ax.bar(theta, radii, bottom=bottom, width=self._degrees_to_radians(width), color='white', alpha=0.9, linewidth=0.25, zorder=1)
+			for patch in bars.patches:
+				patch.set_visible(False)
+			self._template['bars'] = bars.patches
 
-			for k in self._buckets[packet_index]:
-				az_bucket, el_bucket = k
+		if not self._style_flag or 'D' in self._style_flag:
+			self._template['dots'] = ax.scatter([], [], linewidth=0.0, zorder=2)
 
-				v = self._buckets[packet_index][k]
+		self._polar_grids(ax)
 
-				# angle
-				theta.append(self._degrees_to_radians(az_bucket + PolarAntennaMap.theta_scale/2.0))
-				width.append(self._degrees_to_radians(PolarAntennaMap.theta_scale))
+		if not self._style_flag or 'T' in self._style_flag:
+			self._template['title'] = ax.set_title('', pad=24.0, fontdict={'fontsize':'medium'})
+
+		if not self._style_flag or 'C' in self._style_flag:
+			v_cmap = cm.ScalarMappable(norm=colors.Normalize(vmin=0, vmax=1), cmap=self._cmap)
+			v_cmap.set_array([])
+			cbar = self._fig.colorbar(v_cmap, cax=self._caxs[0], orientation='horizontal')
+			cbar.set_label('#Packets/Direction', fontdict={'fontsize':'medium'})
+			self._template['colorbar'] = cbar
+
+		self._template['arrow'] = None
+
+	def _fill_template(self, packet_index):
+		""" _fill_template - swap in the data for one station (or satellite) """
+
+		ax = self._axs[0]
+		values, v_min, v_max, ticks, label = self._bar_values(packet_index)
+
+		if 'bars' in self._template:
+			shades = self._cmap(values.ravel()/v_max)
+			for patch, visible, shade in zip(self._template['bars'], np.isfinite(values).ravel().tolist(), shades):
+				patch.set_visible(visible)
+				if visible:
+					patch.set_facecolor(shade)
+
+		if 'dots' in self._template:
+			table = self._packets[packet_index]
+			parsed = table.parsed
+			# Red dots for un-parsed packets; the alpha is in each color (set_alpha() wants as many colors as the last station had)
+			shades = np.where(parsed[:, np.newaxis], colors.to_rgba('black', 1.0), colors.to_rgba('red', 0.7 if _ALPHA_PER_DOT else 1.0))
+			dots = self._template['dots']
+			dots.set_offsets(np.column_stack((self._degrees_to_radians(table.az), self._map_el(table.el))))
+			dots.set_facecolors(shades)
+			dots.set_edgecolors(shades)
+			dots.set_sizes(np.where(parsed, 4.0, 2.0))
+
+		if self._template['arrow'] is not None:
+			self._template['arrow'].remove()
+			self._template['arrow'] = None
+		if packet_index in self._antenna_direction:
+			self._template['arrow'] = ax.arrow(self._degrees_to_radians(self._antenna_direction[packet_index]), self._map_el(90), 0.0, 87, head_width=0.05, head_length=5, fill=False, length_includes_head=True, linewidth=1, color='blue', zorder=3)
+
+		if 'title' in self._template:
+			self._template['title'].set_text('%s\n%d Total Packets' % (packet_index, len(self._packets[packet_index])))
+
+		if 'colorbar' in self._template:
+			cbar = self._template['colorbar']
+			cbar.mappable.set_clim(v_min, v_max)
+			cbar.set_ticks(ticks)
+			cbar.set_label(label, fontdict={'fontsize':'medium'})
+
+	def _bar_values(self, packet_index):
+		""" _bar_values - what the bars show (nan for no bar); the packet count, or with coverage the packets per hour overhead; returns values, v_min, v_max, ticks and label """
+
+		if packet_index in self._coverage:
+			values = self.reception_ratio(packet_index)
+			finite = np.isfinite(values)
+			v_min, v_max, ticks = self._ratio_ticks(float(values[finite].max()) if finite.any() else 0.0)
+			return values, v_min, v_max, ticks, '#Packets/Hour Overhead'
+
+		counts = self._buckets[packet_index]
+		v_min, v_max, ticks = self._colorbar_ticks(int(counts.max()))
+		return np.where(counts > 0, counts, np.nan), v_min, v_max, ticks, '#Packets/Direction'
+
+	def _per_station_polar_plot(self, n, packet_index, n_packets):
+		""" _per_station_polar_plot """
+
+		values, v_min, v_max, ticks, label = self._bar_values(packet_index)
+
+		if not self._style_flag or 'B' in self._style_flag:
+			# build the actual plot - background color shading
+			az_index, el_index = np.nonzero(np.isfinite(values))
+			v = values[az_index, el_index]
 
-				# radius (remember - it's reversed!)
-				bottom.append(self._map_el(el_bucket))
-				radii.append(-PolarAntennaMap.radius_scale)
+			# angle
+			width = np.diff(self._theta_edges)[az_index]
+			theta = self._degrees_to_radians(self._theta_edges[az_index] + width/2.0)
+			width = self._degrees_to_radians(width)
 
-				# color
-				shades.append(self._cmap(v/v_max))
+			# radius (remember - it's reversed!)
+			bottom = self._map_el(self._radius_edges[el_index])
+			radii = -np.diff(self._radius_edges)[el_index]
+
+			# color
+			shades = self._cmap(v/v_max)
 
 			try:
 				self._axs[n].bar(theta, radii, bottom=bottom, width=width, color=shades, alpha=0.9, label=packet_index, linewidth=0.25, zorder=1)
@@ -191,30 +369,18 @@ class PolarAntennaMap:
 
 		if not self._style_flag or 'D' in self._style_flag:
 			# build the actual plot - packet dots
-			theta = []
-			radii = []
-			shades = []
-			sizes = []
-			alphas = []
-
-			for k in self._packets[packet_index]:
-				az = self._packets[packet_index][k].azel.az
-				el = self._packets[packet_index][k].azel.el
-
-				theta.append(self._degrees_to_radians(az))
-				radii.append(self._map_el(el))
-				if self._packets[packet_index][k].parsed:
-					shades.append('black')
-					sizes.append(4.0)
-					alphas.append(1.0)
-				else:
-					# Red dots for un-parsed packets
-					shades.append('red')
-					sizes.append(2.0)
-					alphas.append(0.7)
+			table = self._packets[packet_index]
+			parsed = table.parsed
+
+			theta = self._degrees_to_radians(table.az)
+			radii = self._map_el(table.el)
+			# Red dots for un-parsed packets
+			shades = np.where(parsed, 'black', 'red')
+			sizes = np.where(parsed, 4.0, 2.0)
+			alphas = np.where(parsed, 1.0, 0.7)
 
 			# Packet dots are black/red with no alpha
-			if matplotlib.__version__ < '3.4':
+			if not _ALPHA_PER_DOT:
 				# This can be done by setting alpha value on colors ... a TODO
 				alphas = None
 
@@ -227,25 +393,7 @@ class PolarAntennaMap:
 			self._axs[n].arrow(self._degrees_to_radians(self._antenna_direction[packet_index]), self._map_el(90), 0.0, 87, head_width=0.05, head_length=5, fill=False, length_includes_head=True, linewidth=1, color='blue', zorder=3)
 
 		# all the misc stuff - for both 'bars'
-		self._axs[n].set_theta_offset(self._degrees_to_radians(90))
-		self._axs[n].set_theta_direction(-1)
-		self._axs[n].set_rlim(bottom=0.0, top=90.0, emit=False, auto=False)
-
-		if not self._style_flag or 'A' in self._style_flag:
-			# Axis text and grid lines
-			theta_angles = (0.0, 22.5, 45.0, 67.5, 90.0, 112.5, 135.0, 157.5, 180.0, 202.5, 225.0, 247.5, 270.0, 292.5, 315.0, 337.5)
-			theta_labels = ('N', '', 'NE', '', 'E', '', 'SE', '', 'S', '', 'SW', '', 'W', '', 'NW', '')
-			radius_angles = (self._map_el(90), self._map_el(80), self._map_el(70), self._map_el(60), self._map_el(50), self._map_el(40), self._map_el(30), self._map_el(20), self._map_el(10), self._map_el(0))
-			radius_lables = ('', '80', '', '60', '', '40', '', '20', '', '')
-		else:
-			# No Axis text; but still draw grid lines - hence angles
-			theta_angles = (0.0, 22.5, 45.0, 67.5, 90.0, 112.5, 135.0, 157.5, 180.0, 202.5, 225.0, 247.5, 270.0, 292.5, 315.0, 337.5)
-			theta_labels = ()
-			radius_angles = (self._map_el(90), self._map_el(80), self._map_el(70), self._map_el(60), self._map_el(50), self._map_el(40), self._map_el(30), self._map_el(20), self._map_el(10), self._map_el(0))
-			radius_lables = ()
-
-		self._axs[n].set_thetagrids(theta_angles, theta_labels, fontsize='small')
-		self._axs[n].set_rgrids(radius_angles, radius_lables, angle=90.0, fontsize='small')
+		self._polar_grids(self._axs[n])
 
 		# self._axs[n].set_xlabel('Direction/Azimuth')	# XXX doesn't work for polar
 		# self._axs[n].set_ylabel('Elevation')		# XXX doesn't work for polar
@@ -255,101 +403,110 @@ class PolarAntennaMap:
 			self._axs[n].set_title(title, pad=24.0, fontdict={'fontsize':'medium'})
 
 		if not self._style_flag or 'C' in self._style_flag:
-			v_min = 0
-			if v_max == 0:
-				v_max =  v_min + 1
-			if (v_max - v_min) <= 10:
-				ticks = range(v_min,v_max+1)
-			else:
-				if ((v_max - v_min) % 4) == 0:
-					ticks = range(v_min,v_max+1, 4)
-				else:
-					ticks = [v_min, v_max]
-
 			v_cmap = cm.ScalarMappable(norm=colors.Normalize(vmin=v_min, vmax=v_max), cmap=self._cmap)
 			v_cmap.set_array([])	# Not needed in matplotlib version 3.4.2 (and above?); but safe to leave in
 			try:
-				cbar = plt.colorbar(v_cmap, ax=self._axs[n], orientation='horizontal', ticks=ticks)
-				cbar.set_label('#Packets/Direction', fontdict={'fontsize':'medium'})
+				if self._caxs[n] is not None:
+					cbar = self._fig.colorbar(v_cmap, cax=self._caxs[n], orientation='horizontal', ticks=ticks)
+				else:
+					cbar = self._fig.colorbar(v_cmap, ax=self._axs[n], orientation='horizontal', ticks=ticks)
+				cbar.set_label(label, fontdict={'fontsize':'medium'})
 			except ValueError:
 				print('%s: Station data error - no plot data!' % (packet_index), file=sys.stderr)
 
 		# self._axs[n].tick_params(grid_color='gray', labelcolor='gray')
 		# self._axs[n].legend(loc='lower right', bbox_to_anchor=(1.2, 0.94), prop={'size': 6})
 
+	def _polar_grids(self, ax):
+		""" _polar_grids - direction, limits, grid lines and axis text """
+
+		ax.set_theta_offset(self._degrees_to_radians(90))
+		ax.set_theta_direction(-1)
+		ax.set_rlim(bottom=0.0, top=90.0, emit=False, auto=False)
+
+		# grid lines are on the bucket edges (but not too many of them)
+		theta_edges = self._grid_edges(self._theta_edges[:-1], PolarAntennaMap.MAX_THETA_GRIDS)
+		radius_edges = self._grid_edges(self._radius_edges, PolarAntennaMap.MAX_RADIUS_GRIDS)
+		if radius_edges[-1] != 90.0:
+			radius_edges.append(90.0)
+		theta_angles = theta_edges
+		radius_angles = [self._map_el(el) for el in reversed(radius_edges)]
+
+		if not self._style_flag or 'A' in self._style_flag:
+			# Axis text - compass points; and every other elevation (but not the horizon or overhead)
+			theta_labels = [PolarAntennaMap._COMPASS.get(round(az, 6), '') for az in theta_edges]
+			radius_lables = ['%g' % (el) if ii % 2 == 0 and 0.0 < el < 90.0 else '' for ii, el in reversed(list(enumerate(radius_edges)))]
+		else:
+			# No Axis text; but still draw grid lines - hence angles
+			theta_labels = ()
+			radius_lables = ()
+
+		ax.set_thetagrids(theta_angles, theta_labels, fontsize='small')
+		ax.set_rgrids(radius_angles, radius_lables, angle=90.0, fontsize='small')
+
+	@classmethod
+	def _colorbar_ticks(cls, v_max):
+		""" _colorbar_ticks - returns v_min, v_max and the ticks """
+
+		v_min = 0
+		if v_max == 0:
+			v_max =  v_min + 1
+		if (v_max - v_min) <= 10:
+			ticks = range(v_min,v_max+1)
+		else:
+			if ((v_max - v_min) % 4) == 0:
+				ticks = range(v_min,v_max+1, 4)
+			else:
+				ticks = [v_min, v_max]
+		return v_min, v_max, ticks
+
+	@classmethod
+	def _ratio_ticks(cls, v_max):
+		""" _ratio_ticks - returns v_min, v_max and the ticks; v_max is rounded up so the four steps are round numbers """
+
+		if not v_max > 0:
+			v_max = 1.0
+		scale = 10.0 ** math.floor(math.log10(v_max / 4))
+		for m in (1.0, 2.0, 2.5, 5.0, 10.0):
+			if 4 * m * scale >= v_max:
+				break
+		ticks = [ii * m * scale for ii in range(5)]
+		return 0.0, ticks[-1], ticks
+
 	def _per_day_bar_plot(self):
-		""" _per_day_bar_plot """
-
-		ax = plt.subplot(2,1,2, label='packets per day')
-
-		# find all the days we have data for
-		hist = {}
-		all_days = {}
-		for packet_index in self._stations:
-			hist[packet_index] = self._per_day_counts(packet_index)
-			for day in hist[packet_index].keys():
-				all_days[day] = True
-
-
-		# find holes (i.e. missing days)
-		day_last = None
-		extra_all_days = {}
-		for day in sorted(all_days):
-			if not day_last:
-				day_last = day
-
-			delta = day - day_last
-			if delta.days > 1:
-				# add the missing days
-				for ii in range(delta.days-1,0,-1):
-					missing_day = day - datetime.timedelta(days=ii)
-					extra_all_days[missing_day] = True
-			day_last = day
-		all_days.update(extra_all_days)
-
-		# build x axis values
-		ii = 1
+		""" _per_day_bar_plot - per hour, day or week """
+
+		if self._timebar_ax is not None:
+			ax = self._timebar_ax
+		else:
+			ax = self._fig.add_subplot(2,1,2, label='packets per day')
+
+		stations = sorted(self._stations)
+		timeline = self.timeline(self._timebin, stations)
+
+		# build x axis values - a bin with no data gets a unique value; but blank!
 		x_values = []
-		for day in sorted(all_days):
-			if day in extra_all_days:
-				x_values.append(u'\u200c' * ii)			# unique value - but blank!
+		ii = 1
+		label_format = '%d %Hh' if self._timebin == 'hour' else '%m/%d'
+		for bin_start, total in zip(timeline.bin_starts(), timeline.totals().tolist()):
+			if total == 0:
+				x_values.append(u'\u200c' * ii)
 				ii += 1
 			else:
-				x_values.append(day.strftime('%m/%d'))
+				x_values.append(bin_start.strftime(label_format))
 
-		# plot
-		previous_y = {}
-		v_max = len(self._stations)
-		v = 0
-		y_max = 0
-		for packet_index in sorted(self._stations):
-			for not_parsed in [0, 1]:
-				y_values = []
-				bottom_values = []
-				for day in sorted(all_days):
-					if day in hist[packet_index]:
-						y_value = hist[packet_index][day][not_parsed]
-					else:
-						y_value = 0
-					if day in previous_y:
-						b_value = previous_y[day]
-						previous_y[day] += y_value
-					else:
-						b_value = 0
-						previous_y[day] = y_value
-
-					bottom_values.append(b_value)
-					y_values.append(y_value)
-					if (b_value + y_value) > y_max:
-						y_max = b_value + y_value
-
-				if not_parsed:
-					# crc errors etc
-					ax.bar(x_values, y_values, bottom=bottom_values, color = self._cmap((v+1)/(v_max+2)), label=packet_index, hatch='/')
-				else:
-					# real packets
-					ax.bar(x_values, y_values, bottom=bottom_values, color = self._cmap((v+1)/(v_max+2)), label=packet_index)
-			v += 1
+		# plot - stacked; parsed then crc errors for each station in turn
+		counts = timeline.counts.reshape(len(stations) * 2, len(timeline))
+		tops = np.cumsum(counts, axis=0)
+		bottoms = tops - counts
+		y_max = int(tops[-1].max()) if len(timeline) > 0 else 0
+
+		v_max = len(stations)
+		for v, packet_index in enumerate(stations):
+			# real packets
+			ax.bar(x_values, counts[v*2].tolist(), bottom=bottoms[v*2].tolist(), color = self._cmap((v+1)/(v_max+2)), label=packet_index)
+			# crc errors etc
+			ax.bar(x_values, counts[v*2+1].tolist(), bottom=bottoms[v*2+1].tolist(), color = self._cmap((v+1)/(v_max+2)), label=packet_index, hatch='/')
 
 		if len(x_values) % 2 == 0:
 			ax.set_xticks(x_values[1::2])
@@ -371,29 +528,24 @@ class PolarAntennaMap:
 		# ax.margins(0.05)
 		ax.set_xlabel('Date', fontdict={'fontsize':'medium'})
 		ax.set_ylabel('#Packets', fontdict={'fontsize':'medium'})
-		title = 'Packets per day (UTC)'
+		title = 'Packets per %s (UTC)' % (self._timebin)
 		ax.set_title(title, pad=24.0, fontdict={'fontsize':'medium'})
 
-	def _per_day_counts(self, packet_index):
-		""" _per_day_counts """
-		days = {}
-		for k in self._packets[packet_index]:
-			packet = self._packets[packet_index][k]
-			# round down to date (i.e. drop time)
-			# this is all done in UTC!
-			dt = packet.dt.date()
-			if dt in days:
-				if packet.parsed:
-					days[dt][0] += 1
-				else:
-					days[dt][1] += 1
-
-			else:
-				if packet.parsed:
-					days[dt] = [1, 0]
-				else:
-					days[dt] = [0, 1]
-		return days
+	@classmethod
+	def _grid_edges(cls, edges, max_lines):
+		""" _grid_edges - every n'th edge so there are at most max_lines; where possible a spacing that divides 90 degrees (so the compass points are kept) """
+
+		edges = [float(v) for v in edges]
+		if len(edges) <= max_lines:
+			return edges
+		step = edges[1] - edges[0]
+		least = -(-len(edges) // max_lines)
+		for n in range(least, len(edges)):
+			if abs(90.0 / (n * step) - round(90.0 / (n * step))) < 1e-9:
+				break
+		else:
+			n = least
+		return edges[::n]
 
 	@classmethod
 	def _degrees_to_radians(cls, angle):
@@ -0,0 +1,239 @@
+"""
+	Profiler - wall time and peak memory for each stage of a run, plus counters; costs nothing unless enabled
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	Profile.enable(cprofile_stage='decode')
+	with Profile.stage('decode'):
+		...
+		Profile.count('files_read')
+	Profile.report(sys.stderr)
+"""
+
+import sys
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+try:
+	import resource
+except ImportError:
+	# Windows
+	resource = None
+
+class _NullStage:
+	""" _NullStage - used when profiling is not enabled """
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		return False
+
+class _Stage:
+	""" _Stage - one entry into a stage """
+
+	def __init__(self, name):
+		self.name = name
+		self.started = None
+		self.peak = 0
+
+	def __enter__(self):
+		Profile._enter(self)
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		Profile._exit(self)
+		return False
+
+class Profile:
+	""" Profile - stages can be nested (the time and memory of the inner stage is included in the outer one) """
+
+	STAGES = ('tle', 'stations', 'download', 'store_load', 'decode', 'store_save', 'read_packets', 'propagate', 'bucketing', 'import', 'layout', 'encode', 'export', 'compact', 'coverage')
+
+	_enabled = False
+	_started = None
+	_memory = None			# 'rss' or 'traced'
+	_stages = {}			# name -> {'calls', 'seconds', 'peak_mb'} (in the order first used)
+	_counters = {}
+	_counters_lock = threading.Lock()	# downloads run in threads
+	_open = []			# stages entered but not yet exited (in any thread; memory is for the whole process)
+	_lock = threading.Lock()	# for _open and _stages; the map server draws and refreshes in different threads
+	_null = _NullStage()
+	_cprofile_stage = None
+	_cprofile = None
+
+	@classmethod
+	def enable(cls, cprofile_stage=None):
+		""" enable - cprofile_stage (if any) is also run under cProfile """
+
+		if cls._enabled:
+			return
+		cls._enabled = True
+		cls._started = time.perf_counter()
+		try:
+			cls._reset_peak_rss()
+			cls._memory = 'rss'
+		except OSError:
+			# not Linux - so python's (and numpy's) allocations are traced instead
+			tracemalloc.start()
+			cls._memory = 'traced'
+		if cprofile_stage:
+			cls._cprofile_stage = cprofile_stage
+			cls._cprofile = cProfile.Profile()
+
+	@classmethod
+	def enabled(cls):
+		""" enabled """
+
+		return cls._enabled
+
+	@classmethod
+	def reset(cls):
+		""" reset - forget everything so far (i.e. a worker process starting a new job) """
+
+		cls._stages = {}
+		cls._counters = {}
+
+	@classmethod
+	def stage(cls, name):
+		""" stage - use as: with Profile.stage(name): """
+
+		if not cls._enabled:
+			return cls._null
+		return _Stage(name)
+
+	@classmethod
+	def count(cls, name, n=1):
+		""" count """
+
+		if not cls._enabled:
+			return
+		with cls._counters_lock:
+			cls._counters[name] = cls._counters.get(name, 0) + int(n)
+
+	@classmethod
+	def snapshot(cls):
+		""" snapshot - everything so far; as a dict """
+
+		return {'memory': cls._memory, 'stages': cls._stages, 'counters': cls._counters}
+
+	@classmethod
+	def merge(cls, snapshot):
+		""" merge - the snapshot from another process; times and counters add up, peaks are the largest """
+
+		if not cls._enabled or not snapshot:
+			return
+		with cls._lock:
+			for name, s in snapshot['stages'].items():
+				if name not in cls._stages:
+					cls._stages[name] = {'calls': 0, 'seconds': 0.0, 'peak_mb': 0.0}
+				cls._stages[name]['calls'] += s['calls']
+				cls._stages[name]['seconds'] += s['seconds']
+				cls._stages[name]['peak_mb'] = max(cls._stages[name]['peak_mb'], s['peak_mb'])
+		for name, n in snapshot['counters'].items():
+			cls.count(name, n)
+
+	@classmethod
+	def report(cls, fd, cprofile_filename=None):
+		""" report - JSON; plus the cProfile stats if asked for """
+
+		if not cls._enabled:
+			return
+		r = {
+			'seconds': round(time.perf_counter() - cls._started, 4),
+			'peak_mb': cls._max_rss_mb(),
+			'memory': cls._memory,
+			'stages': {name: {'calls': s['calls'], 'seconds': round(s['seconds'], 4), 'peak_mb': round(s['peak_mb'], 1)} for name, s in cls._stages.items()},
+			'counters': cls._counters,
+		}
+		if cls._cprofile is not None and cprofile_filename and cls._cprofile_stage in cls._stages:
+			# only if the stage ran in this process (i.e. not just in worker processes)
+			try:
+				cls._cprofile.dump_stats(cprofile_filename)
+				r['cprofile'] = {'stage': cls._cprofile_stage, 'filename': cprofile_filename}
+			except IOError as e:
+				print("%s: %s - CONTINUE ANYWAY" % (cprofile_filename, e), file=sys.stderr)
+		json.dump(r, fd, indent=1)
+		fd.write('\n')
+
+	@classmethod
+	def _enter(cls, stage):
+		""" _enter """
+
+		with cls._lock:
+			# whatever the peak was so far belongs to the stages we are already in
+			cls._update_peaks()
+			cls._reset_peak()
+			cls._open.append(stage)
+		if stage.name == cls._cprofile_stage:
+			cls._cprofile.enable()
+		stage.started = time.perf_counter()
+
+	@classmethod
+	def _exit(cls, stage):
+		""" _exit """
+
+		seconds = time.perf_counter() - stage.started
+		if stage.name == cls._cprofile_stage:
+			cls._cprofile.disable()
+		with cls._lock:
+			cls._update_peaks()
+			cls._open.remove(stage)
+
+			if stage.name not in cls._stages:
+				cls._stages[stage.name] = {'calls': 0, 'seconds': 0.0, 'peak_mb': 0.0}
+			s = cls._stages[stage.name]
+			s['calls'] += 1
+			s['seconds'] += seconds
+			s['peak_mb'] = max(s['peak_mb'], stage.peak / (1024*1024))
+
+	@classmethod
+	def _update_peaks(cls):
+		""" _update_peaks - with _lock held """
+
+		peak = cls._peak()
+		for stage in cls._open:
+			if peak > stage.peak:
+				stage.peak = peak
+
+	@classmethod
+	def _peak(cls):
+		""" _peak - bytes """
+
+		if cls._memory == 'traced':
+			_, peak = tracemalloc.get_traced_memory()
+			return peak
+		with open('/proc/self/status', 'r') as fd:
+			for line in fd:
+				if line.startswith('VmHWM:'):
+					return int(line.split()[1]) * 1024
+		return 0
+
+	@classmethod
+	def _max_rss_mb(cls):
+		""" _max_rss_mb - the whole run (not reset); None where the platform can't say (i.e. Windows) """
+
+		if resource is None:
+			return None
+		maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		# Linux reports KB, macOS bytes
+		return round((maxrss if sys.platform == 'darwin' else maxrss * 1024) / (1024*1024), 1)
+
+	@classmethod
+	def _reset_peak(cls):
+		""" _reset_peak """
+
+		if cls._memory == 'traced':
+			tracemalloc.reset_peak()
+		else:
+			cls._reset_peak_rss()
+
+	@classmethod
+	def _reset_peak_rss(cls):
+		""" _reset_peak_rss - Linux only """
+
+		with open('/proc/self/clear_refs', 'w') as fd:
+			fd.write('5')
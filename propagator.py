@@ -0,0 +1,451 @@
+"""
+	Propagator - where a satellite (one TLE) is seen from an observer at many times; ephem (the reference) or SGP4 in numpy
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	propagator = Propagator.get('sgp4')
+	lng, lat, elevation, az, el = propagator.where(tle, lnglat, elevation, times)
+"""
+
+import math
+import functools
+
+import ephem
+import numpy as np
+
+from tle_registry import TLERegistry, BODY_CACHE_SIZE
+
+class Propagator:
+	""" Propagator - times are a numpy datetime64 array (UTC); results are numpy arrays in degrees (elevation is in meters) """
+
+	name = None
+
+	# ephem is the reference; sgp4 is only used if asked for
+	DEFAULT = 'ephem'
+
+	# as ephem.Observer() - so both give the same (refracted) elevation
+	PRESSURE = 1010.0		# mBar
+	TEMPERATURE = 15.0		# C
+
+	@classmethod
+	def get(cls, name):
+		""" get - by name """
+
+		for propagator in (SGP4Propagator, EphemPropagator):
+			if propagator.name == name:
+				return propagator()
+		raise KeyError(name)
+
+	@classmethod
+	def names(cls):
+		""" names """
+
+		return (EphemPropagator.name, SGP4Propagator.name)
+
+	def where(self, tle, lnglat, elevation, times):
+		""" where - returns [lng, lat, elevation, az, el]; nan for any time that can't be computed """
+
+		raise NotImplementedError
+
+class EphemPropagator(Propagator):
+	""" EphemPropagator - ephem's compute(); one time at a time """
+
+	name = 'ephem'
+
+	_EPHEM_EPOCH = np.datetime64('1899-12-31T12:00:00', 'us')
+
+	def where(self, tle, lnglat, elevation, times):
+		""" where """
+
+		observer = ephem.Observer()
+		observer.lon = math.radians(lnglat.lng)
+		observer.lat = math.radians(lnglat.lat)
+		observer.elevation = elevation
+		observer.pressure = Propagator.PRESSURE
+		observer.temp = Propagator.TEMPERATURE
+		tle_rec = TLERegistry.compile(tle)
+
+		n = len(times)
+		lng = np.empty(n)
+		lat = np.empty(n)
+		sat_elevation = np.empty(n)
+		az = np.empty(n)
+		el = np.empty(n)
+
+		# ephem counts days from noon 1899-12-31 (Dublin Julian Date) - convert in one go
+		dates = ((np.asarray(times, dtype='datetime64[us]') - EphemPropagator._EPHEM_EPOCH) / np.timedelta64(1, 'D')).tolist()
+		for ii, dt in enumerate(dates):
+			observer.date = dt
+			try:
+				tle_rec.compute(observer)
+			except (ValueError, RuntimeError):
+				# too far from the TLE's epoch (or the orbit has decayed) - just this time is lost
+				lng[ii] = lat[ii] = sat_elevation[ii] = az[ii] = el[ii] = np.nan
+				continue
+			lng[ii] = tle_rec.sublong
+			lat[ii] = tle_rec.sublat
+			sat_elevation[ii] = tle_rec.elevation
+			az[ii] = tle_rec.az
+			el[ii] = tle_rec.alt
+
+		return [np.degrees(lng), np.degrees(lat), sat_elevation, np.degrees(az), np.degrees(el)]
+
+class SGP4Propagator(Propagator):
+	""" SGP4Propagator - near earth SGP4 (as Spacetrack Report #3, with Vallado's 2006 corrections) over every time at once; deep space TLE's (period of 225 minutes or more) are passed to ephem """
+
+	name = 'sgp4'
+
+	# WGS-72 - as the TLE's are made with
+	MU = 398600.8			# km^3/s^2
+	RADIUS = 6378.135		# km
+	J2 = 0.001082616
+	J3 = -0.00000253881
+	J4 = -0.00000165597
+
+	# WGS-84 - for the observer and the sub-satellite point
+	WGS84_RADIUS = 6378.137		# km
+	WGS84_FLATTENING = 1.0/298.257223563
+
+	_UNIX_EPOCH = np.datetime64('1970-01-01T00:00:00', 'us')
+	MAX_DAYS = 365			# as ephem - past this from the epoch a TLE is refused
+
+	def __init__(self):
+		""" SGP4Propagator """
+
+		self._ephem = EphemPropagator()
+
+	def where(self, tle, lnglat, elevation, times):
+		""" where - sgp4 errors (i.e. a decayed orbit) and times too far from the epoch are nan """
+
+		times = np.asarray(times, dtype='datetime64[us]')
+		elements = _elements(tle.line1, tle.line2)
+		if elements is None:
+			return self._ephem.where(tle, lnglat, elevation, times)
+
+		tsince = (times - elements['epoch']) / np.timedelta64(60, 's')
+		# as ephem - too far from the epoch is refused (as nan)
+		tsince = np.where(np.abs(tsince) > SGP4Propagator.MAX_DAYS * 1440.0, np.nan, tsince)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			# anything that goes wrong ends up as nan
+			x, y, z = self._teme(elements, tsince)
+
+		# TEME to earth fixed - just a rotation by sidereal time (polar motion is far too small to matter here)
+		gmst = self._gmst((times - SGP4Propagator._UNIX_EPOCH) / np.timedelta64(1, 'D') + 2440587.5)
+		cos_g = np.cos(gmst)
+		sin_g = np.sin(gmst)
+		x, y = cos_g * x + sin_g * y, cos_g * y - sin_g * x
+
+		sub_lng, sub_lat, height = self._subpoint(x, y, z)
+
+		# topocentric - east, north and up from the observer
+		ox, oy, oz = self._ecef(math.radians(lnglat.lng), math.radians(lnglat.lat), elevation / 1000.0)
+		dx = x - ox
+		dy = y - oy
+		dz = z - oz
+		sin_lng = math.sin(math.radians(lnglat.lng))
+		cos_lng = math.cos(math.radians(lnglat.lng))
+		sin_lat = math.sin(math.radians(lnglat.lat))
+		cos_lat = math.cos(math.radians(lnglat.lat))
+		east = -sin_lng * dx + cos_lng * dy
+		north = -sin_lat * cos_lng * dx - sin_lat * sin_lng * dy + cos_lat * dz
+		up = cos_lat * cos_lng * dx + cos_lat * sin_lng * dy + sin_lat * dz
+
+		az = np.arctan2(east, north) % (2 * math.pi)
+		el = self._refract(np.arctan2(up, np.hypot(east, north)))
+
+		return [np.degrees(sub_lng), np.degrees(sub_lat), height * 1000.0, np.degrees(az), np.degrees(el)]
+
+	@classmethod
+	def _teme(cls, e, t):
+		""" _teme - position (km) in the TEME frame; t is minutes since the TLE's epoch """
+
+		xke = e['xke']
+		x2o3 = 2.0 / 3.0
+
+		# secular gravity and atmospheric drag
+		xmdf = e['mo'] + e['mdot'] * t
+		argpdf = e['argpo'] + e['argpdot'] * t
+		nodedf = e['nodeo'] + e['nodedot'] * t
+		t2 = t * t
+		nodem = nodedf + e['nodecf'] * t2
+		tempa = 1.0 - e['cc1'] * t
+		tempe = e['bstar'] * e['cc4'] * t
+		templ = e['t2cof'] * t2
+		if e['isimp']:
+			mm = xmdf
+			argpm = argpdf
+		else:
+			delomg = e['omgcof'] * t
+			delm = e['xmcof'] * ((1.0 + e['eta'] * np.cos(xmdf)) ** 3 - e['delmo'])
+			mm = xmdf + delomg + delm
+			argpm = argpdf - delomg - delm
+			t3 = t2 * t
+			t4 = t3 * t
+			tempa = tempa - e['d2'] * t2 - e['d3'] * t3 - e['d4'] * t4
+			tempe = tempe + e['bstar'] * e['cc5'] * (np.sin(mm) - e['sinmao'])
+			templ = templ + e['t3cof'] * t3 + t4 * (e['t4cof'] + t * e['t5cof'])
+
+		am = (xke / e['no']) ** x2o3 * tempa * tempa
+		em = e['ecco'] - tempe
+		# past this the orbit has decayed (or the TLE is too old to use)
+		bad = (em >= 1.0) | (em < -0.001) | ~(am > 0)
+		em = np.clip(em, 1.0e-6, None)
+		mm = mm + e['no'] * templ
+		xlm = mm + argpm + nodem
+		nodem = np.fmod(nodem, 2 * math.pi)
+		argpm = np.fmod(argpm, 2 * math.pi)
+		xlm = np.fmod(xlm, 2 * math.pi)
+		mm = np.fmod(xlm - argpm - nodem, 2 * math.pi)
+
+		# long period periodics
+		axnl = em * np.cos(argpm)
+		temp = 1.0 / (am * (1.0 - em * em))
+		aynl = em * np.sin(argpm) + temp * e['aycof']
+		xl = mm + argpm + nodem + temp * e['xlcof'] * axnl
+
+		# kepler's equation - every time at once; at most 10 rounds
+		u = np.fmod(xl - nodem, 2 * math.pi)
+		eo1 = u.copy()
+		for _ in range(10):
+			sineo1 = np.sin(eo1)
+			coseo1 = np.cos(eo1)
+			tem5 = (u - aynl * coseo1 + axnl * sineo1 - eo1) / (1.0 - coseo1 * axnl - sineo1 * aynl)
+			tem5 = np.clip(tem5, -0.95, 0.95)
+			eo1 = eo1 + tem5
+			if np.all(np.abs(tem5) < 1.0e-12):
+				break
+		sineo1 = np.sin(eo1)
+		coseo1 = np.cos(eo1)
+
+		# short period periodics
+		ecose = axnl * coseo1 + aynl * sineo1
+		esine = axnl * sineo1 - aynl * coseo1
+		el2 = axnl * axnl + aynl * aynl
+		pl = am * (1.0 - el2)
+		bad |= ~(pl > 0)
+		rl = am * (1.0 - ecose)
+		betal = np.sqrt(np.abs(1.0 - el2))
+		temp = esine / (1.0 + betal)
+		sinu = am / rl * (sineo1 - aynl - axnl * temp)
+		cosu = am / rl * (coseo1 - axnl + aynl * temp)
+		su = np.arctan2(sinu, cosu)
+		sin2u = (cosu + cosu) * sinu
+		cos2u = 1.0 - 2.0 * sinu * sinu
+		temp = 1.0 / np.where(pl > 0, pl, 1.0)
+		temp1 = 0.5 * e['j2'] * temp
+		temp2 = temp1 * temp
+
+		mrt = rl * (1.0 - 1.5 * temp2 * betal * e['con41']) + 0.5 * temp1 * e['x1mth2'] * cos2u
+		su = su - 0.25 * temp2 * e['x7thm1'] * sin2u
+		xnode = nodem + 1.5 * temp2 * e['cosio'] * sin2u
+		xinc = e['inclo'] + 1.5 * temp2 * e['cosio'] * e['sinio'] * cos2u
+		bad |= mrt < 1.0
+
+		sinsu = np.sin(su)
+		cossu = np.cos(su)
+		snod = np.sin(xnode)
+		cnod = np.cos(xnode)
+		sini = np.sin(xinc)
+		cosi = np.cos(xinc)
+		xmx = -snod * cosi
+		xmy = cnod * cosi
+		r = mrt * e['radius']
+		x = np.where(bad, np.nan, r * (xmx * sinsu + cnod * cossu))
+		y = np.where(bad, np.nan, r * (xmy * sinsu + snod * cossu))
+		z = np.where(bad, np.nan, r * (sini * sinsu))
+		return x, y, z
+
+	@classmethod
+	def _gmst(cls, jd):
+		""" _gmst - radians; IAU-82 (as SGP4 expects); UTC is close enough to UT1 """
+
+		tut1 = (jd - 2451545.0) / 36525.0
+		seconds = -6.2e-6 * tut1 ** 3 + 0.093104 * tut1 ** 2 + (876600.0 * 3600.0 + 8640184.812866) * tut1 + 67310.54841
+		return np.radians(seconds / 240.0) % (2 * math.pi)
+
+	@classmethod
+	def _ecef(cls, lng, lat, height):
+		""" _ecef - km; from geodetic (WGS-84) radians and km """
+
+		e2 = SGP4Propagator.WGS84_FLATTENING * (2.0 - SGP4Propagator.WGS84_FLATTENING)
+		n = SGP4Propagator.WGS84_RADIUS / math.sqrt(1.0 - e2 * math.sin(lat) ** 2)
+		return (n + height) * math.cos(lat) * math.cos(lng), (n + height) * math.cos(lat) * math.sin(lng), (n * (1.0 - e2) + height) * math.sin(lat)
+
+	@classmethod
+	def _subpoint(cls, x, y, z):
+		""" _subpoint - lng, lat (radians) and height (km); the lat is geocentric (as ephem's sublat) and the height is above WGS-84 """
+
+		a = SGP4Propagator.WGS84_RADIUS
+		e2 = SGP4Propagator.WGS84_FLATTENING * (2.0 - SGP4Propagator.WGS84_FLATTENING)
+		lng = np.arctan2(y, x)
+		p = np.hypot(x, y)
+		lat = np.arctan2(z, p * (1.0 - e2))
+		for _ in range(4):
+			n = a / np.sqrt(1.0 - e2 * np.sin(lat) ** 2)
+			height = p / np.cos(lat) - n
+			lat = np.arctan2(z, p * (1.0 - e2 * n / (n + height)))
+		n = a / np.sqrt(1.0 - e2 * np.sin(lat) ** 2)
+		height = p / np.cos(lat) - n
+		return lng, np.arctan2(z, p), height
+
+	@classmethod
+	def _refract(cls, ta):
+		""" _refract - true to apparent elevation (radians); the same model (and pressure and temperature) as ephem """
+
+		pr = Propagator.PRESSURE
+		tr = Propagator.TEMPERATURE
+		t = cls._unrefract(pr, tr, ta)
+		d = 0.8 * (ta - t)
+		t0 = t
+		a = ta
+		# the secant method; converges in a few rounds
+		for _ in range(10):
+			a = a + d
+			t = cls._unrefract(pr, tr, a)
+			with np.errstate(divide='ignore', invalid='ignore'):
+				d = np.where(np.abs(ta - t) > math.radians(0.1/3600), d * -(ta - t) / (t0 - t), 0.0)
+			t0 = t
+			if not np.any(d):
+				break
+		return a
+
+	@classmethod
+	def _unrefract(cls, pr, tr, aa):
+		""" _unrefract - apparent to true elevation (radians); one formula below 14.5 degrees, another above 15.5 and a blend between """
+
+		lt = math.radians(14.5)
+		ge = math.radians(15.5)
+
+		aadeg = np.degrees(aa)
+		a = ((2e-5 * aadeg + 1.96e-2) * aadeg + 1.594e-1) * pr
+		b = (273.0 + tr) * ((8.45e-2 * aadeg + 5.05e-1) * aadeg + 1.0)
+		r = np.radians(a / b)
+		t_lt = np.where((aa < 0) & (r < 0), aa, aa - r)
+
+		with np.errstate(divide='ignore'):
+			t_ge = aa - 7.888888e-5 * pr / ((273.0 + tr) * np.tan(aa))
+
+		f = (aa - lt) / (ge - lt)
+		return np.where(aa < lt, t_lt, np.where(aa >= ge, t_ge, t_lt * (1.0 - f) + t_ge * f))
+
+@functools.lru_cache(maxsize=BODY_CACHE_SIZE)
+def _elements(line1, line2):
+	""" _elements - everything SGP4 needs from a TLE that doesn't change with time; None for deep space (or a bad TLE) """
+
+	radius = SGP4Propagator.RADIUS
+	xke = 60.0 / math.sqrt(radius ** 3 / SGP4Propagator.MU)
+	j2 = SGP4Propagator.J2
+	j3oj2 = SGP4Propagator.J3 / SGP4Propagator.J2
+	j4 = SGP4Propagator.J4
+	x2o3 = 2.0 / 3.0
+	xpdotp = 1440.0 / (2.0 * math.pi)
+
+	try:
+		year = int(line1[18:20])
+		days = float(line1[20:32])
+		bstar = float(line1[53] + '.' + line1[54:59]) * 10.0 ** int(line1[59:61])
+		inclo = math.radians(float(line2[8:16]))
+		nodeo = math.radians(float(line2[17:25]))
+		ecco = float('0.' + line2[26:33].replace(' ', '0'))
+		argpo = math.radians(float(line2[34:42]))
+		mo = math.radians(float(line2[43:51]))
+		no_kozai = float(line2[52:63]) / xpdotp
+	except ValueError:
+		return None
+	year += 2000 if year < 57 else 1900
+	epoch = np.datetime64('%04d-01-01' % (year), 'us') + np.timedelta64(int(round((days - 1.0) * 86400e6)), 'us')
+
+	# recover the original mean motion and semimajor axis from the (kozai) mean motion
+	eccsq = ecco * ecco
+	omeosq = 1.0 - eccsq
+	rteosq = math.sqrt(omeosq)
+	cosio = math.cos(inclo)
+	cosio2 = cosio * cosio
+	ak = (xke / no_kozai) ** x2o3
+	d1 = 0.75 * j2 * (3.0 * cosio2 - 1.0) / (rteosq * omeosq)
+	delta = d1 / (ak * ak)
+	adel = ak * (1.0 - delta * delta - delta * (1.0 / 3.0 + 134.0 * delta * delta / 81.0))
+	delta = d1 / (adel * adel)
+	no = no_kozai / (1.0 + delta)
+
+	if 2.0 * math.pi / no >= 225.0:
+		# deep space - needs the lunar/solar terms
+		return None
+
+	ao = (xke / no) ** x2o3
+	sinio = math.sin(inclo)
+	po = ao * omeosq
+	con42 = 1.0 - 5.0 * cosio2
+	con41 = -con42 - cosio2 - cosio2
+	posq = po * po
+	rp = ao * (1.0 - ecco)
+
+	# perigee below 220km - the simpler drag equations are used
+	isimp = rp < (220.0 / radius + 1.0)
+	sfour = 78.0 / radius + 1.0
+	qzms24 = ((120.0 - 78.0) / radius) ** 4
+	perige = (rp - 1.0) * radius
+	if perige < 156.0:
+		sfour = perige - 78.0
+		if perige < 98.0:
+			sfour = 20.0
+		qzms24 = ((120.0 - sfour) / radius) ** 4
+		sfour = sfour / radius + 1.0
+	pinvsq = 1.0 / posq
+
+	tsi = 1.0 / (ao - sfour)
+	eta = ao * ecco * tsi
+	etasq = eta * eta
+	eeta = ecco * eta
+	psisq = abs(1.0 - etasq)
+	coef = qzms24 * tsi ** 4
+	coef1 = coef / psisq ** 3.5
+	cc2 = coef1 * no * (ao * (1.0 + 1.5 * etasq + eeta * (4.0 + etasq)) + 0.375 * j2 * tsi / psisq * con41 * (8.0 + 3.0 * etasq * (8.0 + etasq)))
+	cc1 = bstar * cc2
+	cc3 = 0.0
+	if ecco > 1.0e-4:
+		cc3 = -2.0 * coef * tsi * j3oj2 * no * sinio / ecco
+	x1mth2 = 1.0 - cosio2
+	cc4 = 2.0 * no * coef1 * ao * omeosq * (eta * (2.0 + 0.5 * etasq) + ecco * (0.5 + 2.0 * etasq) - j2 * tsi / (ao * psisq) * (-3.0 * con41 * (1.0 - 2.0 * eeta + etasq * (1.5 - 0.5 * eeta)) + 0.75 * x1mth2 * (2.0 * etasq - eeta * (1.0 + etasq)) * math.cos(2.0 * argpo)))
+	cc5 = 2.0 * coef1 * ao * omeosq * (1.0 + 2.75 * (etasq + eeta) + eeta * etasq)
+	cosio4 = cosio2 * cosio2
+	temp1 = 1.5 * j2 * pinvsq * no
+	temp2 = 0.5 * temp1 * j2 * pinvsq
+	temp3 = -0.46875 * j4 * pinvsq * pinvsq * no
+	mdot = no + 0.5 * temp1 * rteosq * con41 + 0.0625 * temp2 * rteosq * (13.0 - 78.0 * cosio2 + 137.0 * cosio4)
+	argpdot = -0.5 * temp1 * con42 + 0.0625 * temp2 * (7.0 - 114.0 * cosio2 + 395.0 * cosio4) + temp3 * (3.0 - 36.0 * cosio2 + 49.0 * cosio4)
+	xhdot1 = -temp1 * cosio
+	nodedot = xhdot1 + (0.5 * temp2 * (4.0 - 19.0 * cosio2) + 2.0 * temp3 * (3.0 - 7.0 * cosio2)) * cosio
+	omgcof = bstar * cc3 * math.cos(argpo)
+	xmcof = 0.0
+	if ecco > 1.0e-4:
+		xmcof = -x2o3 * coef * bstar / eeta
+	nodecf = 3.5 * omeosq * xhdot1 * cc1
+	t2cof = 1.5 * cc1
+	# avoid a divide by zero for an inclination of 180 degrees
+	xlcof = -0.25 * j3oj2 * sinio * (3.0 + 5.0 * cosio) / (1.0 + cosio if abs(cosio + 1.0) > 1.5e-12 else 1.5e-12)
+	aycof = -0.5 * j3oj2 * sinio
+	delmo = (1.0 + eta * math.cos(mo)) ** 3
+
+	elements = {
+		'epoch': epoch, 'xke': xke, 'j2': j2, 'radius': radius,
+		'bstar': bstar, 'ecco': ecco, 'inclo': inclo, 'nodeo': nodeo, 'argpo': argpo, 'mo': mo, 'no': no,
+		'isimp': isimp, 'eta': eta, 'cosio': cosio, 'sinio': sinio, 'con41': con41, 'x1mth2': x1mth2, 'x7thm1': 7.0 * cosio2 - 1.0,
+		'cc1': cc1, 'cc4': cc4, 'cc5': cc5, 'mdot': mdot, 'argpdot': argpdot, 'nodedot': nodedot,
+		'omgcof': omgcof, 'xmcof': xmcof, 'nodecf': nodecf, 't2cof': t2cof, 'xlcof': xlcof, 'aycof': aycof,
+		'delmo': delmo, 'sinmao': math.sin(mo),
+	}
+	if not isimp:
+		cc1sq = cc1 * cc1
+		d2 = 4.0 * ao * tsi * cc1sq
+		temp = d2 * tsi * cc1 / 3.0
+		d3 = (17.0 * ao + sfour) * temp
+		d4 = 0.5 * temp * ao * tsi * (221.0 * ao + 31.0 * sfour) * cc1
+		elements.update({
+			'd2': d2, 'd3': d3, 'd4': d4,
+			't3cof': d2 + 2.0 * cc1sq,
+			't4cof': 0.25 * (3.0 * d3 + cc1 * (12.0 * d2 + 10.0 * cc1sq)),
+			't5cof': 0.2 * (3.0 * d4 + 12.0 * cc1 * d3 + 6.0 * d2 * d2 + 15.0 * cc1sq * (2.0 * d2 + cc1sq)),
+		})
+	return elements
@@ -0,0 +1,117 @@
+"""
+	Render Cache - remember rendered images, so an unchanged plot is never drawn twice
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	cache = RenderCache(directory)
+	key = RenderCache.key(...)
+	data = cache.get(key, 'png')
+	cache.put(key, 'png', data)
+"""
+
+import os
+import sys
+import hashlib
+import tempfile
+
+class RenderCache:
+	""" RenderCache - a directory of image files named by a hash of everything that went into drawing them """
+
+	VERSION = 1
+	MAX_BYTES = 64*1024*1024		# least recently used files are removed above this
+
+	def __init__(self, directory, max_bytes=MAX_BYTES):
+		""" RenderCache """
+
+		self._directory = directory
+		self._max_bytes = max_bytes
+		try:
+			os.makedirs(self._directory, exist_ok=True)
+		except OSError as e:
+			print("%s: %s - CONTINUE ANYWAY" % (self._directory, e), file=sys.stderr)
+
+	@classmethod
+	def key(cls, *parts):
+		""" key - parts are str, bytes, numbers, None or numpy arrays """
+
+		h = hashlib.sha256()
+		h.update(b'%d' % (RenderCache.VERSION))
+		for part in parts:
+			if hasattr(part, 'tobytes'):
+				# numpy - shape and type matter as much as the data
+				h.update(('%s%s' % (part.dtype.str, part.shape)).encode('utf8'))
+				part = part.tobytes()
+			elif not isinstance(part, bytes):
+				part = repr(part).encode('utf8')
+			# length first - so parts can't run into each other
+			h.update(b'%d:' % (len(part)))
+			h.update(part)
+		return h.hexdigest()
+
+	def get(self, key, file_format):
+		""" get - None if not cached """
+
+		filename = self._filename(key, file_format)
+		try:
+			with open(filename, 'rb') as fd:
+				data = fd.read()
+			# recently used - so it's the last to be removed
+			os.utime(filename)
+		except FileNotFoundError:
+			return None
+		except OSError as e:
+			print("%s: %s - CONTINUE ANYWAY" % (filename, e), file=sys.stderr)
+			return None
+		return data
+
+	def put(self, key, file_format, data):
+		""" put - written to a temp file first so a failure never leaves a half written image """
+
+		filename = self._filename(key, file_format)
+		try:
+			fd, tmp_filename = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=self._directory)
+			try:
+				with os.fdopen(fd, 'wb') as f:
+					f.write(data)
+				os.replace(tmp_filename, filename)
+			except BaseException:
+				os.unlink(tmp_filename)
+				raise
+		except OSError as e:
+			print("%s: %s - CONTINUE ANYWAY" % (filename, e), file=sys.stderr)
+			return
+		self._evict()
+
+	def _filename(self, key, file_format):
+		""" _filename """
+
+		return self._directory + '/' + key + '.' + file_format
+
+	def _evict(self):
+		""" _evict - oldest (by last use) first until we are under max_bytes """
+
+		files = []
+		total = 0
+		try:
+			with os.scandir(self._directory) as it:
+				for entry in it:
+					if entry.name.startswith('.') or not entry.is_file():
+						continue
+					st = entry.stat()
+					files.append((st.st_mtime, st.st_size, entry.path))
+					total += st.st_size
+		except OSError as e:
+			print("%s: %s - CONTINUE ANYWAY" % (self._directory, e), file=sys.stderr)
+			return
+
+		if total <= self._max_bytes:
+			return
+		for _, size, filename in sorted(files):
+			try:
+				os.unlink(filename)
+			except OSError:
+				continue
+			total -= size
+			if total <= self._max_bytes:
+				break
@@ -9,37 +9,44 @@
 	sat.set_satellite(name)
 	sat.set_when(datetime)
 	lnglat, elevation, azel = sat.get_where()
+
+	lng, lat, elevation, az, el = sat.get_where_batch(name, datetimes)
+	tle_epochs = sat.get_tle_epochs(name, datetimes)
+	names = Satellite.supported_names()
+	fingerprint = Satellite.get_tle_fingerprint()
+	Satellite.set_propagator('sgp4')		# get_where_batch() uses ephem (the reference) by default
 """
 
 import math
 import datetime
 
 import ephem
+import numpy as np
 
 from structures import AzEl, LongLat, TLE
+from tle_registry import TLERegistry
+from propagator import Propagator
+from profiler import Profile
 
 class Satellite:
 	""" Satellite """
 
 	DATA_DIRECTORY = 'data'
 
-	# A built-in limited TLE table; becuase, we don't need much to prove this code works
-	# Now read/updated in via data/tinygs_supported.txt file
-	_tle = {
-#		'Norbi':           TLE(46494, 'Norbi',           '1 46494U 20068J   21171.56680050  .00001399  00000-0  10640-3 0  9991', '2 46494  97.6936 109.0948 0019440  70.2955 290.0369 15.03626854 39805'),
-#		'SDSat':           TLE(47721, 'SDSat',           '1 47721U 21015W   21171.44232657 -.00000070  00000-0  00000-0 0  9993', '2 47721  97.4612 245.7217 0009950 249.9352 110.0983 15.20920648 17037'),
-#		'FEES':            TLE(48082, 'FEES',            '1 48082U 21022AL  21171.58982329  .00001838  00000-0  12797-3 0  9996', '2 48082  97.5572  73.8040 0014403 294.8526 111.5169 15.06628133 12056'),
-#		'VR3X-A':          TLE(47463, 'VR3X-A',          '1 47463U 21006BC  21171.17162378  .00001487  00000-0  90754-4 0  9999', '2 47463  97.4822 231.9589 0011368 111.7153 308.1704 15.11779214 22446'),
-#		'VR3X-B':          TLE(47467, 'VR3X-B',          '1 47467U 21006BG  21169.45647111  .00001328  00000-0  81368-4 0  9999', '2 47467  97.4831 230.3020 0011218 115.2320  10.3032 15.11840336 22183'),
-#		'VR3X-C':          TLE(47524, 'VR3X-C',          '1 47524U 21006DQ  21170.89786253  .00001545  00000-0  93817-4 0  9997', '2 47524  97.4850 231.7526 0011347 109.4781 336.1547 15.11922803 22408'),
-#		'Sri Shakthi Sat': TLE(47716, 'Sri Shakthi Sat', '1 47716U 21015S   21171.20129100 -.00000070  00000-0  00000-0 0  9999', '2 47716  97.4536 245.4575 0009230 252.9165 107.1279 15.21538626 16909'),
-	}
+	# Every TLE we have seen - read/updated in via data/tinygs_supported.txt file
+	# Each download is also remembered in the history file, so older packets can use older TLE's
+	_tle = TLERegistry()
 	_tle_updated = False
 	_tle_filename = DATA_DIRECTORY + '/' + 'tinygs_supported.txt'
+	_tle_history_filename = DATA_DIRECTORY + '/' + 'tinygs_supported_history.txt'
+	_supported = []			# the names in the latest download (in its order)
+	_propagator = Propagator.get(Propagator.DEFAULT)
 
 	def __init__(self):
 
 		self._observer = None
+		self._lnglat = None
+		self._elevation = 0.0
 		self._satellite_name = None
 		self._tle_rec = None
 
@@ -56,18 +63,17 @@ class Satellite:
 		self._observer.lat = self._degrees_to_radians(lnglat.lat)
 		self._observer.elevation = elevation
 		self._observer.date = datetime.datetime.utcnow()
+		self._lnglat = lnglat
+		self._elevation = elevation
 
-	def set_satellite(self, satellite_name):
-		""" satellite """
+	def set_satellite(self, satellite_name, dt=None):
+		""" satellite - uses the TLE with the epoch closest to dt (or the newest TLE) """
 
-		try:
-			s = Satellite._tle[satellite_name]
-		except IndexError as e:
-			raise IndexError from e
+		s = Satellite._tle.closest(satellite_name, dt)
 		if not s:
-			raise NotImplementedError
+			raise KeyError(satellite_name)
 		self._satellite_name = satellite_name
-		self._tle_rec = ephem.readtle(s.name, s.line1, s.line2)
+		self._tle_rec = TLERegistry.compile(s)
 
 	def set_when(self, dt=None):
 		""" when """
@@ -93,15 +99,79 @@ class Satellite:
 		azel = AzEl(self._radians_to_degrees(self._tle_rec.az), self._radians_to_degrees(self._tle_rec.alt))
 		return [lnglat, elevation, azel]
 
+	def get_where_batch(self, satellite_name, dts):
+		""" where - for one satellite at many times; returns numpy arrays in degrees (nan for a time that can't be computed) """
+
+		if not self._observer:
+			raise Exception
+
+		# each packet uses the TLE closest in time; each TLE is propagated over all its times in one go
+		tles, indexes = Satellite._tle.select(satellite_name, dts)
+		if not tles:
+			raise KeyError(satellite_name)
+		t = np.asarray(dts, dtype='datetime64[us]')
+
+		n = len(t)
+		results = [np.empty(n) for _ in range(5)]
+		for ii in np.unique(indexes).tolist():
+			which = indexes == ii
+			for result, values in zip(results, Satellite._propagator.where(tles[ii], self._lnglat, self._elevation, t[which])):
+				result[which] = values
+
+		return results
+
+	def get_tle_epochs(self, satellite_name, dts):
+		""" which TLE (by epoch; as seconds since 1970) get_where_batch() uses for each date/time - without computing anything """
+
+		tles, indexes = Satellite._tle.select(satellite_name, dts)
+		if not tles:
+			raise KeyError(satellite_name)
+		epoch = datetime.datetime(1970, 1, 1)
+		return np.array([(tle.epoch - epoch).total_seconds() for tle in tles])[indexes]
+
+	def get_tle_epochs_between(self, satellite_name, start, end):
+		""" which TLE's (by epoch) get_where_batch() uses from start to end - the choice only moves forward in time; so the ends are enough """
+
+		tles, indexes = Satellite._tle.select(satellite_name, [start, end])
+		if not tles:
+			raise KeyError(satellite_name)
+		return [tle.line1[18:32] for tle in tles[indexes[0]:indexes[1]+1]]
+
+	@classmethod
+	def supported_names(cls):
+		""" supported_names - every satellite in the latest tinygs_supported.txt """
+
+		if not cls._tle_updated:
+			cls._read_tle()
+			cls._tle_updated = True
+		return list(cls._supported)
+
+	@classmethod
+	def set_propagator(cls, name):
+		""" set_propagator - which Propagator get_where_batch() uses; 'sgp4' or 'ephem' """
+
+		cls._propagator = Propagator.get(name)
+
+	@classmethod
+	def get_propagator(cls):
+		""" get_propagator - its name """
+
+		return cls._propagator.name
+
+	@classmethod
+	def get_tle_fingerprint(cls):
+		""" get_tle_fingerprint - changes whenever a TLE is added """
+
+		if not cls._tle_updated:
+			cls._read_tle()
+			cls._tle_updated = True
+		return cls._tle.fingerprint()
+
 	@classmethod
 	def get_norad_from_name(cls, satellite_name):
 		""" get_norad_from_name """
 
-		if satellite_name in cls._tle:
-			line1 = cls._tle[satellite_name].line1
-			norad = str(line1[2:7])
-			return int(norad)
-		return 0
+		return cls._tle.norad(satellite_name)
 
 	@classmethod
 	def _radians_to_degrees(cls, d):
@@ -115,13 +185,57 @@ class Satellite:
 
 		return a / (180/math.pi)
 
+	@classmethod
+	def reload_tle(cls):
+		""" reload_tle - after a fresh download; TLE's already known are kept """
+
+		cls._read_tle()
+		cls._tle_updated = True
+
 	@classmethod
 	def _read_tle(cls):
-		""" read the TLE's in """
+		""" read the TLE's in - the history first, then the latest download """
+
+		with Profile.stage('tle'):
+			cls._read_tle_files()
+
+	@classmethod
+	def _read_tle_files(cls):
+		""" _read_tle_files """
+
+		for tle in cls._read_tle_file(cls._tle_history_filename):
+			cls._tle.add(tle)
+
+		new_tles = []
+		supported = []
+		for tle in cls._read_tle_file(cls._tle_filename):
+			if tle.name not in supported:
+				supported.append(tle.name)
+			if cls._tle.add(tle):
+				new_tles.append(tle)
+		if len(supported) > 0:
+			cls._supported = supported
+
+		if len(new_tles) == 0:
+			return
+
+		try:
+			# Remember these for next time - the history file is in the same format as the download
+			with open(cls._tle_history_filename, 'a') as fd:
+				for tle in new_tles:
+					fd.write('%s\n%s\n%s\n' % (tle.name, tle.line1, tle.line2))
+		except IOError as e:
+			# print('%s: %s - WILL CONTINUE ANYWAY' % (cls._tle_history_filename, e), file=sys.stderr)
+			pass
+
+	@classmethod
+	def _read_tle_file(cls, filename):
+		""" read a three line TLE file """
 
+		tles = []
 		try:
 			# Saved away from https://api.tinygs.com/v1/tinygs_supported.txt
-			with open(cls._tle_filename, 'r') as fd:
+			with open(filename, 'r') as fd:
 				n = 0
 				l = ['', '', '']
 				for line in fd.readlines():
@@ -131,21 +245,15 @@ class Satellite:
 						line1 = l[1]
 						line2 = l[2]
 						norad = str(line1[2:7])		# https://www.celestrak.com/NORAD/documentation/tle-fmt.php
-						epoch = str(line1[18:32])
-						if satellite_name in cls._tle:
-							existing_epoch = str(cls._tle[satellite_name].line1[18:32])
-						else:
-							existing_epoch = '00000000000000'
-							cls._tle[satellite_name] = None
-						if epoch >= existing_epoch:
-							# Update our saved/compiled-in copy of the TLE's
-							cls._tle[satellite_name] = TLE(norad, satellite_name, line1, line2)
-						else:
-							# print('%s: %s < %s New epoch is not newer - WILL CONTINUE ANYWAY' % (satellite_name, existing_epoch, epoch), file=sys.stderr)
+						try:
+							tles.append(TLE(norad, satellite_name, line1, line2))
+						except ValueError:
+							# print('%s: %s bad TLE - WILL CONTINUE ANYWAY' % (filename, satellite_name), file=sys.stderr)
 							pass
 					n = (n + 1) % 3
 
 		except FileNotFoundError as e:
-			# print('%s: %s - WILL CONTINUE ANYWAY' % (cls._tle_filename, e), file=sys.stderr)
+			# print('%s: %s - WILL CONTINUE ANYWAY' % (filename, e), file=sys.stderr)
 			pass
 
+		return tles
@@ -0,0 +1,149 @@
+"""
+	Station Catalog - the TinyGS stations list, pre-parsed and indexed by name and user-id
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	catalog = StationCatalog(stations_filename)
+	if catalog.load():
+		station = catalog.get(station_name)
+		station_names = catalog.by_user(user_id)
+"""
+
+import os
+import sys
+import json
+
+from structures import LongLat, Station
+
+class StationCatalog:
+	""" StationCatalog - stations.json is large and only changes every few days; so it's only parsed when it changes """
+
+	VERSION = 1
+	CATALOG_SUFFIX = '.catalog'
+
+	def __init__(self, stations_filename):
+		""" StationCatalog """
+
+		self._stations_filename = stations_filename
+		# stations.json -> stations.catalog
+		self._filename = os.path.splitext(stations_filename)[0] + StationCatalog.CATALOG_SUFFIX
+		self._rows = {}			# name -> [name, user_id, lng, lat] (in the order of stations.json)
+		self._stations = {}		# name -> Station; made when first asked for
+		self._users = {}		# user_id -> [name, ...]
+		self._ranking = None
+
+	def __len__(self):
+		return len(self._rows)
+
+	def __contains__(self, station_name):
+		return station_name in self._rows
+
+	def __iter__(self):
+		return iter(self._rows)
+
+	def __getitem__(self, station_name):
+		try:
+			return self._stations[station_name]
+		except KeyError:
+			pass
+		_, user_id, lng, lat = self._rows[station_name]
+		station = Station(station_name, user_id, LongLat(lng, lat))
+		self._stations[station_name] = station
+		return station
+
+	def get(self, station_name):
+		""" get - None if not known """
+
+		if station_name not in self._rows:
+			return None
+		return self[station_name]
+
+	def ranking(self, station_name):
+		""" ranking - where the station is in the list (from 1) """
+
+		if self._ranking is None:
+			self._ranking = {name: ii for ii, name in enumerate(self._rows, 1)}
+		return self._ranking[station_name]
+
+	def by_user(self, user_id):
+		""" by_user - station names (in list order) for a user-id """
+
+		return list(self._users.get(int(user_id), []))
+
+	def load(self):
+		""" load - returns False if there's no usable stations list """
+
+		try:
+			s = os.stat(self._stations_filename)
+		except OSError as e:
+			print("%s: %s - CONTINUE ANYWAY" % (self._stations_filename, e), file=sys.stderr)
+			return False
+		signature = [s.st_size, s.st_mtime]
+
+		rows = self._read_catalog(signature)
+		if rows is None:
+			rows = self._read_stations()
+			if rows is None:
+				return False
+			self._write_catalog(signature, rows)
+
+		self._index(rows)
+		return True
+
+	def _index(self, rows):
+		""" _index - rows are [name, user_id, lng, lat] """
+
+		# a later duplicate name replaces an earlier one - but keeps its place (as a dict would)
+		self._rows = {row[0]: row for row in rows}
+		self._stations = {}
+		self._ranking = None
+		self._users = {}
+		for station_name, user_id, _, _ in self._rows.values():
+			self._users.setdefault(user_id, []).append(station_name)
+
+	def _read_stations(self):
+		""" _read_stations - the full parse of the file from TinyGS """
+
+		rows = []
+		try:
+			with open(self._stations_filename, 'r', encoding='utf8') as fd:
+				j = json.load(fd)
+		except (IOError, ValueError) as e:
+			print("%s: %s - CONTINUE ANYWAY" % (self._stations_filename, e), file=sys.stderr)
+			return None
+
+		for s in j:
+			# we don't use all the data from the json file
+			# we sanatize this data also - just in case (Oh, yes. Little Bobby Tables, we call him)
+			station_name = str(s['name']).replace('/','_').replace('.','_').replace(':','_')
+			user_id = int(s['userId'])
+			rows.append([station_name, user_id, float(s['location'][1]), float(s['location'][0])])
+		return rows
+
+	def _read_catalog(self, signature):
+		""" _read_catalog - None if missing, old or for a different stations.json """
+
+		try:
+			with open(self._filename, 'r', encoding='utf8') as fd:
+				j = json.load(fd)
+		except FileNotFoundError:
+			return None
+		except (IOError, ValueError) as e:
+			print("%s: %s - CONTINUE ANYWAY" % (self._filename, e), file=sys.stderr)
+			return None
+
+		if not isinstance(j, dict) or j.get('version') != StationCatalog.VERSION or j.get('source') != signature:
+			return None
+		return j['stations']
+
+	def _write_catalog(self, signature, rows):
+		""" _write_catalog - written to a temp file first so a failure never leaves a half written catalog """
+
+		tmp_filename = self._filename + '.tmp'
+		try:
+			with open(tmp_filename, 'w', encoding='utf8') as fd:
+				json.dump({'version': StationCatalog.VERSION, 'source': signature, 'stations': rows}, fd, separators=(',', ':'))
+			os.replace(tmp_filename, self._filename)
+		except IOError as e:
+			print("%s: %s - CONTINUE ANYWAY" % (self._filename, e), file=sys.stderr)
@@ -6,9 +6,13 @@
 
 """
 
+import datetime
+
 class AzEl:
 	""" Azimuth and Elevation - where the satellite is in the sky based on the observer """
 
+	__slots__ = ('az', 'el')
+
 	def __init__(self, az, el):
 		self.az = float(az)
 		self.el = float(el)
@@ -19,6 +23,8 @@ class AzEl:
 class LongLat:
 	""" Latitude and Longitude - where an observer (or satellite) is on the earth's surface """
 
+	__slots__ = ('lng', 'lat')
+
 	def __init__(self, lng, lat):
 		self.lng = float(lng)
 		self.lat = float(lat)
@@ -49,6 +55,8 @@ class Station:
 class Packet:
 	""" Packet - what was received and maybe decoded """
 
+	__slots__ = ('ident', 'dt', 'norad', 'satellite', 'lnglat', 'elevation', 'azel', 'parsed')
+
 	def __init__(self, ident, dt, norad, satellite, lnglat, elevation, azel, parsed=None):
 		self.ident = ident
 		self.dt = dt
@@ -70,7 +78,20 @@ class TLE:
 		self.name = str(name)
 		self.line1 = str(line1)
 		self.line2 = str(line2)
+		self.epoch = self._epoch(self.line1)
 
 	def __str(self):
 		return '%d:%s: line1: %s line2: %s' % (self.norad, self.name, self.line1, self.line2)
 
+	@classmethod
+	def _epoch(cls, line1):
+		""" epoch - as a datetime; see https://www.celestrak.com/NORAD/documentation/tle-fmt.php """
+
+		year = int(line1[18:20])
+		if year < 57:
+			year += 2000
+		else:
+			year += 1900
+		day = float(line1[20:32])
+		return datetime.datetime(year, 1, 1) + datetime.timedelta(days=day - 1.0)
+
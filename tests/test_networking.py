@@ -0,0 +1,222 @@
+"""
+	Networking tests - downloads from a local HTTP server (so no TinyGS API is needed)
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	$ python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import glob
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from networking import Networking
+
+ETAG = '"abc123"'
+LAST_MODIFIED = 'Fri, 18 Jun 2021 12:00:00 GMT'
+BODY = b'[{"name":"ST_A","userId":1}]\n'
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+	""" _FixtureHandler - each request takes the next response from the server's script (the last one repeats) """
+
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		""" do_GET """
+
+		server = self.server
+		with server.lock:
+			server.requests.append(dict(self.headers))
+			step = server.script[min(len(server.requests), len(server.script)) - 1]
+
+		if step == 'conditional':
+			# what a server with validators does
+			if self.headers.get('If-None-Match') == ETAG or self.headers.get('If-Modified-Since') == LAST_MODIFIED:
+				step = 'not_modified'
+			else:
+				step = 'ok'
+
+		if step == 'not_modified':
+			self.send_response(304)
+			self.send_header('ETag', ETAG)
+			self.end_headers()
+		elif step == 'ok':
+			self.send_response(200)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(BODY)))
+			self.send_header('ETag', ETAG)
+			self.send_header('Last-Modified', LAST_MODIFIED)
+			self.end_headers()
+			self.wfile.write(BODY)
+		elif step == 'interrupted':
+			# promises more than is sent - then the connection goes away
+			self.send_response(200)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(BODY) * 100))
+			self.end_headers()
+			self.wfile.write(BODY)
+			self.wfile.flush()
+			self.close_connection = True
+		else:
+			self.send_response(int(step))
+			self.send_header('Content-Length', '0')
+			self.end_headers()
+
+	def log_message(self, format, *args):
+		""" log_message - quiet """
+
+		pass
+
+class NetworkingTest(unittest.TestCase):
+	""" NetworkingTest """
+
+	def setUp(self):
+		""" setUp - a server on a free port; the API points at it """
+
+		self._server = ThreadingHTTPServer(('127.0.0.1', 0), _FixtureHandler)
+		self._server.daemon_threads = True
+		self._server.lock = threading.Lock()
+		self._server.requests = []
+		self._server.script = ['ok']
+		self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+		self._thread.start()
+
+		self._saved_url = Networking._URL_API_STATIONS
+		Networking._URL_API_STATIONS = 'http://127.0.0.1:%d/v1/stations' % (self._server.server_address[1])
+
+		self._directory = tempfile.mkdtemp()
+		self._filename = self._directory + '/' + 'stations.json'
+		self._networking = Networking()
+		# no need to wait between retries here
+		self._networking.BACKOFF = 0.0
+
+	def tearDown(self):
+		""" tearDown """
+
+		Networking._URL_API_STATIONS = self._saved_url
+		self._networking = None
+		self._server.shutdown()
+		self._server.server_close()
+		shutil.rmtree(self._directory)
+
+	def _script(self, *steps):
+		""" _script """
+
+		self._server.script = list(steps)
+		self._server.requests = []
+
+	def _read(self):
+		""" _read """
+
+		with open(self._filename, 'rb') as fd:
+			return fd.read()
+
+	def _leftovers(self):
+		""" _leftovers - temp files left by a download """
+
+		return glob.glob(self._directory + '/.*.tmp')
+
+	def test_download(self):
+		""" test_download - the file and its validators are saved """
+
+		self.assertTrue(self._networking.stations(self._filename))
+		self.assertEqual(self._read(), BODY)
+		with open(self._filename + Networking.VALIDATORS_SUFFIX, 'r', encoding='utf8') as fd:
+			self.assertEqual(json.load(fd), {'ETag': ETAG, 'Last-Modified': LAST_MODIFIED})
+
+	def test_not_modified_etag(self):
+		""" test_not_modified_etag - If-None-Match is sent; a 304 keeps the file and marks it fresh """
+
+		self._script('conditional')
+		self.assertTrue(self._networking.stations(self._filename))
+		os.utime(self._filename, (1000000000, 1000000000))
+
+		self._script('conditional')
+		self.assertTrue(self._networking.stations(self._filename))
+		self.assertEqual(len(self._server.requests), 1)
+		self.assertEqual(self._server.requests[0].get('If-None-Match'), ETAG)
+		self.assertEqual(self._read(), BODY)
+		self.assertGreater(os.stat(self._filename).st_mtime, 1000000000)
+
+	def test_not_modified_last_modified(self):
+		""" test_not_modified_last_modified - with only Last-Modified saved, If-Modified-Since is sent """
+
+		self._script('conditional')
+		self.assertTrue(self._networking.stations(self._filename))
+		with open(self._filename + Networking.VALIDATORS_SUFFIX, 'w', encoding='utf8') as fd:
+			json.dump({'Last-Modified': LAST_MODIFIED}, fd)
+
+		self._script('conditional')
+		self.assertTrue(self._networking.stations(self._filename))
+		self.assertNotIn('If-None-Match', self._server.requests[0])
+		self.assertEqual(self._server.requests[0].get('If-Modified-Since'), LAST_MODIFIED)
+		self.assertEqual(self._read(), BODY)
+
+	def test_no_validators_without_file(self):
+		""" test_no_validators_without_file - a missing file is always downloaded in full """
+
+		self._script('conditional')
+		self.assertTrue(self._networking.stations(self._filename))
+		os.unlink(self._filename)
+
+		self._script('conditional')
+		self.assertTrue(self._networking.stations(self._filename))
+		self.assertNotIn('If-None-Match', self._server.requests[0])
+		self.assertEqual(self._read(), BODY)
+
+	def test_retry_5xx(self):
+		""" test_retry_5xx - 500 and 503 are retried until it works """
+
+		self._script('500', '503', 'ok')
+		self.assertTrue(self._networking.stations(self._filename))
+		self.assertEqual(len(self._server.requests), 3)
+		self.assertEqual(self._read(), BODY)
+
+	def test_retry_gives_up(self):
+		""" test_retry_gives_up - after RETRIES the download fails; what was there is left alone """
+
+		with open(self._filename, 'wb') as fd:
+			fd.write(b'old')
+		self._script('502')
+		self.assertFalse(self._networking.stations(self._filename))
+		self.assertEqual(len(self._server.requests), Networking.RETRIES + 1)
+		self.assertEqual(self._read(), b'old')
+		self.assertEqual(self._leftovers(), [])
+
+	def test_no_retry_404(self):
+		""" test_no_retry_404 - anything not worth retrying fails at once """
+
+		self._script('404')
+		self.assertFalse(self._networking.stations(self._filename))
+		self.assertEqual(len(self._server.requests), 1)
+		self.assertFalse(os.path.exists(self._filename))
+
+	def test_interrupted(self):
+		""" test_interrupted - a download cut short never replaces the file (or leaves a temp file) """
+
+		with open(self._filename, 'wb') as fd:
+			fd.write(b'old')
+		self._script('interrupted')
+		self.assertFalse(self._networking.stations(self._filename))
+		self.assertEqual(self._read(), b'old')
+		self.assertEqual(self._leftovers(), [])
+
+	def test_interrupted_new_file(self):
+		""" test_interrupted_new_file - nor leaves a truncated file where there was none """
+
+		self._script('interrupted')
+		self.assertFalse(self._networking.stations(self._filename))
+		self.assertFalse(os.path.exists(self._filename))
+		self.assertEqual(self._leftovers(), [])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,275 @@
+"""
+	Packet Archive tests - append, save and reopen (via archive.json), rewrite generations, failed runs and short files
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	$ python -m unittest discover -s tests
+"""
+
+import io
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from packet_archive import PacketArchive
+from packet_table import PacketTable
+
+T0 = 1624289281.0		# 2021-06-21T15:28:01Z
+
+def _table(idents, dt=0.0, satellite='Norbi', az=None):
+	""" _table - a packet a minute from T0 + dt; values a float32 holds exactly (as the archive stores them) """
+
+	n = len(idents)
+	az = np.arange(n) * 10.5 if az is None else np.full(n, float(az))
+	return PacketTable.from_columns(idents, T0 + dt + np.arange(n) * 60.0, np.full(n, 46494), [satellite] * n, np.arange(n) * 0.25, np.arange(n) * -0.5, np.full(n, 550.0), az, np.arange(n) * 2.5, [ii % 3 != 0 for ii in range(n)], np.full(n, T0 - 3600.0))
+
+def _packet(ident, dt=0.0):
+	""" _packet - as downloaded """
+
+	return {'id': ident, 'serverTime': int((T0 + dt) * 1000), 'norad': 46494, 'satellite': 'Norbi', 'satPos': {'lng': 1.5, 'lat': 2.5, 'alt': 550.0}, 'parsed': {'batt': 3.9}, 'raw': 'AAAA'}
+
+class PacketArchiveTest(unittest.TestCase):
+	""" PacketArchiveTest """
+
+	def setUp(self):
+		""" setUp - a station's directory """
+
+		self._directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		""" tearDown """
+
+		shutil.rmtree(self._directory)
+
+	def _archive(self):
+		""" _archive - a new one; as the next run would open it """
+
+		return PacketArchive(self._directory)
+
+	def _path(self, name):
+		""" _path """
+
+		return self._directory + '/' + PacketArchive.DIRECTORY + '/' + name
+
+	def _write_packets(self, filename, packets):
+		""" _write_packets - a downloaded packets file """
+
+		with open(self._directory + '/' + filename, 'w', encoding='utf8') as fd:
+			json.dump({'packets': packets}, fd)
+
+	def assertTableEqual(self, table, expected):
+		""" assertTableEqual - every column; satellite names (not codes) as they are interned per table """
+
+		self.assertEqual(table.idents.tolist(), expected.idents.tolist())
+		for name in ('t', 'az', 'el', 'norad', 'lng', 'lat', 'alt', 'tle_epoch'):
+			np.testing.assert_array_equal(getattr(table, name), getattr(expected, name), name)
+		self.assertEqual(table.parsed.tolist(), expected.parsed.tolist())
+		self.assertEqual([table.satellite_name(ii) for ii in range(len(table))], [expected.satellite_name(ii) for ii in range(len(expected))])
+
+	def test_round_trip(self):
+		""" test_round_trip - what's appended is what's read back after a reopen """
+
+		table = _table(['a1', 'a2', 'a3'], satellite='Norbi')
+		table.extend(_table(['b1', 'b2'], dt=600.0, satellite='FEES'))
+		below = _table(['c1', 'c2'], satellite='SDSat')
+		pending = [_packet('d1'), _packet('d2')]
+
+		archive = self._archive()
+		archive.set_azel({'propagator': 'ephem'})
+		archive.append(table, below, pending)
+		archive.save()
+		with open(self._path(PacketArchive.HEADER_FILENAME), 'r', encoding='utf8') as fd:
+			header = json.load(fd)
+		self.assertEqual(header['version'], PacketArchive.VERSION)
+		self.assertEqual(header['counts'], {PacketArchive.ROWS: 5, PacketArchive.BELOW: 2})
+
+		archive = self._archive()
+		self.assertEqual(len(archive), 5)
+		self.assertTableEqual(archive.table(), table)
+		self.assertTableEqual(archive.below(), below)
+		self.assertTableEqual(archive.table(3), table.take([3, 4]))
+		self.assertEqual(len(archive.table(5)), 0)
+		self.assertEqual(archive.pending(), pending)
+		self.assertEqual(archive.azel(), {'propagator': 'ephem'})
+		self.assertEqual(archive.table().window(T0 + 600.0, None).idents.tolist(), ['b1', 'b2'])
+
+	def test_append_batches(self):
+		""" test_append_batches - many appends before a save; table(start) is what was added """
+
+		archive = self._archive()
+		archive.append(_table(['a1', 'a2']))
+		archive.save()
+
+		archive = self._archive()
+		start = len(archive)
+		archive.append(_table(['b1', 'b2'], dt=600.0), _table(['x1']))
+		archive.append(_table(['c1'], dt=1200.0, satellite='FEES'), _table(['x2']))
+		archive.append(PacketTable(), None, [])
+		archive.save()
+
+		archive = self._archive()
+		self.assertEqual(archive.table().idents.tolist(), ['a1', 'a2', 'b1', 'b2', 'c1'])
+		self.assertEqual(archive.table(start).idents.tolist(), ['b1', 'b2', 'c1'])
+		self.assertEqual(archive.table(start).satellite_name(2), 'FEES')
+		self.assertEqual(archive.below().idents.tolist(), ['x1', 'x2'])
+
+	def test_not_saved(self):
+		""" test_not_saved - rows appended but never saved are not part of the archive """
+
+		archive = self._archive()
+		archive.append(_table(['a1', 'a2']))
+		archive.save()
+		archive.append(_table(['b1', 'b2'], dt=600.0))
+
+		self.assertEqual(self._archive().table().idents.tolist(), ['a1', 'a2'])
+
+	def test_failed_run(self):
+		""" test_failed_run - the next run writes over whatever a failed run appended (but never saved) """
+
+		archive = self._archive()
+		archive.append(_table(['a1', 'a2']), _table(['x1']))
+		archive.save()
+		# a run that stops before its save
+		archive = self._archive()
+		archive.append(_table(['b1', 'b2', 'b3', 'b4'], dt=600.0, az=99.0), _table(['x2', 'x3']))
+		del archive
+
+		archive = self._archive()
+		archive.append(_table(['c1'], dt=1200.0), _table(['x4']))
+		archive.save()
+
+		archive = self._archive()
+		self.assertEqual(archive.table().idents.tolist(), ['a1', 'a2', 'c1'])
+		self.assertEqual(archive.below().idents.tolist(), ['x1', 'x4'])
+		self.assertNotIn(99.0, archive.table().az.tolist())
+		# and the files are exactly as long as the rows saved
+		for name, dtype in PacketArchive._COLUMNS:
+			self.assertEqual(os.stat(self._path(name)).st_size, 3 * np.dtype(dtype).itemsize, name)
+		self.assertEqual(os.stat(self._path('idents')).st_size, len('a1\na2\nc1\n'))
+
+	def test_rewrite(self):
+		""" test_rewrite - each rewrite is a new generation of files; a table already handed out is never changed """
+
+		archive = self._archive()
+		archive.append(_table(['a1', 'a2', 'a3']), _table(['x1']))
+		archive.save()
+		old = archive.table()
+
+		table = _table(['a1', 'a2'], az=45.0)
+		below = _table(['a3', 'x1'], dt=3600.0)
+		archive.rewrite(table, below)
+		self.assertTrue(os.path.exists(self._path('az.1')))
+		self.assertFalse(os.path.exists(self._path('az')))
+		self.assertFalse(os.path.exists(self._path(PacketArchive.BELOW + 'idents')))
+		self.assertEqual(old.az.tolist(), [0.0, 10.5, 21.0])
+
+		archive = self._archive()
+		self.assertTableEqual(archive.table(), table)
+		self.assertTableEqual(archive.below(), below)
+
+		archive.rewrite(_table(['a1'], az=90.0), _table(['a2', 'a3', 'x1']))
+		self.assertTrue(os.path.exists(self._path('az.2')))
+		self.assertFalse(os.path.exists(self._path('az.1')))
+
+		# and appends go to the newest files
+		archive = self._archive()
+		archive.append(_table(['b1'], dt=7200.0))
+		archive.save()
+		archive = self._archive()
+		self.assertEqual(archive.table().idents.tolist(), ['a1', 'b1'])
+		self.assertEqual(archive.table().az.tolist(), [90.0, 0.0])
+		self.assertEqual(archive.below().idents.tolist(), ['a2', 'a3', 'x1'])
+
+	def test_short_file(self):
+		""" test_short_file - a column file shorter than the header says; the archive starts again (and is rebuilt) """
+
+		self._write_packets('2021-06-21T00-00-00.packets.json', [_packet('p1'), _packet('p2', 60.0)])
+		archive = self._archive()
+		self.assertEqual(archive.changed_files(), ['2021-06-21T00-00-00.packets.json'])
+		self.assertEqual(len(list(archive.read_file('2021-06-21T00-00-00.packets.json'))), 2)
+		archive.append(_table(['p1', 'p2']), _table(['x1']))
+		archive.save()
+
+		os.truncate(self._path('el'), 4)
+		stderr = io.StringIO()
+		with contextlib.redirect_stderr(stderr):
+			archive = self._archive()
+		self.assertIn('el shorter than the header says - CONTINUE ANYWAY', stderr.getvalue())
+		self.assertEqual(len(archive), 0)
+		self.assertEqual(len(archive.table()), 0)
+		self.assertEqual(archive.changed_files(), ['2021-06-21T00-00-00.packets.json'])
+		self.assertEqual([p['id'] for p in archive.read_file('2021-06-21T00-00-00.packets.json')], ['p1', 'p2'])
+		archive.append(_table(['p1', 'p2']), _table(['x1']))
+		archive.save()
+
+		archive = self._archive()
+		self.assertEqual(archive.table().idents.tolist(), ['p1', 'p2'])
+		self.assertEqual(archive.below().idents.tolist(), ['x1'])
+
+		os.truncate(self._path(PacketArchive.BELOW + 'idents'), 1)
+		with contextlib.redirect_stderr(io.StringIO()):
+			self.assertEqual(len(self._archive().below()), 0)
+
+	def test_read_file(self):
+		""" test_read_file - de-duplicated against the archive, the pending packets and the file itself """
+
+		archive = self._archive()
+		archive.append(_table(['p1']), _table(['p2']), [_packet('p3')])
+		archive.save()
+
+		self._write_packets('a.packets.json', [_packet('p1'), _packet('p2'), _packet('p3'), _packet('p4'), _packet('p4'), _packet('p5')])
+		archive = self._archive()
+		packets = list(archive.read_file('a.packets.json'))
+		self.assertEqual([p['id'] for p in packets], ['p4', 'p5'])
+		# only what's used is kept
+		self.assertEqual(packets[0], {'id': 'p4', 'serverTime': int(T0 * 1000), 'norad': 46494, 'satellite': 'Norbi', 'satPos': {'lng': 1.5, 'lat': 2.5, 'alt': 550.0}, 'parsed': True})
+		archive.save()
+
+		archive = self._archive()
+		self.assertEqual(archive.changed_files(), [])
+		# touched; but the same contents
+		os.utime(self._directory + '/' + 'a.packets.json', (T0, T0))
+		self.assertEqual(archive.changed_files(), ['a.packets.json'])
+		self.assertEqual(list(archive.read_file('a.packets.json')), [])
+
+	def test_read_file_partly(self):
+		""" test_read_file_partly - a file is only marked as read once all of it has been read """
+
+		self._write_packets('a.packets.json', [_packet('p1'), _packet('p2')])
+		archive = self._archive()
+		packets = archive.read_file('a.packets.json')
+		next(packets)
+		packets.close()
+		archive.save()
+		self.assertEqual(self._archive().changed_files(), ['a.packets.json'])
+
+	def test_pending(self):
+		""" test_pending - replaced each time they are given """
+
+		archive = self._archive()
+		archive.append(PacketTable(), None, [_packet('p1'), _packet('p2')])
+		archive.save()
+		archive = self._archive()
+		self.assertEqual([p['id'] for p in archive.pending()], ['p1', 'p2'])
+
+		archive.append(_table(['p1']), None, [_packet('p2')])
+		archive.save()
+		archive = self._archive()
+		self.assertEqual([p['id'] for p in archive.pending()], ['p2'])
+		self.assertEqual(archive.table().idents.tolist(), ['p1'])
+
+		archive.append(PacketTable(), None, [])
+		archive.save()
+		self.assertEqual(self._archive().pending(), [])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,160 @@
+"""
+	Packet Compactor tests - overlapping packets files merged and checked; the newest copy of each packet is kept
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	$ python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import json
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from packet_compactor import PacketCompactor
+from packet_reader import PacketReader
+
+def _packet(ident, version=1):
+	""" _packet - version marks which download the copy came from """
+
+	return {'id': ident, 'serverTime': 1624289281000 + int(ident[1:]) * 1000, 'norad': 46494, 'satellite': 'Norbi', 'satPos': {'lng': 1.0, 'lat': 2.0, 'alt': 500.0}, 'parsed': {'version': version}}
+
+# each download overlaps the one before (as the API returns the most recent packets)
+FILES = {
+	'2021-06-20T00-00-00.packets.json': [_packet('p%d' % (ii), 1) for ii in range(0, 6)],
+	'2021-06-21T00-00-00.packets.json': [_packet('p%d' % (ii), 2) for ii in range(3, 9)],
+	'2021-06-22T00-00-00.packets.json': [_packet('p%d' % (ii), 3) for ii in range(7, 12)],
+}
+MTIMES = {filename: 1624147200 + ii * 86400 for ii, filename in enumerate(sorted(FILES))}
+
+class PacketCompactorTest(unittest.TestCase):
+	""" PacketCompactorTest """
+
+	def setUp(self):
+		""" setUp """
+
+		self._directory = tempfile.mkdtemp()
+		for filename, packets in FILES.items():
+			self._write(filename, packets, MTIMES[filename])
+
+	def tearDown(self):
+		""" tearDown """
+
+		shutil.rmtree(self._directory)
+
+	def _write(self, filename, packets, mtime):
+		""" _write - as downloaded """
+
+		filename = self._directory + '/' + filename
+		with open(filename, 'w', encoding='utf8') as fd:
+			json.dump({'packets': packets}, fd)
+		os.utime(filename, (mtime, mtime))
+
+	def _compacted(self):
+		""" _compacted - ident -> packet """
+
+		with open(self._directory + '/' + PacketCompactor.COMPACTED_FILENAME, 'rb') as fd:
+			packets = list(PacketReader(fd))
+		idents = [p['id'] for p in packets]
+		self.assertEqual(len(idents), len(set(idents)))
+		return {p['id']: p for p in packets}
+
+	def test_compact(self):
+		""" test_compact - every packet once; the newest copy; the raw files removed """
+
+		compactor = PacketCompactor(self._directory)
+		merged = compactor.compact()
+		self.assertEqual(sorted(merged), sorted(FILES))
+		self.assertEqual(os.listdir(self._directory), [PacketCompactor.COMPACTED_FILENAME])
+
+		packets = self._compacted()
+		self.assertEqual(sorted(packets), sorted('p%d' % (ii) for ii in range(12)))
+		for ident, p in packets.items():
+			n = int(ident[1:])
+			self.assertEqual(p, _packet(ident, 3 if n >= 7 else 2 if n >= 3 else 1))
+
+		self.assertEqual(compactor.packets, 12)
+		self.assertEqual(compactor.packets_seen, 17)
+		self.assertEqual(compactor.bytes_before, sum(len(json.dumps({'packets': packets})) for packets in FILES.values()))
+		self.assertEqual(compactor.bytes_after, os.stat(self._directory + '/' + PacketCompactor.COMPACTED_FILENAME).st_size)
+		# the newest download says when the station is next refreshed
+		self.assertEqual(os.stat(self._directory + '/' + PacketCompactor.COMPACTED_FILENAME).st_mtime, max(MTIMES.values()))
+
+	def test_compact_again(self):
+		""" test_compact_again - with a new download; the compacted file only has older copies """
+
+		PacketCompactor(self._directory).compact()
+		self._write('2021-06-23T00-00-00.packets.json', [_packet('p%d' % (ii), 4) for ii in range(10, 14)], max(MTIMES.values()) + 86400)
+
+		merged = PacketCompactor(self._directory).compact()
+		self.assertEqual(merged, ['2021-06-23T00-00-00.packets.json', PacketCompactor.COMPACTED_FILENAME])
+		packets = self._compacted()
+		self.assertEqual(len(packets), 14)
+		self.assertEqual(packets['p9'], _packet('p9', 3))
+		self.assertEqual(packets['p10'], _packet('p10', 4))
+		self.assertEqual(packets['p0'], _packet('p0', 1))
+		self.assertEqual(os.listdir(self._directory), [PacketCompactor.COMPACTED_FILENAME])
+
+	def test_keep(self):
+		""" test_keep - the raw files are kept in a .tar.xz file """
+
+		compactor = PacketCompactor(self._directory)
+		compactor.compact(keep=True)
+		with tarfile.open(compactor.raw_filename, 'r:xz') as tar:
+			self.assertEqual(sorted(tar.getnames()), sorted(FILES))
+			with tar.extractfile('2021-06-21T00-00-00.packets.json') as fd:
+				self.assertEqual(json.load(fd)['packets'], FILES['2021-06-21T00-00-00.packets.json'])
+
+	def test_bad_file(self):
+		""" test_bad_file - left alone; the rest are merged """
+
+		with open(self._directory + '/' + '2021-06-23T00-00-00.packets.json', 'w', encoding='utf8') as fd:
+			fd.write('{"packets":[{"id":"p99"')
+		merged = PacketCompactor(self._directory).compact()
+		self.assertEqual(sorted(merged), sorted(FILES))
+		self.assertEqual(sorted(os.listdir(self._directory)), ['2021-06-23T00-00-00.packets.json', PacketCompactor.COMPACTED_FILENAME])
+		self.assertNotIn('p99', self._compacted())
+
+	def test_nothing_to_merge(self):
+		""" test_nothing_to_merge """
+
+		for filename in sorted(FILES)[1:]:
+			os.unlink(self._directory + '/' + filename)
+		self.assertEqual(PacketCompactor(self._directory).compact(), [])
+		self.assertEqual(os.listdir(self._directory), [sorted(FILES)[0]])
+		self.assertEqual(PacketCompactor(self._directory + '/' + 'missing').compact(), [])
+
+	def test_verify(self):
+		""" test_verify - a merged file that doesn't match is an error """
+
+		filename = self._directory + '/' + sorted(FILES)[0]
+		seen = set(p['id'] for p in FILES[sorted(FILES)[0]])
+		PacketCompactor._verify(filename, seen)
+		with self.assertRaises(ValueError):
+			PacketCompactor._verify(filename, seen | {'p99'})
+		with self.assertRaises(ValueError):
+			PacketCompactor._verify(filename, seen - {'p0'})
+
+	def test_verify_fails(self):
+		""" test_verify_fails - nothing is removed (or left behind) """
+
+		class _Dropping(PacketCompactor):
+			""" _Dropping - as if a packet went missing while merging """
+
+			def _merge(self, filenames, fd):
+				merged, seen, mtime = super()._merge(filenames, fd)
+				return merged, seen | {'p99'}, mtime
+
+		before = sorted(os.listdir(self._directory))
+		with self.assertRaises(ValueError):
+			_Dropping(self._directory).compact(keep=True)
+		self.assertEqual(sorted(os.listdir(self._directory)), before)
+
+if __name__ == '__main__':
+	unittest.main()
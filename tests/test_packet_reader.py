@@ -0,0 +1,103 @@
+"""
+	Packet Reader tests - the incremental decode against json.loads() (wherever the chunks split the file)
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	$ python -m unittest discover -s tests
+"""
+
+import io
+import os
+import sys
+import json
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from packet_reader import PacketReader
+
+# as downloaded; including a negative number, nested objects, nulls and non ASCII (two, three and four byte UTF-8)
+PACKETS = [
+	{'id': '60d0a1', 'serverTime': 1624289281000, 'norad': 46494, 'satellite': 'Norbi', 'satPos': {'lng': -122.25, 'lat': 37.5, 'alt': 568.125}, 'parsed': {'batt': 3.9}},
+	{'id': '60d0a2', 'serverTime': 1624289299123, 'norad': 47963, 'satellite': 'Satélite № 1', 'satPos': {'lng': 0.0, 'lat': -1e-3, 'alt': 500}, 'parsed': None},
+	{'id': '60d0a3', 'serverTime': 1624290000000, 'norad': 51439, 'satellite': '\U0001f6f0️', 'satPos': None},
+]
+
+def _document(packets=PACKETS, **others):
+	""" _document - as bytes; with whitespace as a server might send it """
+
+	d = dict(others)
+	d['packets'] = packets
+	return json.dumps(d, indent=1, ensure_ascii=False).encode('utf8')
+
+def _read(data, chunk_size=PacketReader.CHUNK_SIZE):
+	""" _read """
+
+	return list(PacketReader(io.BytesIO(data), chunk_size))
+
+class PacketReaderTest(unittest.TestCase):
+	""" PacketReaderTest """
+
+	def test_read(self):
+		""" test_read """
+
+		self.assertEqual(_read(_document()), PACKETS)
+
+	def test_every_chunk_size(self):
+		""" test_every_chunk_size - so every value, number and UTF-8 character is split at some point """
+
+		data = _document()
+		for chunk_size in range(1, len(data) + 2):
+			self.assertEqual(_read(data, chunk_size), PACKETS, 'chunk_size %d' % (chunk_size))
+
+	def test_split_at_chunk_size(self):
+		""" test_split_at_chunk_size - a packet (its numbers and its UTF-8) across the CHUNK_SIZE boundary of a real sized read """
+
+		filler = [{'id': 'f%d' % (ii), 'satellite': 'x' * 1000} for ii in range(PacketReader.CHUNK_SIZE // 1024)]
+		first = b'{"id":"60d0a1"'
+		n = len(json.dumps({'packets': filler + PACKETS}, separators=(',', ':'), ensure_ascii=False).encode('utf8').split(first)[0])
+		for offset in range(-200, 200, 3):
+			# pad the last filler packet so the first real packet starts offset bytes from CHUNK_SIZE
+			packets = filler[:-1] + [{'id': 'f%d' % (len(filler) - 1), 'satellite': 'x' * (1000 + PacketReader.CHUNK_SIZE + offset - n)}] + PACKETS
+			data = json.dumps({'packets': packets}, separators=(',', ':'), ensure_ascii=False).encode('utf8')
+			self.assertEqual(data.index(first), PacketReader.CHUNK_SIZE + offset)
+			self.assertEqual(_read(data), packets, 'offset %d' % (offset))
+
+	def test_other_keys(self):
+		""" test_other_keys - before and after the packets; ignored """
+
+		data = _document(PACKETS, a={'packets': [1, 2]}, b=[1, '}'], z=12.5)
+		self.assertEqual(_read(data, 7), PACKETS)
+
+	def test_empty(self):
+		""" test_empty """
+
+		self.assertEqual(_read(b'{}'), [])
+		self.assertEqual(_read(b' { "packets" : [ ] } '), [])
+		self.assertEqual(_read(b'{"packets":[]}', 1), [])
+
+	def test_number_at_end(self):
+		""" test_number_at_end - a number as the last thing in the buffer may not be complete yet """
+
+		self.assertEqual(_read(b'{"packets":[12345678901234567890]}', 4), [12345678901234567890])
+		self.assertEqual(_read(b'{"packets":[1.5e-3,-2]}', 3), [1.5e-3, -2])
+
+	def test_truncated(self):
+		""" test_truncated - an error; never a short list """
+
+		data = _document()
+		for n in (0, 1, len(data) // 2, len(data) - 2):
+			with self.assertRaises(ValueError):
+				_read(data[:n], 16)
+
+	def test_bad_separator(self):
+		""" test_bad_separator """
+
+		with self.assertRaises(ValueError):
+			_read(b'{"packets":[1;2]}')
+		with self.assertRaises(ValueError):
+			_read(b'["packets"]')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,160 @@
+"""
+	Packet Table tests - take, extend (with satellite names interned per table) and time windows
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	$ python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import datetime
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from packet_table import PacketTable
+
+T0 = 1624289281.0		# 2021-06-21T15:28:01Z
+
+def _table(rows):
+	""" _table - rows of (ident, seconds after T0, satellite name, parsed); the az/el and position are made from the row number """
+
+	n = len(rows)
+	return PacketTable.from_columns(
+		[ident for ident, _, _, _ in rows],
+		[T0 + dt for _, dt, _, _ in rows],
+		[40000 + len(name) for _, _, name, _ in rows],
+		[name for _, _, name, _ in rows],
+		np.arange(n) * 1.0, np.arange(n) * 0.5, np.full(n, 500.0),
+		np.arange(n) * 10.0, np.arange(n) * 5.0,
+		[parsed for _, _, _, parsed in rows])
+
+def _rows(table):
+	""" _rows - back to what _table() was given """
+
+	return [(table.idents[ii], table.t[ii] - T0, table.satellite_name(ii), bool(table.parsed[ii])) for ii in range(len(table))]
+
+A = [('a1', 0, 'Norbi', True), ('a2', 60, 'FEES', False), ('a3', 120, 'Norbi', True), ('a4', 180, 'SDSat', True)]
+B = [('a3', 120, 'Norbi', True), ('b1', 240, 'SDSat', False), ('b2', 300, 'GaoFen-19', True)]
+
+class PacketTableTest(unittest.TestCase):
+	""" PacketTableTest """
+
+	def test_from_columns(self):
+		""" test_from_columns """
+
+		table = _table(A)
+		self.assertEqual(len(table), 4)
+		self.assertEqual(_rows(table), A)
+		self.assertEqual(table.satellites, ['Norbi', 'FEES', 'SDSat'])
+		self.assertEqual(table.satellite.tolist(), [0, 1, 0, 2])
+		self.assertIn('a2', table)
+		self.assertNotIn('b1', table)
+
+		p = table.packet(1)
+		self.assertEqual(p.ident, 'a2')
+		self.assertEqual(p.dt, datetime.datetime(2021, 6, 21, 15, 29, 1))
+		self.assertEqual(p.satellite, 'FEES')
+		self.assertIsNone(p.parsed)
+		self.assertEqual([p.ident for p in table], ['a1', 'a2', 'a3', 'a4'])
+
+	def test_take_mask(self):
+		""" test_take_mask """
+
+		table = _table(A)
+		subset = table.take(table.parsed)
+		self.assertEqual(_rows(subset), [A[0], A[2], A[3]])
+		self.assertEqual(subset.az.tolist(), [0.0, 20.0, 30.0])
+		self.assertIn('a4', subset)
+		self.assertNotIn('a2', subset)
+
+	def test_take_rows(self):
+		""" test_take_rows - in the order given; the original is not changed """
+
+		table = _table(A)
+		subset = table.take([3, 0])
+		self.assertEqual(_rows(subset), [A[3], A[0]])
+		self.assertEqual(subset.el.tolist(), [15.0, 0.0])
+		self.assertEqual(_rows(table.take(np.array([], dtype=np.intp))), [])
+
+		subset.az[:] = -1.0
+		self.assertEqual(table.az.tolist(), [0.0, 10.0, 20.0, 30.0])
+		self.assertEqual(_rows(table), A)
+
+	def test_extend(self):
+		""" test_extend - only the new idents are added; and returned """
+
+		table = _table(A)
+		self.assertIn('a1', table)		# so the ident index is built (and must be kept up to date)
+		added = table.extend(_table(B))
+		self.assertEqual(_rows(added), B[1:])
+		self.assertEqual(_rows(table), A + B[1:])
+		self.assertIn('b2', table)
+		self.assertEqual(table.satellites, ['Norbi', 'FEES', 'SDSat', 'GaoFen-19'])
+
+		added = table.extend(_table(B))
+		self.assertEqual(len(added), 0)
+		self.assertEqual(len(table), 6)
+
+	def test_extend_empty(self):
+		""" test_extend_empty - the other table's rows are used as is; later extends never change it """
+
+		other = _table(A)
+		table = PacketTable()
+		self.assertIs(table.extend(other), other)
+		self.assertEqual(_rows(table), A)
+
+		table.extend(_table(B))
+		self.assertEqual(_rows(other), A)
+		self.assertEqual(_rows(table), A + B[1:])
+
+	def test_extend_satellites(self):
+		""" test_extend_satellites - satellite names are interned per table; so the codes are mapped """
+
+		table = _table([('x1', 0, 'GaoFen-19', True)])
+		table.extend(_table(A))
+		self.assertEqual(table.satellites, ['GaoFen-19', 'Norbi', 'FEES', 'SDSat'])
+		self.assertEqual([table.satellite_name(ii) for ii in range(len(table))], ['GaoFen-19', 'Norbi', 'FEES', 'Norbi', 'SDSat'])
+
+	def test_window(self):
+		""" test_window - since <= t < until; rows already in time order are a slice (no copy) """
+
+		table = _table(A + B[1:])
+		self.assertEqual([p.ident for p in table.window(T0 + 60, T0 + 240)], ['a2', 'a3', 'a4'])
+		self.assertEqual([p.ident for p in table.window(T0 + 59.5, T0 + 240.5)], ['a2', 'a3', 'a4', 'b1'])
+		self.assertEqual([p.ident for p in table.window(None, T0 + 120)], ['a1', 'a2'])
+		self.assertEqual([p.ident for p in table.window(T0 + 240, None)], ['b1', 'b2'])
+		self.assertEqual(len(table.window(T0 + 1000, None)), 0)
+		self.assertEqual(len(table.window(None, T0)), 0)
+		self.assertIs(table.window(), table)
+		self.assertIs(table.window(T0, T0 + 301), table)
+
+		window = table.window(T0 + 60, T0 + 240)
+		self.assertTrue(np.shares_memory(window.t, table.t))
+		self.assertEqual(window.satellites, table.satellites)
+
+	def test_window_unsorted(self):
+		""" test_window_unsorted - still found by time; in the original order """
+
+		rows = [B[2], A[0], A[3], B[1], A[1], A[2]]
+		table = _table(rows)
+		window = table.window(T0 + 60, T0 + 240)
+		self.assertEqual(_rows(window), [A[3], A[1], A[2]])
+		self.assertFalse(np.shares_memory(window.t, table.t))
+		self.assertEqual([p.ident for p in table.window(T0 + 240, None)], ['b2', 'b1'])
+
+	def test_window_after_extend(self):
+		""" test_window_after_extend - the time index is built again """
+
+		table = _table(A)
+		self.assertEqual(len(table.window(T0 + 200, None)), 0)
+		table.extend(_table([('c1', -60, 'Norbi', True)] + B))
+		self.assertEqual([p.ident for p in table.window(T0 + 200, None)], ['b1', 'b2'])
+		self.assertEqual([p.ident for p in table.window(None, T0)], ['c1'])
+
+if __name__ == '__main__':
+	unittest.main()
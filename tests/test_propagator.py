@@ -0,0 +1,134 @@
+"""
+	Propagator tests - the sgp4 propagator against ephem (the reference)
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	$ python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from structures import LongLat, TLE
+from propagator import Propagator, SGP4Propagator
+
+# degrees - as benchmark.py -p; a small fraction of the smallest bucket
+TOLERANCE = 0.05
+
+DAYS = 3			# either side of the epoch
+STEP = 60			# seconds
+
+# (lng, lat, elevation) - including one on the equator (so the equatorial orbit is seen) and one in the Arctic
+OBSERVERS = ((-122.0, 37.4, 30.0), (0.0, 0.2, 10.0), (25.7, 78.2, 500.0))
+
+def _checksum(line):
+	""" _checksum - the last digit of a TLE line (so a line can be edited) """
+
+	line = line[:68]
+	return line + str(sum(int(c) if c.isdigit() else 1 if c == '-' else 0 for c in line) % 10)
+
+def _tle(name, line1, line2):
+	""" _tle """
+
+	line1 = _checksum(line1)
+	line2 = _checksum(line2)
+	return TLE(line1[2:7], name, line1, line2)
+
+# low earth orbit (as most TinyGS satellites)
+LEO = _tle('Norbi',
+	'1 46494U 20068J   21171.56680050  .00001399  00000-0  10640-3 0  9991',
+	'2 46494  97.6936 109.0948 0019440  70.2955 290.0369 15.03626854 39805')
+# eccentric (0.19) but still near earth (a 133 minute period)
+ECCENTRIC = _tle('VANGUARD 1',
+	'1 00005U 58002B   00179.78495062  .00000023  00000-0  28098-4 0  4753',
+	'2 00005  34.2682 348.7242 1859667 331.7664  19.3264 10.82419157413667')
+# the LEO orbit above; but near equatorial
+EQUATORIAL = _tle('Norbi (equatorial)',
+	'1 46494U 20068J   21171.56680050  .00001399  00000-0  10640-3 0  9991',
+	'2 46494   0.0500 109.0948 0019440  70.2955 290.0369 15.03626854 39805')
+# deep space (a 12 hour period)
+DEEP_SPACE = _tle('MOLNIYA 2-14',
+	'1 08195U 75081A   06176.33215444  .00000099  00000-0  11873-3 0   813',
+	'2 08195  64.1586 279.0717 6877146 264.7651  20.2257  2.00491383225656')
+
+class PropagatorTest(unittest.TestCase):
+	""" PropagatorTest """
+
+	def setUp(self):
+		""" setUp """
+
+		self._sgp4 = Propagator.get('sgp4')
+		self._ephem = Propagator.get('ephem')
+
+	@classmethod
+	def _times(cls, tle, days=DAYS):
+		""" _times - once every STEP seconds, days either side of the epoch """
+
+		return np.datetime64(tle.epoch, 'us') + np.arange(-days * 86400, days * 86400, STEP) * np.timedelta64(1, 's')
+
+	def _compare(self, tle):
+		""" _compare - from every observer; returns how often the satellite was above the horizon """
+
+		times = self._times(tle)
+		n_above = 0
+		for lng, lat, elevation in OBSERVERS:
+			lnglat = LongLat(lng, lat)
+			_, _, _, az0, el0 = self._ephem.where(tle, lnglat, elevation, times)
+			_, _, _, az1, el1 = self._sgp4.where(tle, lnglat, elevation, times)
+			self.assertFalse(np.isnan(el1).any())
+			self.assertLess(np.max(np.abs(el1 - el0)), TOLERANCE)
+
+			# az on its own means little near the zenith - so the angle between the two directions
+			above = el0 > 0
+			n_above += int(above.sum())
+			a0, e0, a1, e1 = [np.radians(v[above]) for v in (az0, el0, az1, el1)]
+			cos_separation = np.sin(e0) * np.sin(e1) + np.cos(e0) * np.cos(e1) * np.cos(a1 - a0)
+			separation = np.degrees(np.arccos(np.clip(cos_separation, -1.0, 1.0)))
+			if len(separation) > 0:
+				self.assertLess(np.max(separation), TOLERANCE)
+		return n_above
+
+	def test_leo(self):
+		""" test_leo """
+
+		self.assertGreater(self._compare(LEO), 0)
+
+	def test_eccentric(self):
+		""" test_eccentric """
+
+		self.assertGreater(self._compare(ECCENTRIC), 0)
+
+	def test_equatorial(self):
+		""" test_equatorial """
+
+		self.assertGreater(self._compare(EQUATORIAL), 0)
+
+	def test_deep_space(self):
+		""" test_deep_space - passed to ephem; so exactly the same """
+
+		times = self._times(DEEP_SPACE)
+		for lng, lat, elevation in OBSERVERS:
+			lnglat = LongLat(lng, lat)
+			for v0, v1 in zip(self._ephem.where(DEEP_SPACE, lnglat, elevation, times), self._sgp4.where(DEEP_SPACE, lnglat, elevation, times)):
+				np.testing.assert_array_equal(v0, v1)
+
+	def test_too_far_from_epoch(self):
+		""" test_too_far_from_epoch - nan (as ephem refuses them); the other times are still computed """
+
+		epoch = np.datetime64(LEO.epoch, 'us')
+		day = np.timedelta64(1, 'D')
+		times = np.array([epoch - (SGP4Propagator.MAX_DAYS + 1) * day, epoch, epoch + (SGP4Propagator.MAX_DAYS + 1) * day])
+		lnglat = LongLat(*OBSERVERS[0][:2])
+		for propagator in (self._sgp4, self._ephem):
+			_, _, _, az, el = propagator.where(LEO, lnglat, OBSERVERS[0][2], times)
+			self.assertEqual(np.isnan(el).tolist(), [True, False, True])
+			self.assertEqual(np.isnan(az).tolist(), [True, False, True])
+
+if __name__ == '__main__':
+	unittest.main()
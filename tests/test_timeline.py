@@ -0,0 +1,110 @@
+"""
+	Timeline tests - the hour, day and week bin edges (in UTC; weeks start on a Monday) and the counts
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	$ python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import datetime
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from packet_table import PacketTable
+from timeline import Timeline
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+def _seconds(dt):
+	""" _seconds - since 1970; dt is naive UTC """
+
+	return (dt - EPOCH).total_seconds()
+
+def _table(times, parsed=None):
+	""" _table - times are naive UTC datetimes """
+
+	n = len(times)
+	if parsed is None:
+		parsed = [True] * n
+	return PacketTable.from_columns(['p%d' % (ii) for ii in range(n)], [_seconds(dt) for dt in times], np.full(n, 46494), ['Norbi'] * n, np.zeros(n), np.zeros(n), np.zeros(n), np.zeros(n), np.full(n, 45.0), parsed)
+
+def _dt(s):
+	""" _dt """
+
+	return datetime.datetime.strptime(s, '%Y-%m-%dT%H:%M:%S')
+
+class TimelineTest(unittest.TestCase):
+	""" TimelineTest """
+
+	def test_hour(self):
+		""" test_hour - each edge starts a bin """
+
+		times = [_dt('2021-06-21T09:59:59'), _dt('2021-06-21T10:00:00'), _dt('2021-06-21T10:59:59'), _dt('2021-06-21T12:00:00')]
+		timeline = Timeline([_table(times)], 'hour')
+		self.assertEqual(timeline.bin_starts(), [_dt('2021-06-21T09:00:00'), _dt('2021-06-21T10:00:00'), _dt('2021-06-21T11:00:00'), _dt('2021-06-21T12:00:00')])
+		self.assertEqual(timeline.counts[0][0].tolist(), [1, 2, 0, 1])
+
+	def test_day(self):
+		""" test_day - days start at midnight UTC """
+
+		times = [_dt('2021-06-20T23:59:59'), _dt('2021-06-21T00:00:00'), _dt('2021-06-21T23:59:59'), _dt('2021-06-23T00:00:01')]
+		timeline = Timeline([_table(times)], 'day')
+		self.assertEqual(timeline.bin_starts(), [_dt('2021-06-20T00:00:00'), _dt('2021-06-21T00:00:00'), _dt('2021-06-22T00:00:00'), _dt('2021-06-23T00:00:00')])
+		self.assertEqual(timeline.counts[0][0].tolist(), [1, 2, 0, 1])
+
+	def test_week(self):
+		""" test_week - weeks start on a Monday (2021-06-21 and 2021-06-28 are Mondays) """
+
+		times = [_dt('2021-06-20T23:59:59'), _dt('2021-06-21T00:00:00'), _dt('2021-06-27T23:59:59'), _dt('2021-06-28T00:00:00')]
+		timeline = Timeline([_table(times)], 'week')
+		self.assertEqual(timeline.bin_starts(), [_dt('2021-06-14T00:00:00'), _dt('2021-06-21T00:00:00'), _dt('2021-06-28T00:00:00')])
+		for dt in timeline.bin_starts():
+			self.assertEqual(dt.weekday(), 0)
+		self.assertEqual(timeline.counts[0][0].tolist(), [1, 2, 1])
+
+	def test_before_1970(self):
+		""" test_before_1970 - the bins are floored (not truncated towards zero) """
+
+		times = [_dt('1969-12-31T23:30:00'), _dt('1970-01-01T00:30:00')]
+		timeline = Timeline([_table(times)], 'hour')
+		self.assertEqual(timeline.bin_starts(), [_dt('1969-12-31T23:00:00'), _dt('1970-01-01T00:00:00')])
+		timeline = Timeline([_table(times)], 'week')
+		self.assertEqual(timeline.bin_starts(), [_dt('1969-12-29T00:00:00')])
+
+	def test_tables(self):
+		""" test_tables - one pass; the bins cover every table; parsed and CRC errors counted apart """
+
+		a = _table([_dt('2021-06-21T01:00:00'), _dt('2021-06-21T02:00:00'), _dt('2021-06-23T03:00:00')], [True, False, True])
+		b = _table([_dt('2021-06-19T05:00:00'), _dt('2021-06-19T06:00:00')], [False, False])
+		empty = PacketTable()
+		timeline = Timeline([a, empty, b], 'day')
+		self.assertEqual(len(timeline), 5)
+		self.assertEqual(timeline.bin_starts()[0], _dt('2021-06-19T00:00:00'))
+		self.assertEqual(timeline.counts.shape, (3, 2, 5))
+		self.assertEqual(timeline.counts[0].tolist(), [[0, 0, 1, 0, 1], [0, 0, 1, 0, 0]])
+		self.assertEqual(timeline.counts[1].tolist(), [[0, 0, 0, 0, 0], [0, 0, 0, 0, 0]])
+		self.assertEqual(timeline.counts[2].tolist(), [[0, 0, 0, 0, 0], [2, 0, 0, 0, 0]])
+		self.assertEqual(timeline.totals().tolist(), [2, 0, 2, 0, 1])
+
+	def test_empty(self):
+		""" test_empty """
+
+		timeline = Timeline([PacketTable(), PacketTable()], 'week')
+		self.assertEqual(len(timeline), 0)
+		self.assertEqual(timeline.bin_starts(), [])
+		self.assertEqual(timeline.counts.shape, (2, 2, 0))
+
+	def test_granularity(self):
+		""" test_granularity """
+
+		with self.assertRaises(ValueError):
+			Timeline([PacketTable()], 'month')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,69 @@
+"""
+	Timeline - packet counts per hour, day or week; every station counted in one pass
+
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	timeline = Timeline([table_a, table_b], 'day')
+	for dt, parsed, crc in zip(timeline.bin_starts(), timeline.counts[0][0], timeline.counts[0][1]):
+		...
+"""
+
+import datetime
+
+import numpy as np
+
+class Timeline:
+	""" Timeline - counts[n][0] are the parsed packets and counts[n][1] the CRC errors for the n'th table; one entry per bin """
+
+	GRANULARITIES = {
+		'hour': 3600,
+		'day': 24*3600,
+		'week': 7*24*3600,
+	}
+
+	# weeks start on a Monday (1970-01-01 was a Thursday); all in UTC
+	_ORIGINS = {
+		'hour': 0,
+		'day': 0,
+		'week': -3*24*3600,
+	}
+
+	def __init__(self, tables, granularity='day'):
+		""" Timeline - tables is a list of PacketTable """
+
+		if granularity not in Timeline.GRANULARITIES:
+			raise ValueError('%s: unknown granularity' % (granularity))
+		self.granularity = granularity
+		self.width = Timeline.GRANULARITIES[granularity]
+
+		lengths = [len(table) for table in tables]
+		if sum(lengths) == 0:
+			self.start = 0
+			self.counts = np.zeros((len(tables), 2, 0), dtype=np.int64)
+			return
+
+		t = np.concatenate([table.t for table in tables])
+		crc = np.concatenate([~table.parsed for table in tables]).astype(np.int64)
+		rows = np.repeat(np.arange(len(tables), dtype=np.int64) * 2, lengths) + crc
+
+		# bins run from the first to the last packet - so any gap is simply a bin with no counts
+		bins = np.floor((t - Timeline._ORIGINS[granularity]) / self.width).astype(np.int64)
+		first = int(bins.min())
+		n_bins = int(bins.max()) - first + 1
+		self.start = first * self.width + Timeline._ORIGINS[granularity]
+		self.counts = np.bincount(rows * n_bins + (bins - first), minlength=len(tables) * 2 * n_bins).reshape(len(tables), 2, n_bins)
+
+	def __len__(self):
+		return self.counts.shape[2]
+
+	def bin_starts(self):
+		""" bin_starts - naive UTC datetimes """
+
+		epoch = datetime.datetime(1970, 1, 1)
+		return [epoch + datetime.timedelta(seconds=self.start + ii * self.width) for ii in range(len(self))]
+
+	def totals(self):
+		""" totals - all tables and both parsed and CRC errors """
+
+		return self.counts.sum(axis=(0, 1))
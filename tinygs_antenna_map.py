@@ -7,11 +7,19 @@
 	Uses (for now) the packet date from TinyGS website - however, could be built into that website
 """
 
+import os
 import sys
+import time
 import getopt
+import datetime
 
 from packets import PacketFileProcessing
-from polar_map import PolarAntennaMap
+from antenna_map import AntennaMap
+from render_cache import RenderCache
+from timeline import Timeline
+from profiler import Profile
+from satellite import Satellite
+from propagator import Propagator
 
 def read_user_id():
 	""" read_user_id """
@@ -23,6 +31,54 @@ def read_user_id():
 		user_id = None
 	return user_id
 
+# between refreshes (even if a station is overdue - i.e. its download failed)
+WATCH_MIN_SLEEP = 5*60
+
+def parse_date(s):
+	""" parse_date - YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS] in UTC (unless there's a +HH:MM); None if it's not a date """
+
+	try:
+		dt = datetime.datetime.fromisoformat(s)
+	except ValueError:
+		return None
+	if dt.tzinfo is not None:
+		dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+	return dt
+
+def add_coverage(pfp, plot, station_names, jobs, coverage_cache):
+	""" add_coverage - so the maps are packets per hour overhead (rather than just packets) """
+
+	for station_name in station_names:
+		plot.add_coverage(station_name, pfp.get_station(station_name), jobs, coverage_cache)
+
+def watch(pfp, plot, station_names, output_dir, max_days, verbose, jobs=1, coverage_cache=None):
+	""" watch - runs until interrupted; only the stations (or satellites) with new (or expired) packets are drawn again """
+
+	while True:
+		wait = max(pfp.next_refresh(station_names) - time.time(), WATCH_MIN_SLEEP)
+		if verbose:
+			print('%s: sleeping for %d seconds' % ('tinygs_antenna_map', wait), file=sys.stderr)
+		time.sleep(wait)
+
+		changed = set(plot.expire())
+		refreshed = pfp.refresh_packets(station_names)
+		if None in refreshed.values():
+			# packets already drawn have moved (i.e. a closer TLE) - so start again
+			plot.clear_packets()
+			for station_name in station_names:
+				changed.update(plot.add_packets(station_name, pfp.get_packets(station_name), max_days))
+		else:
+			for station_name, packets in refreshed.items():
+				changed.update(plot.add_packets(station_name, packets, max_days))
+		if len(changed) == 0:
+			continue
+		if coverage_cache is not None:
+			# the window has moved - only the new day (or so) is computed
+			add_coverage(pfp, plot, sorted(changed), jobs, coverage_cache)
+		for filename in plot.output_all(output_dir, 'png', sorted(changed)):
+			if verbose:
+				print('%s: written' % (filename), file=sys.stderr)
+
 def tinygs_antenna_map(args):
 	""" tinygs_antenna_map provides all the command line processing """
 
@@ -32,11 +88,29 @@ def tinygs_antenna_map(args):
 	user_id = None
 	antennas = {}
 	max_days = None
+	since = None
+	until = None
 	antenna_arg = None
 	timebar_flag = False
+	timebin = 'day'
 	bysatellite_flag = False
+	normalize_flag = False
 	style_flag = None
 	output_flag = False
+	output_dir = None
+	watch_flag = False
+	serve_arg = None
+	compact_mode = None
+	export_format = None
+	output_filename = None
+	jobs = 1
+	propagator = None
+	grid_arg = None
+	profile_flag = False
+	profile_filename = None
+	cprofile_stage = None
+	theta_scale = None
+	radius_scale = None
 
 	usage = ('usage: tinygs_antenna_map '
 			+ '[-v|--verbose] '
@@ -46,14 +120,30 @@ def tinygs_antenna_map(args):
 			+ '[[-u|--user] user-id] '
 			+ '[[-a|--antenna] degrees] '
 			+ '[[-d|--days] days] '
+			+ '[[-F|--since] date] '
+			+ '[[-U|--until] date] '
 			+ '[-t|--timebar]'
+			+ '[[-T|--timebin] hour|day|week]'
 			+ '[-b|--bird]'
+			+ '[-N|--normalize]'
 			+ '[[-S|--style] [BDATC]]'
 			+ '[-o|--output]'
+			+ '[[-O|--output-dir] directory]'
+			+ '[-w|--watch]'
+			+ '[[-H|--serve] [address:]port]'
+			+ '[[-K|--compact] remove|keep]'
+			+ '[[-e|--export] json|csv]'
+			+ '[[-f|--file] filename]'
+			+ '[[-j|--jobs] N]'
+			+ '[[-E|--propagator] ephem|sgp4]'
+			+ '[[-g|--grid] az-degrees[,el-degrees]]'
+			+ '[-p|--profile]'
+			+ '[[-P|--profile-output] filename]'
+			+ '[[-C|--cprofile] stage]'
 			)
 
 	try:
-		opts, args = getopt.getopt(args, 'vhrs:u:a:d:tbS:o', ['verbose', 'help', 'refresh', 'station=', 'user=', 'antenna=', 'days=', 'timebar', 'bird', 'style=', 'output'])
+		opts, args = getopt.getopt(args, 'vhrs:u:a:d:F:U:tT:bNS:oO:wH:K:e:f:j:E:g:pP:C:', ['verbose', 'help', 'refresh', 'station=', 'user=', 'antenna=', 'days=', 'since=', 'until=', 'timebar', 'timebin=', 'bird', 'normalize', 'style=', 'output', 'output-dir=', 'watch', 'serve=', 'compact=', 'export=', 'file=', 'jobs=', 'propagator=', 'grid=', 'profile', 'profile-output=', 'cprofile='])
 	except getopt.GetoptError:
 		sys.exit(usage)
 
@@ -72,14 +162,49 @@ def tinygs_antenna_map(args):
 			antenna_arg = arg
 		elif opt in ('-d', '--days'):
 			max_days = arg
+		elif opt in ('-F', '--since'):
+			since = arg
+		elif opt in ('-U', '--until'):
+			until = arg
 		elif opt in ('-t', '--timebar'):
 			timebar_flag = True
+		elif opt in ('-T', '--timebin'):
+			timebar_flag = True
+			timebin = arg.lower()
 		elif opt in ('-b', '--bird'):
 			bysatellite_flag = True
+		elif opt in ('-N', '--normalize'):
+			normalize_flag = True
 		elif opt in ('-S', '--style'):
 			style_flag = arg
 		elif opt in ('-o', '--output'):
 			output_flag = True
+		elif opt in ('-O', '--output-dir'):
+			output_dir = arg
+		elif opt in ('-w', '--watch'):
+			watch_flag = True
+		elif opt in ('-H', '--serve'):
+			serve_arg = arg
+		elif opt in ('-K', '--compact'):
+			compact_mode = arg.lower()
+		elif opt in ('-e', '--export'):
+			export_format = arg
+		elif opt in ('-f', '--file'):
+			output_filename = arg
+		elif opt in ('-j', '--jobs'):
+			jobs = arg
+		elif opt in ('-E', '--propagator'):
+			propagator = arg.lower()
+		elif opt in ('-g', '--grid'):
+			grid_arg = arg
+		elif opt in ('-p', '--profile'):
+			profile_flag = True
+		elif opt in ('-P', '--profile-output'):
+			profile_flag = True
+			profile_filename = arg
+		elif opt in ('-C', '--cprofile'):
+			profile_flag = True
+			cprofile_stage = arg
 		else:
 			sys.exit(usage)
 
@@ -118,20 +243,109 @@ def tinygs_antenna_map(args):
 		if max_days <= 0:
 			sys.exit('%s: days provided is invalid number' % ('tinygs_antenna_map'))
 
+	if since:
+		since = parse_date(since)
+		if since is None:
+			sys.exit('%s: since provided is not a date (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)' % ('tinygs_antenna_map'))
+		if max_days:
+			sys.exit('%s: since and days can not be used together' % ('tinygs_antenna_map'))
+	if until:
+		until = parse_date(until)
+		if until is None:
+			sys.exit('%s: until provided is not a date (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)' % ('tinygs_antenna_map'))
+	if since and until and since >= until:
+		sys.exit('%s: since must be before until' % ('tinygs_antenna_map'))
+
+	try:
+		jobs = int(jobs)
+	except ValueError:
+		sys.exit('%s: jobs provided is non numeric' % ('tinygs_antenna_map'))
+	if jobs <= 0:
+		sys.exit('%s: jobs provided is invalid number' % ('tinygs_antenna_map'))
+
+	if propagator:
+		if propagator not in Propagator.names():
+			sys.exit('%s: propagator provided is not %s' % ('tinygs_antenna_map', ' or '.join(Propagator.names())))
+		Satellite.set_propagator(propagator)
+
+	if grid_arg:
+		try:
+			if ',' in grid_arg:
+				theta_scale, radius_scale = [float(v) for v in grid_arg.split(',', 1)]
+			else:
+				theta_scale = float(grid_arg)
+		except ValueError:
+			sys.exit('%s: grid provided is non numeric' % ('tinygs_antenna_map'))
+		if theta_scale <= 0 or theta_scale > 360 or (radius_scale is not None and (radius_scale <= 0 or radius_scale > 90)):
+			sys.exit('%s: grid provided is invalid number' % ('tinygs_antenna_map'))
+
+	if cprofile_stage and cprofile_stage not in Profile.STAGES:
+		sys.exit('%s: cprofile stage must be one of %s' % ('tinygs_antenna_map', ','.join(Profile.STAGES)))
+
+	if timebin not in Timeline.GRANULARITIES:
+		sys.exit('%s: timebin must be one of %s' % ('tinygs_antenna_map', ','.join(Timeline.GRANULARITIES)))
+
+	if export_format:
+		export_format = export_format.lower()
+		if export_format not in AntennaMap.EXPORT_FORMATS:
+			sys.exit('%s: export format must be one of %s' % ('tinygs_antenna_map', ','.join(AntennaMap.EXPORT_FORMATS)))
+		if output_flag or output_dir:
+			sys.exit('%s: export can not be used with output or output-dir' % ('tinygs_antenna_map'))
+
+	if output_filename and not (output_flag or export_format):
+		sys.exit('%s: file is only used with output or export' % ('tinygs_antenna_map'))
+
+	if compact_mode and compact_mode not in ('remove', 'keep'):
+		sys.exit('%s: compact must be remove or keep' % ('tinygs_antenna_map'))
+
+	if normalize_flag and bysatellite_flag:
+		sys.exit('%s: normalize can not be used with bird' % ('tinygs_antenna_map'))
+
+	if watch_flag and not output_dir:
+		sys.exit('%s: watch is only used with output-dir' % ('tinygs_antenna_map'))
+
+	if serve_arg:
+		if output_flag or output_dir or export_format or bysatellite_flag:
+			sys.exit('%s: serve can not be used with output, output-dir, export or bird' % ('tinygs_antenna_map'))
+		if ':' in serve_arg:
+			serve_address, serve_port = serve_arg.rsplit(':', 1)
+		else:
+			serve_address, serve_port = '127.0.0.1', serve_arg
+		try:
+			serve_port = int(serve_port)
+		except ValueError:
+			sys.exit('%s: serve port provided is non numeric' % ('tinygs_antenna_map'))
+		if serve_port <= 0 or serve_port > 65535:
+			sys.exit('%s: serve port provided is invalid number' % ('tinygs_antenna_map'))
+
+	if output_dir:
+		if output_flag:
+			sys.exit('%s: output and output-dir can not be used together' % ('tinygs_antenna_map'))
+		try:
+			os.makedirs(output_dir, exist_ok=True)
+		except OSError as e:
+			sys.exit('%s: %s' % ('tinygs_antenna_map', e))
+
 	if user_id is None and (station_names is None or len(station_names) == 0):
 		sys.exit('%s: No station or user-id provided' % ('tinygs_antenna_map'))
 
+	if profile_flag:
+		Profile.enable(cprofile_stage)
+
 	pfp = PacketFileProcessing(verbose)
 	if refresh_data:
 		pfp.set_refresh(True)
+	if watch_flag or serve_arg:
+		pfp.set_watch(True)
 	if user_id:
 		pfp.add_userid(user_id)
-	if station_names:
-		for station_name in station_names.split(','):
-			if not pfp.add_station(station_name):
-				print('%s: Station not found!' % (station_name), file=sys.stderr)
-	else:
-		_ = pfp.add_all_stations()
+	with Profile.stage('stations'):
+		if station_names:
+			for station_name in station_names.split(','):
+				if not pfp.add_station(station_name):
+					print('%s: Station not found!' % (station_name), file=sys.stderr)
+		else:
+			_ = pfp.add_all_stations()
 
 	station_names = pfp.list_stations()
 	if len(station_names) == 0:
@@ -143,16 +357,64 @@ def tinygs_antenna_map(args):
 		if station_name not in station_names:
 			sys.exit('%s: Antenna direction station not found' % ('tinygs_antenna_map'))
 
-	for station_name in station_names:
-		pfp.process_packets(station_name)
-		if verbose:
+	if compact_mode:
+		# just that - no plot
+		for station_name in station_names:
+			try:
+				compactor = pfp.compact_packets(station_name, compact_mode == 'keep')
+			except (IOError, ValueError) as e:
+				print("%s: %s - CONTINUE ANYWAY" % (station_name, e), file=sys.stderr)
+				continue
+			if len(compactor.filenames) == 0:
+				print('%s: nothing to compact' % (station_name))
+				continue
+			print('%s: %d files with %d packets (%d unique) compacted from %d bytes to %d bytes' % (station_name, len(compactor.filenames), compactor.packets_seen, compactor.packets, compactor.bytes_before, compactor.bytes_after))
+			if compactor.raw_filename:
+				print('%s: raw files kept in %s' % (station_name, compactor.raw_filename))
+		if profile_flag:
+			write_profile(profile_filename, cprofile_stage)
+		sys.exit(0)
+
+	pfp.process_all_packets(station_names, jobs)
+	if verbose:
+		for station_name in station_names:
 			pfp.print_packets(station_name)
 
+	if serve_arg:
+		# the maps are drawn as they are asked for
+		with Profile.stage('import'):
+			from map_server import MapServer
+		coverage_cache = None
+		if normalize_flag:
+			coverage_cache = RenderCache(PacketFileProcessing.DATA_DIRECTORY + '/' + 'coverage_cache')
+		server = MapServer(pfp, station_names, timebar_flag, timebin, theta_scale=theta_scale, radius_scale=radius_scale, render_cache=RenderCache(PacketFileProcessing.DATA_DIRECTORY + '/' + 'render_cache'), coverage_cache=coverage_cache, verbose=verbose)
+		# the command line's days, style and antenna direction are the defaults for each request
+		server.set_defaults(max_days, style_flag, antennas, since, until)
+		try:
+			server.serve_forever(serve_address, serve_port)
+		except OSError as e:
+			sys.exit('%s: %s' % ('tinygs_antenna_map', e))
+		except KeyboardInterrupt:
+			pass
+		if profile_flag:
+			write_profile(profile_filename, cprofile_stage)
+		sys.exit(0)
+
 	# Let the plot begin!
-	plot = PolarAntennaMap(timebar_flag, bysatellite_flag, style_flag=style_flag)
+	if export_format:
+		# just the numbers - so no need to import matplotlib at all
+		plot = AntennaMap(bysatellite_flag, theta_scale=theta_scale, radius_scale=radius_scale)
+	else:
+		# only now is matplotlib imported (which is slow on small machines)
+		with Profile.stage('import'):
+			from polar_map import PolarAntennaMap
+		render_cache = None
+		if output_flag or output_dir:
+			render_cache = RenderCache(PacketFileProcessing.DATA_DIRECTORY + '/' + 'render_cache')
+		plot = PolarAntennaMap(timebar_flag, bysatellite_flag, style_flag=style_flag, theta_scale=theta_scale, radius_scale=radius_scale, render_cache=render_cache, timebin=timebin)
 	for station_name in station_names:
 		packets = pfp.get_packets(station_name)
-		plot.add_packets(station_name, packets, max_days)
+		plot.add_packets(station_name, packets, max_days, since, until)
 		if None in antennas:
 			antenna_direction = antennas[None]
 			plot.add_antenna(station_name, antenna_direction)
@@ -160,12 +422,62 @@ def tinygs_antenna_map(args):
 			antenna_direction = antennas[station_name]
 			plot.add_antenna(station_name, antenna_direction)
 
-	if output_flag:
-		plot.output(sys.stdout.buffer, 'png')
+	coverage_cache = None
+	if normalize_flag:
+		# the time each satellite was overhead only changes with the window (or a TLE) - so it's kept
+		coverage_cache = RenderCache(PacketFileProcessing.DATA_DIRECTORY + '/' + 'coverage_cache')
+		add_coverage(pfp, plot, station_names, jobs, coverage_cache)
+
+	if output_dir:
+		for filename in plot.output_all(output_dir, 'png'):
+			if verbose:
+				print('%s: written' % (filename), file=sys.stderr)
+		if watch_flag:
+			try:
+				watch(pfp, plot, station_names, output_dir, max_days, verbose, jobs, coverage_cache)
+			except KeyboardInterrupt:
+				# the profile (if any) is still reported
+				pass
+	elif export_format:
+		if output_filename:
+			try:
+				with open(output_filename, 'w', encoding='utf8', newline='') as fd:
+					plot.export(fd, export_format)
+			except IOError as e:
+				sys.exit('%s: %s' % ('tinygs_antenna_map', e))
+		else:
+			plot.export(sys.stdout, export_format)
+	elif output_flag:
+		if output_filename:
+			try:
+				with open(output_filename, 'wb') as fd:
+					plot.output(fd, 'png')
+			except IOError as e:
+				sys.exit('%s: %s' % ('tinygs_antenna_map', e))
+		else:
+			plot.output(sys.stdout.buffer, 'png')
 	else:
 		plot.display()
+
+	if profile_flag:
+		write_profile(profile_filename, cprofile_stage)
 	sys.exit(0)
 
+def write_profile(profile_filename, cprofile_stage):
+	""" write_profile - to stderr if no filename """
+
+	cprofile_filename = None
+	if cprofile_stage:
+		cprofile_filename = 'tinygs_antenna_map-%s.prof' % (cprofile_stage)
+	if profile_filename:
+		try:
+			with open(profile_filename, 'w', encoding='utf8') as fd:
+				Profile.report(fd, cprofile_filename)
+		except IOError as e:
+			sys.exit('%s: %s' % ('tinygs_antenna_map', e))
+	else:
+		Profile.report(sys.stderr, cprofile_filename)
+
 def main(args=None):
 	""" main """
 	if args is None:
@@ -0,0 +1,130 @@
+"""
+	TLE Registry - every TLE we have seen, indexed by NORAD number and epoch
+	Martin J Levy - W6LHI/G8LHI - https://github.com/mahtin/tinyGS-antenna-map
+	Copyright (C) 2021 @mahtin - https://github.com/mahtin/tinyGS-antenna-map/blob/main/LICENSE
+
+	registry = TLERegistry()
+	registry.add(tle)
+	tle = registry.closest(name, datetime)
+	tles, indexes = registry.select(name, datetimes)
+	fingerprint = registry.fingerprint()
+	body = TLERegistry.compile(tle)
+"""
+
+import bisect
+import hashlib
+import functools
+
+import ephem
+import numpy as np
+
+BODY_CACHE_SIZE = 256
+
+@functools.lru_cache(maxsize=BODY_CACHE_SIZE)
+def _compile(name, line1, line2):
+	""" _compile - the only place ephem.readtle() is called; hence each TLE is only parsed once """
+
+	return ephem.readtle(name, line1, line2)
+
+class TLERegistry:
+	""" TLERegistry - a history of TLE's per satellite, so that old packets use the TLE of their time """
+
+	def __init__(self):
+		""" TLERegistry """
+
+		self._by_norad = {}		# norad -> list of TLE's sorted by epoch
+		self._epochs = {}		# norad -> list of epochs (same order as above)
+		self._by_name = {}		# satellite name -> norad
+		self._fingerprint = None
+
+	def __len__(self):
+		return len(self._by_name)
+
+	def __contains__(self, satellite_name):
+		return satellite_name in self._by_name
+
+	def add(self, tle):
+		""" add - returns True if this TLE (i.e. norad and epoch) was not seen before """
+
+		# the newest name wins; but older names are kept so older packets still match
+		if self._by_name.get(tle.name) != tle.norad:
+			self._by_name[tle.name] = tle.norad
+			self._fingerprint = None
+
+		if tle.norad not in self._by_norad:
+			self._by_norad[tle.norad] = []
+			self._epochs[tle.norad] = []
+
+		epochs = self._epochs[tle.norad]
+		ii = bisect.bisect_left(epochs, tle.epoch)
+		if ii < len(epochs) and epochs[ii] == tle.epoch:
+			# already have it
+			return False
+		epochs.insert(ii, tle.epoch)
+		self._by_norad[tle.norad].insert(ii, tle)
+		self._fingerprint = None
+		return True
+
+	def fingerprint(self):
+		""" fingerprint - of every name and TLE; so anything computed from them can tell if it's out of date """
+
+		if self._fingerprint is None:
+			sha1 = hashlib.sha1()
+			for name, norad in sorted(self._by_name.items()):
+				sha1.update(('%s\t%d\n' % (name, norad)).encode('utf8'))
+			for norad in sorted(self._by_norad):
+				for tle in self._by_norad[norad]:
+					sha1.update((tle.line1 + '\n').encode('utf8'))
+			self._fingerprint = sha1.hexdigest()
+		return self._fingerprint
+
+	def norad(self, satellite_name):
+		""" norad - 0 if unknown """
+
+		if satellite_name in self._by_name:
+			return self._by_name[satellite_name]
+		return 0
+
+	def history(self, satellite_name):
+		""" history - all the TLE's for a satellite, oldest first """
+
+		if satellite_name not in self._by_name:
+			return []
+		return self._by_norad[self._by_name[satellite_name]]
+
+	def newest(self, satellite_name):
+		""" newest """
+
+		tles = self.history(satellite_name)
+		if not tles:
+			return None
+		return tles[-1]
+
+	def closest(self, satellite_name, dt=None):
+		""" closest - the TLE with an epoch closest to the date/time (or the newest) """
+
+		if dt is None:
+			return self.newest(satellite_name)
+		tles, indexes = self.select(satellite_name, [dt])
+		if not tles:
+			return None
+		return tles[indexes[0]]
+
+	def select(self, satellite_name, dts):
+		""" select - for many date/times; returns the TLE history and an index into it for each date/time """
+
+		tles = self.history(satellite_name)
+		if len(tles) <= 1:
+			return tles, np.zeros(len(dts), dtype=np.intp)
+
+		# the closest epoch is found by searching against the mid-points between epochs
+		epochs = np.array(self._epochs[tles[0].norad], dtype='datetime64[us]')
+		midpoints = epochs[:-1] + (epochs[1:] - epochs[:-1]) / 2
+		t = np.array(dts, dtype='datetime64[us]')
+		return tles, np.searchsorted(midpoints, t, side='left')
+
+	@classmethod
+	def compile(cls, tle):
+		""" compile - ephem body from a TLE; cached (and bounded) so the same TLE is never parsed twice """
+
+		return _compile(tle.name, tle.line1, tle.line2)